@@ -53,6 +53,7 @@ def start_webview():
         min_size=(800, 600)
     )
     window.events.closed += on_closed
+    window.events.shown += bridge._on_window_shown
     
     bridge.set_window(window)
     webview.start(debug=debug)
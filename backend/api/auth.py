@@ -1,6 +1,7 @@
 import asyncio
 import time
 from backend.core import tg_client
+from backend.core import listing_cache
 
 class AuthHandler:
     def __init__(self, bridge):
@@ -63,6 +64,11 @@ class AuthHandler:
             
             # Clear Passcode state on bridge
             if hasattr(self.bridge, '_session_passcode'): self.bridge._session_passcode = None
+            
+            # Cached listing and derived keys belong to this account
+            listing_cache.clear()
+            from backend.core.crypto_utils import forget_derived_keys
+            forget_derived_keys()
             self.bridge._failed_passcode_attempts = 0
             self.bridge._passcode_lockout_until = None
             
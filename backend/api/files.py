@@ -1,64 +1,43 @@
 import asyncio
+import hashlib
+import math
 import os
 import uuid
-import shutil
-import threading
-import time
-import webview
-from backend.core import tg_client, split_file, get_file_hash, merge_files, CHUNK_SIZE, FileMetadata, FileChunk, MetadataManager
-from backend.core.parallel_uploader import ParallelUploader
-from backend.core.parallel_downloader import ParallelDownloader
-
-class TransferTracker:
-    def __init__(self, total_size, file_id, window, is_upload=True):
-        self.total_size = total_size
-        self.file_id = file_id
-        self.window = window
-        self.is_upload = is_upload
-        self.start_time = time.time()
-        self.chunk_progress = {} # chunk_index -> bytes_transferred
-        self.last_update_time = 0
-        self.lock = threading.Lock()
-
-    def update(self, chunk_index, current, total):
-        with self.lock:
-            self.chunk_progress[chunk_index] = current
-            
-            now = time.time()
-            if now - self.last_update_time < 0.1: # Limit updates to 100ms
-                return
+from backend.core import tg_client
+from backend.core import listing_cache
+from backend.core.metrics import metrics
+from backend.core.tracing import span, iter_spans, transfer_trace
+
+# Chunks uploaded at once. Parts in flight are capped by the adaptive
+# upload_parts limit; this only needs enough chunks to keep that limit busy
+# plus one overlapping the previous chunk's send_file. Every in-flight chunk
+# is held in memory, hence the cap.
+MAX_CHUNK_TASKS = 5
+
+CHUNK_LOOKUP_BATCH = 100  # chunk messages fetched per messages.getMessages
+
+
+def _chunk_task_limit(chunk_size):
+    from backend.core.concurrency import upload_parts
+    from backend.core.parallel_uploader import get_optimal_part_size
+    parts_per_chunk = max(1, math.ceil(chunk_size / get_optimal_part_size(chunk_size)))
+    return min(MAX_CHUNK_TASKS, 1 + math.ceil(upload_parts.limit / parts_per_chunk))
 
-            self.last_update_time = now
-            
-            total_transferred = sum(self.chunk_progress.values())
-            progress = int((total_transferred / self.total_size) * 100)
-            
-            duration = now - self.start_time
-            if duration < 0.1: duration = 0.1
-            speed = total_transferred / duration
-            
-            if speed > 1024 * 1024:
-                speed_str = f"{speed / (1024 * 1024):.1f} MB/s"
-            elif speed > 1024:
-                speed_str = f"{speed / 1024:.1f} KB/s"
-            else:
-                speed_str = f"{speed:.0f} B/s"
-            
-            method = "onUploadProgress" if self.is_upload else "onDownloadProgress"
-            try:
-                self.window.evaluate_js(f"window.{method}('{self.file_id}', {progress}, '{speed_str}', 'Transferring...')")
-            except:
-                pass
 
 class FileHandler:
     def __init__(self, bridge):
         self.bridge = bridge
+        self._listing = None  # last known rows, mirrored to listing_cache
+        self._listing_incomplete = False  # encrypted records skipped while locked: never cached
+        self._committer = None  # AlbumCommitter shared by all uploads on the current client
 
     async def list_files(self):
+        from backend.core import MetadataManager
         await self.bridge._ensure_client()
         messages = await tg_client.get_messages(limit=100)
         files = []
         passcode = getattr(self.bridge, '_session_passcode', None)
+        skipped_encrypted = False
         
         for msg in messages:
             if not msg.text: continue
@@ -79,19 +58,73 @@ class FileHandler:
                             print(f"FileHandler: Failed to decrypt file {msg.id}: {e}")
                             continue
                     else:
+                        skipped_encrypted = True
                         continue
                 
                 if metadata:
-                    file_data = metadata.model_dump()
-                    file_data["metadata_message_id"] = msg.id
-                    files.append(file_data)
+                    files.append(self._file_entry(metadata, msg.id))
                     
             except Exception as e:
                 print(f"FileHandler: Error parsing message {msg.id}: {e}")
                 continue
+        
+        self._listing = files
+        self._listing_incomplete = skipped_encrypted
+        await self._save_listing()
         return files
 
+    async def list_all_files(self):
+        """
+        List every readable file in the catalog, newest first.
+        
+        list_files only looks at the newest messages; headless bulk commands
+        (ls, download, rm) must see files from any earlier upload too.
+        """
+        from backend.core.catalog import iter_catalog
+        await self.bridge._ensure_client()
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        files = [
+            self._file_entry(metadata, msg.id)
+            async for metadata, msg in iter_catalog(tg_client.client, passcode)
+        ]
+        files.sort(key=lambda f: f["metadata_message_id"], reverse=True)
+        return files
+
+    def get_cached_files(self):
+        """Return the last known listing instantly and revalidate it in the background."""
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        cached = listing_cache.load(passcode)
+        asyncio.run_coroutine_threadsafe(self._revalidate(cached or []), self.bridge.loop)
+        return {"files": cached or [], "cached": cached is not None}
+
+    async def _revalidate(self, cached):
+        try:
+            fresh = await self.list_files()
+        except Exception as e:
+            print(f"FileHandler: Revalidation failed: {e}")
+            self.bridge._emit("onFilesRevalidateError", str(e))
+            return
+        # Push only what changed since the cached listing was served
+        self.bridge._emit("onFilesPatch", listing_cache.diff_listings(cached, fresh))
+
+    async def _update_listing(self, patch):
+        if self._listing is None:
+            return
+        self._listing = listing_cache.apply_patch(self._listing, patch)
+        await self._save_listing()
+
+    async def _save_listing(self):
+        if self._listing_incomplete:
+            return  # locked session: caching would replace the full listing with a partial one
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        try:
+            # Encryption runs PBKDF2; keep it off the event loop
+            await asyncio.to_thread(listing_cache.save, self._listing, passcode)
+        except Exception as e:
+            print(f"FileHandler: Failed to save listing cache: {e}")
+
     def pick_and_upload_file(self):
+        import webview
         file_types = ('All files (*.*)',)
         window = self.bridge._window[0] if isinstance(self.bridge._window, list) else self.bridge._window
         result = window.create_file_dialog(
@@ -106,37 +139,71 @@ class FileHandler:
             return {"status": "started", "file": os.path.basename(file_path)}
         return {"status": "cancelled"}
 
-    async def _upload_logic(self, file_path):
+    async def _upload_logic(self, file_path, name=None):
+        """
+        Upload one file (GUI picker and headless CLI share this path).
+        
+        Args:
+            file_path: Local file to upload
+            name: Name stored in the metadata (default: the file's basename)
+            
+        Returns:
+            {"file_id", "file": row} on success, {"file_id", "error"} on failure
+        """
         file_id = str(uuid.uuid4())
+        name = name or os.path.basename(file_path)
+        with transfer_trace("upload", file_id, name):
+            return await self._upload_pipeline(file_id, file_path, name)
+
+    async def _upload_pipeline(self, file_id, file_path, filename):
+        from backend.core import split_file, CHUNK_SIZE, FileMetadata, FileChunk
+        from backend.core.parallel_uploader import ParallelUploader
+        from backend.core.hash_cache import hash_cache, same_file
+        
         try:
             await self.bridge._ensure_client()
-            filename = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
+            st = os.stat(file_path)
+            file_size = st.st_size
             
-            try:
-                self.bridge._window.evaluate_js(f"window.onUploadProgress('{file_id}', 0, '0 B/s', 'Starting...')")
-            except Exception as e:
-                print(f"FileHandler: [Upload] Failed to init UI: {e}")
+            self.bridge._emit("onUploadProgress", file_id, 0, "0 B/s", "Starting...")
 
-            file_hash = get_file_hash(file_path)
-            chunk_gen = split_file(file_path)
+            # Hashes come from the bytes actually uploaded, in the same single
+            # read: a file that changes meanwhile still gets matching metadata
+            file_hash = hashlib.sha256()
+            chunk_hashes = []
+            uploaded_size = 0
+            
+            def hash_chunk(chunk_data):
+                file_hash.update(chunk_data)
+                return hashlib.sha256(chunk_data).hexdigest()
+            chunk_gen = iter_spans(split_file(file_path), "read_chunk")
             total_chunks = (file_size // CHUNK_SIZE) + 1
             
-            tracker = TransferTracker(file_size, file_id, self.bridge._window, is_upload=True)
+            tracker = self.bridge.progress.track(file_size, file_id, name=filename, is_upload=True)
             
             active_tasks = set()
             chunks_metadata = []
             
-            async def upload_worker(index, chunk_data):
+            async def upload_worker(index, chunk_data, chunk_hash):
+                metrics.add_gauge("upload_chunks_active", 1)
+                committer = self._chunk_committer()
+                committer.reserve()
+                try:
+                    return await upload_chunk(index, chunk_data, chunk_hash, committer)
+                finally:
+                    committer.release()
+                    metrics.add_gauge("upload_chunks_active", -1)
+                    metrics.add_gauge("buffered_bytes", -len(chunk_data), stage="upload_chunk")
+
+            async def upload_chunk(index, chunk_data, chunk_hash, committer):
                 print(f"FileHandler: [Upload] Starting chunk {index}/{total_chunks} ({len(chunk_data)} bytes)")
                 temp_dir = "temp_uploads"
                 os.makedirs(temp_dir, exist_ok=True)
                 chunk_temp_path = os.path.join(temp_dir, f"{file_id}_part{index}")
 
-                with open(chunk_temp_path, "wb") as f:
-                    f.write(chunk_data)
-                
-                chunk_hash = get_file_hash(chunk_temp_path)
+                with span("write_temp", chunk=index, size=len(chunk_data)):
+                    with open(chunk_temp_path, "wb") as f:
+                        f.write(chunk_data)
                 
                 def progress_callback(current, total):
                     tracker.update(index, current, total)
@@ -146,38 +213,47 @@ class FileHandler:
                 caption = "#ENCRYPTED_CHUNK" if passcode else "#TG_DRIVE_CHUNK"
                 
                 uploader = ParallelUploader(tg_client.client)
-                input_file = await uploader.upload_file(
-                    chunk_temp_path,
-                    progress_callback=progress_callback
-                )
+                with span("upload_parts", chunk=index):
+                    input_file = await uploader.upload_file(
+                        chunk_temp_path,
+                        progress_callback=progress_callback
+                    )
                 
-                # Send the uploaded file as a message
-                message = await tg_client.client.send_file(
-                    "me",
-                    input_file,
-                    caption=caption,
-                    force_document=True
-                )
-                print(f"FileHandler: [Upload] Chunk {index} uploaded. Message ID: {message.id}")
+                # Send the uploaded file as a message (batched into an album with
+                # other chunks that finish at about the same time)
+                with span("send_file", chunk=index):
+                    message_id = await committer.commit(input_file, caption)
+                print(f"FileHandler: [Upload] Chunk {index} uploaded. Message ID: {message_id}")
                 
                 os.remove(chunk_temp_path)
                 
                 return FileChunk(
                     index=index,
-                    message_id=message.id,
+                    message_id=message_id,
                     size=len(chunk_data),
                     hash=chunk_hash
                 )
 
             for index, chunk_data in chunk_gen:
-                if len(active_tasks) >= 5:
-                    done, active_tasks = await asyncio.wait(active_tasks, return_when=asyncio.FIRST_COMPLETED)
+                metrics.add_gauge("buffered_bytes", len(chunk_data), stage="upload_chunk")
+                with span("hash_chunk", chunk=index, size=len(chunk_data)):
+                    # hashlib releases the GIL: in-flight parts keep moving meanwhile
+                    chunk_hashes.append(await asyncio.to_thread(hash_chunk, chunk_data))
+                uploaded_size += len(chunk_data)
+                if len(active_tasks) >= _chunk_task_limit(len(chunk_data)):
+                    with span("wait_slot", chunk=index):
+                        done, active_tasks = await asyncio.wait(active_tasks, return_when=asyncio.FIRST_COMPLETED)
                     for t in done:
                         chunks_metadata.append(await t)
                 
-                task = asyncio.create_task(upload_worker(index, chunk_data))
+                task = asyncio.create_task(upload_worker(index, chunk_data, chunk_hashes[index]))
                 active_tasks.add(task)
             
+            file_hash = file_hash.hexdigest()
+            if same_file(st, os.stat(file_path)):
+                # Unchanged while read: later syncs can skip reading it
+                hash_cache.put(st, file_hash, CHUNK_SIZE, chunk_hashes)
+            
             if active_tasks:
                 done, _ = await asyncio.wait(active_tasks)
                 for t in done:
@@ -186,62 +262,175 @@ class FileHandler:
             metadata = FileMetadata(
                 id=file_id,
                 name=filename,
-                size=file_size,
+                size=uploaded_size,
                 chunks=chunks_metadata,
                 hash=file_hash,
                 mime_type="application/octet-stream"
             )
             
-            passcode = getattr(self.bridge, '_session_passcode', None)
+            row = await self._publish_upload(metadata, tracker)
+            return {"file_id": file_id, "file": row}
             
-            if passcode:
-                metadata_encrypted = MetadataManager.to_json_encrypted(metadata, passcode)
-                await tg_client.send_message(f"METADATA_V2_ENCRYPTED\n{metadata_encrypted}")
-                print(f"FileHandler: [Upload] Encrypted metadata (V2) sent.")
-            else:
-                metadata_json = MetadataManager.to_json(metadata)
-                await tg_client.send_message(f"METADATA_V1\n{metadata_json}")
-                print(f"FileHandler: [Upload] Plaintext metadata (V1) sent.")
+        except Exception as e:
+            print(f"Upload error: {e}")
+            self.bridge.progress.remove(file_id)
+            self.bridge._emit("onUploadError", file_id, str(e))
+            return {"file_id": file_id, "error": str(e)}
+
+    async def _upload_stream_logic(self, stream, name):
+        """
+        Upload a byte stream of unknown length (a pipe, a dump, a tar stream).
+        
+        Args:
+            stream: Async iterable of bytes or file-like object (see StreamReader)
+            name: Name stored in the metadata
+            
+        Returns:
+            {"file_id", "file": row} on success, {"file_id", "error"} on failure
+        """
+        file_id = str(uuid.uuid4())
+        with transfer_trace("upload", file_id, name):
+            return await self._upload_stream_pipeline(file_id, stream, name)
+
+    async def _upload_stream_pipeline(self, file_id, stream, filename):
+        """
+        Chunks are uploaded one after another as the stream is read (parts
+        within a chunk still go in parallel), hashing the bytes on the way
+        through; nothing is spooled to disk and the metadata is sent once the
+        stream ends and the size is known.
+        """
+        from backend.core import StreamReader, CHUNK_SIZE, FileMetadata, FileChunk
+        from backend.core.parallel_uploader import ParallelUploader
+        
+        try:
+            await self.bridge._ensure_client()
+            reader = stream if isinstance(stream, StreamReader) else StreamReader(stream)
+            
+            self.bridge._emit("onUploadProgress", file_id, 0, "0 B/s", "Starting...")
+            tracker = self.bridge.progress.track(0, file_id, name=filename, is_upload=True)
             
-            self.bridge._window.evaluate_js(f"window.onUploadComplete('{file_id}')")
+            passcode = getattr(self.bridge, '_session_passcode', None)
+            caption = "#ENCRYPTED_CHUNK" if passcode else "#TG_DRIVE_CHUNK"
+            file_hash = hashlib.sha256()
+            chunks_metadata = []
+            file_size = 0
+            
+            while True:
+                index = len(chunks_metadata)
+                chunk_hash = hashlib.sha256()
+                
+                def on_data(data):
+                    chunk_hash.update(data)
+                    file_hash.update(data)
+                
+                def progress_callback(current, total, index=index):
+                    tracker.update(index, current, total)
+                
+                committer = self._chunk_committer()
+                committer.reserve()
+                try:
+                    uploader = ParallelUploader(tg_client.client)
+                    with span("upload_parts", chunk=index):
+                        input_file, size = await uploader.upload_stream(
+                            reader,
+                            f"{file_id}_part{index}",
+                            limit=CHUNK_SIZE,
+                            progress_callback=progress_callback,
+                            on_data=on_data
+                        )
+                    if input_file is None:
+                        break  # the stream ended exactly on a chunk boundary
+                    with span("send_file", chunk=index):
+                        message_id = await committer.commit(input_file, caption)
+                finally:
+                    committer.release()
+                print(f"FileHandler: [Upload] Stream chunk {index} uploaded ({size} bytes). Message ID: {message_id}")
+                
+                chunks_metadata.append(FileChunk(
+                    index=index,
+                    message_id=message_id,
+                    size=size,
+                    hash=chunk_hash.hexdigest()
+                ))
+                file_size += size
+                if size < CHUNK_SIZE:
+                    break
+            
+            tracker.total_size = file_size
+            metadata = FileMetadata(
+                id=file_id,
+                name=filename,
+                size=file_size,
+                chunks=chunks_metadata,
+                hash=file_hash.hexdigest(),
+                mime_type="application/octet-stream"
+            )
+            row = await self._publish_upload(metadata, tracker)
+            return {"file_id": file_id, "file": row}
             
         except Exception as e:
             print(f"Upload error: {e}")
-            self.bridge._window.evaluate_js(f"window.onUploadError('{file_id}', '{str(e)}')")
+            self.bridge.progress.remove(file_id)
+            self.bridge._emit("onUploadError", file_id, str(e))
+            return {"file_id": file_id, "error": str(e)}
+
+    async def _publish_upload(self, metadata, tracker):
+        """Send an uploaded file's metadata message and push its row to the listing."""
+        from backend.core import MetadataManager
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        
+        with span("send_metadata"):
+            metadata_msg = await tg_client.send_message(MetadataManager.to_message_text(metadata, passcode))
+        print(f"FileHandler: [Upload] {'Encrypted (V2)' if passcode else 'Plaintext (V1)'} metadata sent.")
+        
+        tracker.close()
+        # Push the new row so the list doesn't have to be reloaded
+        patch = {"added": [self._file_entry(metadata, metadata_msg.id)]}
+        self.bridge._emit("onUploadComplete", metadata.id, patch)
+        await self._update_listing(patch)
+        return patch["added"][0]
+
+    def _chunk_committer(self):
+        from backend.core.album_committer import AlbumCommitter
+        if self._committer is None or self._committer.client is not tg_client.client:
+            self._committer = AlbumCommitter(tg_client.client)
+        return self._committer
 
     def download_file(self, file_id):
         asyncio.run_coroutine_threadsafe(self._download_logic(file_id), self.bridge.loop)
         return {"status": "started"}
 
+    async def _find_metadata(self, file_id):
+        """Look up a file's metadata by id: recent messages first, then the full catalog."""
+        from contextlib import aclosing
+        from backend.core import MetadataManager
+        from backend.core.catalog import iter_catalog
+        
+        messages = await tg_client.get_messages(limit=100)
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        
+        for msg in messages:
+            try:
+                m = MetadataManager.from_message_text(msg.text, passcode)
+                if m and m.id == file_id:
+                    return m
+            except: continue
+        
+        async with aclosing(iter_catalog(tg_client.client, passcode)) as catalog:
+            async for metadata, _ in catalog:
+                if metadata.id == file_id:
+                    return metadata
+        return None
+
     async def _download_logic(self, file_id):
+        import webview
+        
         try:
             await self.bridge._ensure_client()
-            messages = await tg_client.get_messages(limit=100)
-            metadata = None
-            passcode = getattr(self.bridge, '_session_passcode', None)
-            
-            for msg in messages:
-                if not msg.text: continue
-                try:
-                    if msg.text.startswith("METADATA_V1"):
-                        json_str = msg.text.split("\n", 1)[1]
-                        m = MetadataManager.from_json(json_str)
-                        if m.id == file_id:
-                            metadata = m
-                            break
-                    elif msg.text.startswith("METADATA_V2_ENCRYPTED"):
-                        if passcode:
-                            try:
-                                encrypted_str = msg.text.split("\n", 1)[1]
-                                m = MetadataManager.from_json_encrypted(encrypted_str, passcode)
-                                if m.id == file_id:
-                                    metadata = m
-                                    break
-                            except: continue
-                except: continue
+            metadata = await self._find_metadata(file_id)
             
             if not metadata:
-                self.bridge._window.evaluate_js(f"window.onDownloadError('{file_id}', 'File not found')")
+                self.bridge._emit("onDownloadError", file_id, "File not found")
                 return
 
             window = self.bridge._window[0] if isinstance(self.bridge._window, list) else self.bridge._window
@@ -254,129 +443,268 @@ class FileHandler:
                 return
 
             save_path = save_path if isinstance(save_path, str) else save_path[0]
-            temp_dir = f"temp_download_{file_id}"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            sorted_chunks = sorted(metadata.chunks, key=lambda c: c.index)
-            total = len(sorted_chunks)
-            total_size = metadata.size
-            
-            tracker = TransferTracker(total_size, file_id, self.bridge._window, is_upload=False)
-            sem = asyncio.Semaphore(5)
-            chunk_paths = [None] * total
-
-            async def download_worker(i, chunk):
-                async with sem:
-                    print(f"FileHandler: [Download] Starting chunk {i}/{total}")
-                    chunk_msg = await tg_client.get_message_by_id(chunk.message_id)
-                    if not chunk_msg:
-                        raise Exception(f"Chunk {chunk.index} missing")
-                    
-                    chunk_path = os.path.join(temp_dir, f"chunk_{chunk.index}")
-                    
-                    def progress_callback(current, total):
-                        tracker.update(i, current, total)
-
-                    # Use ParallelDownloader
-                    downloader = ParallelDownloader(tg_client.client)
-                    await downloader.download_file(
-                        chunk_msg[0],
-                        chunk_path,
-                        progress_callback=progress_callback
-                    )
-                    
-                    if get_file_hash(chunk_path) != chunk.hash:
-                        raise Exception(f"Chunk {chunk.index} hash mismatch")
-                    
-                    print(f"FileHandler: [Download] Chunk {i} done.")
-                    return i, chunk_path
-
-            tasks = [download_worker(i, chunk) for i, chunk in enumerate(sorted_chunks)]
-            results = await asyncio.gather(*tasks)
-            
-            for i, path in results:
-                chunk_paths[i] = path
-
-            print("FileHandler: [Download] Merging files...")
-            self.bridge._window.evaluate_js(f"window.onDownloadProgress('{file_id}', 99, '0 B/s', 'Merging...')")
-            merge_files(chunk_paths, save_path)
-            
-            print("FileHandler: [Download] Verifying integrity...")
-            final_hash = get_file_hash(save_path)
-            if final_hash != metadata.hash:
-                shutil.rmtree(temp_dir)
-                if os.path.exists(save_path):
-                    os.remove(save_path)
-                raise Exception(f"File integrity check failed!")
+            await self.download_to_path(file_id, save_path, metadata)
             
-            shutil.rmtree(temp_dir)
             print("FileHandler: [Download] Complete.")
-            self.bridge._window.evaluate_js(f"window.onDownloadComplete('{file_id}')")
+            self.bridge._emit("onDownloadComplete", file_id)
 
         except Exception as e:
             print(f"Download error: {e}")
-            self.bridge._window.evaluate_js(f"window.onDownloadError('{file_id}', '{str(e)}')")
+            self.bridge.progress.remove(file_id)
+            self.bridge._emit("onDownloadError", file_id, str(e))
 
-    def rename_file(self, file_id, new_name, metadata_message_id):
-        async def _rename():
-            await self.bridge._ensure_client()
-            msgs = await tg_client.get_message_by_id(metadata_message_id)
-            if not msgs: return {"error": "Message not found"}
-            msg = msgs[0]
-            passcode = getattr(self.bridge, '_session_passcode', None)
-            
-            metadata = None
-            is_encrypted = False
-            
-            if msg.text.startswith("METADATA_V1"):
-                json_str = msg.text.split("\n", 1)[1]
-                metadata = MetadataManager.from_json(json_str)
-            elif msg.text.startswith("METADATA_V2_ENCRYPTED"):
-                if not passcode: return {"error": "Passcode required"}
-                try:
-                    encrypted_str = msg.text.split("\n", 1)[1]
-                    metadata = MetadataManager.from_json_encrypted(encrypted_str, passcode)
-                    is_encrypted = True
-                except: return {"error": "Decryption failed"}
-            
-            if not metadata: return {"error": "Invalid metadata"}
-            
-            metadata.name = new_name
+    async def download_to_path(self, file_id, save_path, metadata=None):
+        """
+        Download a file straight to save_path (no dialog), reporting progress.
+        
+        Raises:
+            FileNotFoundError: If no metadata with this id is found
+        """
+        await self.bridge._ensure_client()
+        if metadata is None:
+            metadata = await self._find_metadata(file_id)
+            if not metadata:
+                raise FileNotFoundError(f"File not found: {file_id}")
+        
+        tracker = self.bridge.progress.track(metadata.size, file_id, name=metadata.name, is_upload=False)
+        try:
+            with transfer_trace("download", file_id, metadata.name):
+                await self._download_to(metadata, save_path, tracker)
+        finally:
+            tracker.close()
+        return {"file_id": file_id, "path": save_path, "size": metadata.size}
+
+    async def _download_to(self, metadata, save_path, tracker):
+        """
+        Download all chunks in order into save_path.
+        
+        Data goes to a .part file that only replaces save_path once the
+        stream's inline hash checks passed (no re-read, no merge).
+        """
+        part_path = save_path + ".part"
+        try:
+            with open(part_path, "wb") as out:
+                async for data in self._iter_chunks(metadata, tracker):
+                    with span("write", size=len(data)):
+                        out.write(data)
+            os.replace(part_path, save_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+    async def iter_file(self, file_id, metadata=None):
+        """
+        Yield a stored file's bytes in order, without a save dialog or local file.
+        
+        Lets callers pipe a file straight into a decompressor, hasher, socket
+        or tar. Use contextlib.aclosing (or aclose()) when stopping early, so
+        in-flight part fetches are cancelled right away.
+        
+        Args:
+            file_id: Id of the stored file
+            metadata: Its FileMetadata, if already known
+            
+        Yields:
+            Consecutive pieces of the file (about one download part each)
+            
+        Raises:
+            FileNotFoundError: If no metadata with this id is found
+            Exception: On a chunk or whole-file hash mismatch, raised right after
+                the bad chunk's bytes were yielded
+        """
+        await self.bridge._ensure_client()
+        if metadata is None:
+            metadata = await self._find_metadata(file_id)
+            if not metadata:
+                raise FileNotFoundError(f"File not found: {file_id}")
+        
+        tracker = self.bridge.progress.track(metadata.size, file_id, name=metadata.name, is_upload=False)
+        try:
+            async for data in self._iter_chunks(metadata, tracker):
+                yield data
+        finally:
+            tracker.close()
+
+    async def _iter_chunks(self, metadata, tracker):
+        """
+        Stream all chunks in order, verifying hashes as bytes pass.
+        
+        Parts within a chunk are fetched in parallel under the adaptive
+        download_parts limit and put back in order inside the downloader's
+        bounded window. Chunks follow one another so the whole-file hash can
+        be updated inline; chunk messages are looked up a batch at a time.
+        """
+        from backend.core.parallel_downloader import ParallelDownloader
+        
+        sorted_chunks = sorted(metadata.chunks, key=lambda c: c.index)
+        total = len(sorted_chunks)
+        whole_hash = hashlib.sha256()
+        downloader = ParallelDownloader(tg_client.client)
+        chunk_messages = {}  # message id -> message, filled CHUNK_LOOKUP_BATCH at a time
+        
+        for i, chunk in enumerate(sorted_chunks):
+            print(f"FileHandler: [Download] Starting chunk {i}/{total}")
+            if chunk.message_id not in chunk_messages:
+                ids = [c.message_id for c in sorted_chunks[i:i + CHUNK_LOOKUP_BATCH]]
+                with span("get_chunk_message", chunk=chunk.index, count=len(ids)):
+                    msgs = await tg_client.get_message_by_id(ids)
+                chunk_messages = {m_id: m for m_id, m in zip(ids, msgs or [])}
+            chunk_msg = chunk_messages.get(chunk.message_id)
+            if not chunk_msg:
+                raise Exception(f"Chunk {chunk.index} missing")
+            
+            def progress_callback(current, total, i=i):
+                tracker.update(i, current, total)
+            
+            chunk_hash = hashlib.sha256()
+            async for data in downloader.iter_download(chunk_msg, progress_callback=progress_callback):
+                with span("hash", chunk=chunk.index, size=len(data)):
+                    chunk_hash.update(data)
+                    whole_hash.update(data)
+                yield data
+            
+            if chunk_hash.hexdigest() != chunk.hash:
+                raise Exception(f"Chunk {chunk.index} hash mismatch")
+            print(f"FileHandler: [Download] Chunk {i} done.")
+        
+        if whole_hash.hexdigest() != metadata.hash:
+            raise Exception(f"File integrity check failed!")
+
+    async def rename_file(self, file_id, new_name, metadata_message_id):
+        from backend.core import MetadataManager
+        await self.bridge._ensure_client()
+        msgs = await tg_client.get_message_by_id(metadata_message_id)
+        if not msgs: return {"error": "Message not found"}
+        msg = msgs[0]
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        
+        is_encrypted = msg.text.startswith("METADATA_V2_ENCRYPTED")
+        if is_encrypted and not passcode: return {"error": "Passcode required"}
+        try:
+            metadata = MetadataManager.from_message_text(msg.text, passcode)
+        except: return {"error": "Decryption failed"}
+        
+        if not metadata: return {"error": "Invalid metadata"}
+        
+        metadata.name = new_name
+        # Keep the record's existing format (V1 stays plaintext)
+        await msg.edit(MetadataManager.to_message_text(metadata, passcode if is_encrypted else None))
+        
+        patch = {"changed": [self._file_entry(metadata, msg.id)]}
+        await self._update_listing(patch)
+        return {"success": True, "patch": patch}
+
+    async def delete_file(self, file_id, metadata_message_id):
+        result = await self.delete_files([{"id": file_id, "metadata_message_id": metadata_message_id}])
+        outcome = result["results"][file_id]
+        if "error" in outcome:
+            return outcome
+        return {"success": True, "patch": result["patch"]}
+
+    async def delete_files(self, files):
+        """
+        Delete many files at once.
+        
+        All metadata messages are fetched in one call, and ids are pooled into
+        max-size delete batches run with bounded concurrency. Chunks go first;
+        a file's metadata is only deleted once all of its chunks are, so a
+        failed batch never leaves invisible chunks behind a deleted listing.
+        
+        Args:
+            files: List of {"id", "metadata_message_id"} rows
             
-            if is_encrypted:
-                new_content = MetadataManager.to_json_encrypted(metadata, passcode)
-                await msg.edit(f"METADATA_V2_ENCRYPTED\n{new_content}")
+        Returns:
+            {"results": {file_id: {"success": True} | {"error": str}}, "patch": {"removed": [...]}}
+        """
+        from backend.core import MetadataManager
+        await self.bridge._ensure_client()
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        
+        results = {}
+        chunk_ids = {}  # file_id -> chunk message ids
+        metadata_ids = {}  # file_id -> metadata message id
+        msgs = await tg_client.get_message_by_id([f["metadata_message_id"] for f in files]) or []
+        
+        async def resolve(f, msg):
+            if not msg or not msg.text:
+                results[f["id"]] = {"error": "Message not found"}
+                return
+            if msg.text.startswith("METADATA_V2_ENCRYPTED") and not passcode:
+                results[f["id"]] = {"error": "Passcode required"}
+                return
+            try:
+                # Decryption is a PBKDF2 run per record; do them in parallel threads
+                metadata = await asyncio.to_thread(MetadataManager.from_message_text, msg.text, passcode)
+            except Exception:
+                results[f["id"]] = {"error": "Decryption failed"}
+                return
+            chunk_ids[f["id"]] = [c.message_id for c in metadata.chunks] if metadata else []
+            metadata_ids[f["id"]] = msg.id
+        
+        await asyncio.gather(*(resolve(f, msg) for f, msg in zip(files, msgs)))
+        
+        failed_chunks = await tg_client.delete_messages_batched(
+            [mid for ids in chunk_ids.values() for mid in ids]
+        )
+        deletable = []
+        for file_id, ids in chunk_ids.items():
+            if failed_chunks.intersection(ids):
+                # Metadata kept: the file stays listed and deleting it again finishes the job
+                results[file_id] = {"error": "Delete failed (chunks)"}
             else:
-                new_content = MetadataManager.to_json(metadata)
-                await msg.edit(f"METADATA_V1\n{new_content}")
-                
-            return {"success": True}
-        return self.bridge._run_async(_rename())
+                deletable.append(file_id)
+        
+        failed_metadata = await tg_client.delete_messages_batched([metadata_ids[f] for f in deletable])
+        removed = []
+        for file_id in deletable:
+            if metadata_ids[file_id] in failed_metadata:
+                results[file_id] = {"error": "Delete failed"}
+            else:
+                results[file_id] = {"success": True}
+                removed.append(file_id)
+        
+        patch = {"removed": removed}
+        await self._update_listing(patch)
+        return {"results": results, "patch": patch}
 
-    def delete_file(self, file_id, metadata_message_id):
-        async def _delete():
-            await self.bridge._ensure_client()
-            msgs = await tg_client.get_message_by_id(metadata_message_id)
-            if not msgs: return {"error": "Message not found"}
-            msg = msgs[0]
-            passcode = getattr(self.bridge, '_session_passcode', None)
-            
-            metadata = None
-            
-            if msg.text.startswith("METADATA_V1"):
-                json_str = msg.text.split("\n", 1)[1]
-                metadata = MetadataManager.from_json(json_str)
-            elif msg.text.startswith("METADATA_V2_ENCRYPTED"):
-                if not passcode: return {"error": "Passcode required"}
-                try:
-                    encrypted_str = msg.text.split("\n", 1)[1]
-                    metadata = MetadataManager.from_json_encrypted(encrypted_str, passcode)
-                except: return {"error": "Decryption failed"}
-            
-            if metadata:
-                chunk_ids = [c.message_id for c in metadata.chunks]
-                await tg_client.delete_messages(chunk_ids)
-            
-            await tg_client.delete_messages([metadata_message_id])
-            return {"success": True}
-        return self.bridge._run_async(_delete())
+    async def collect_garbage(self, dry_run=True, incremental=True, grace_hours=24):
+        """
+        Find (and unless dry_run, delete) chunk messages no metadata references.
+        
+        Returns:
+            The chunk_gc report plus "dry_run", "orphaned_bytes" and "deleted"
+        """
+        from backend.core import chunk_gc
+        await self.bridge._ensure_client()
+        passcode = getattr(self.bridge, '_session_passcode', None)
+        
+        report = await chunk_gc.find_orphaned_chunks(
+            tg_client.client,
+            passcode,
+            grace_period=grace_hours * 3600,
+            incremental=incremental
+        )
+        next_state = report.pop("state")
+        report["dry_run"] = dry_run
+        report["orphaned_bytes"] = sum(c["size"] for c in report["orphaned"])
+        print(f"FileHandler: [GC] {len(report['orphaned'])} orphaned chunks "
+              f"({report['orphaned_bytes']} bytes) out of {report['scanned']} scanned")
+        
+        if dry_run:
+            report["deleted"] = 0
+            return report
+        
+        failed = await tg_client.delete_messages_batched([c["id"] for c in report["orphaned"]])
+        report["deleted"] = len(report["orphaned"]) - len(failed)
+        if not failed:
+            # Only advance the watermarks once everything below them is gone
+            chunk_gc.save_state(next_state)
+        return report
+
+    @staticmethod
+    def _file_entry(metadata, metadata_message_id):
+        """Row shape shared by list_files and the incremental list patches."""
+        file_data = metadata.model_dump()
+        file_data["metadata_message_id"] = metadata_message_id
+        return file_data
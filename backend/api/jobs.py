@@ -0,0 +1,84 @@
+"""
+Non-blocking bridge calls.
+
+A job wraps one handler coroutine scheduled on the bridge event loop:
+- start() returns a job id immediately instead of blocking the JS API thread
+- The result or error is pushed back via window.onJobResult / window.onJobError
+- Jobs can be cancelled and are bounded by an optional timeout
+- Long-running coroutines can push progress with report_progress()
+"""
+import asyncio
+import contextvars
+import time
+import uuid
+
+# Job running in the current task (None outside of a job)
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(**data):
+    """Push a progress update for the job running in the current task, if any."""
+    job = current_job.get()
+    if job:
+        job.manager.bridge._emit("onJobProgress", job.id, data)
+
+
+class Job:
+    def __init__(self, manager, name, timeout=None):
+        self.manager = manager
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.future = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "timeout": self.timeout,
+            "running_for": round(time.time() - self.started_at, 1)
+        }
+
+
+class JobManager:
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self.jobs = {}  # job_id -> Job
+
+    def start(self, name, coro, timeout=None):
+        """Schedule coro on the bridge loop and return its job id without waiting."""
+        job = Job(self, name, timeout)
+        self.jobs[job.id] = job
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, coro), self.bridge.loop)
+        return {"job_id": job.id}
+
+    async def _run(self, job, coro):
+        current_job.set(job)
+        try:
+            if job.timeout:
+                result = await asyncio.wait_for(coro, job.timeout)
+            else:
+                result = await coro
+            self.bridge._emit("onJobResult", job.id, result)
+        except asyncio.CancelledError:
+            print(f"JobManager: {job.name} ({job.id}) cancelled")
+            self.bridge._emit("onJobError", job.id, "Cancelled")
+        except asyncio.TimeoutError:
+            print(f"JobManager: {job.name} ({job.id}) timed out after {job.timeout}s")
+            self.bridge._emit("onJobError", job.id, f"Timed out after {job.timeout}s")
+        except Exception as e:
+            print(f"JobManager: {job.name} ({job.id}) failed: {e}")
+            self.bridge._emit("onJobError", job.id, str(e))
+        finally:
+            self.jobs.pop(job.id, None)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job:
+            return {"success": False, "error": "Job not found"}
+        job.future.cancel()
+        return {"success": True}
+
+    def list_jobs(self):
+        return [job.to_dict() for job in self.jobs.values()]
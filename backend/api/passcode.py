@@ -1,5 +1,7 @@
+import asyncio
 import time
 from backend.core import tg_client
+from backend.core import listing_cache
 
 class PasscodeHandler:
     def __init__(self, bridge):
@@ -44,7 +46,12 @@ class PasscodeHandler:
             self.bridge._failed_passcode_attempts = 0
             self.bridge._passcode_lockout_until = None
             self.bridge._session_passcode = passcode
-            return {"valid": True}
+            result = {"valid": True}
+            from backend.core import reencryption
+            if await asyncio.to_thread(reencryption.load_checkpoint, passcode):
+                # An interrupted passcode change: resume_reencryption needs the old passcode again
+                result["reencryption_pending"] = True
+            return result
         else:
             self.bridge._failed_passcode_attempts += 1
             attempts_remaining = 5 - self.bridge._failed_passcode_attempts
@@ -69,44 +76,88 @@ class PasscodeHandler:
     async def change_passcode(self, old_passcode, new_passcode):
         await self.bridge._ensure_client()
         from backend.core import change_passcode_on_telegram, validate_passcode
+        from backend.core import reencryption
         
         if not validate_passcode(new_passcode):
             return {"error": "New passcode must be exactly 6 digits"}
         
         try:
+            # Checkpoint first: if we die right after the hash swap, the next unlock resumes
+            await asyncio.to_thread(reencryption.save_checkpoint, new_passcode)
             success = await change_passcode_on_telegram(tg_client.client, old_passcode, new_passcode)
             if success:
                 self.bridge._session_passcode = new_passcode
+                # Cache was encrypted with the old passcode
+                listing_cache.clear()
                 
-                # Re-encrypt all V2 metadata messages
-                try:
-                    from backend.core import MetadataManager
-                    print("PasscodeHandler: Starting metadata re-encryption...")
-                    count = 0
-                    async for msg in tg_client.client.iter_messages("me"):
-                        if msg.text and msg.text.startswith("METADATA_V2_ENCRYPTED"):
-                            try:
-                                encrypted_str = msg.text.split("\n", 1)[1]
-                                metadata = MetadataManager.from_json_encrypted(encrypted_str, old_passcode)
-                                new_content = MetadataManager.to_json_encrypted(metadata, new_passcode)
-                                await msg.edit(f"METADATA_V2_ENCRYPTED\n{new_content}")
-                                count += 1
-                            except Exception as e:
-                                print(f"PasscodeHandler: Failed to re-encrypt message {msg.id}: {e}")
-                    print(f"PasscodeHandler: Re-encryption complete. Processed {count} files.")
-                except Exception as e:
-                    print(f"PasscodeHandler: Critical error during re-encryption: {e}")
-                
-                return {"success": True}
+                counts = await self._reencrypt(old_passcode, new_passcode)
+                return {"success": True, **counts}
             else:
+                reencryption.clear_checkpoint()
                 return {"error": "Incorrect old passcode"}
         except ValueError as e:
+            reencryption.clear_checkpoint()
             return {"error": str(e)}
 
+    async def _reencrypt(self, old_passcode, new_passcode, checkpoint=None):
+        """Re-encrypt V2 metadata, pushing progress to the job running this call."""
+        from backend.core import reencryption
+        from backend.api.jobs import report_progress
+        checkpoint = checkpoint or {}
+        
+        print("PasscodeHandler: Starting metadata re-encryption...")
+        try:
+            counts = await reencryption.reencrypt_metadata(
+                tg_client.client,
+                old_passcode,
+                new_passcode,
+                offset_id=checkpoint.get("offset_id", 0),
+                done=checkpoint.get("done", 0),
+                retry_ids=checkpoint.get("failed_ids", ()),
+                progress_callback=lambda done, total: report_progress(stage="reencrypt", done=done, total=total)
+            )
+        except Exception as e:
+            # Checkpoint stays on disk; the next unlock offers to resume from it
+            print(f"PasscodeHandler: Re-encryption interrupted: {e}")
+            return {"reencryption_error": str(e)}
+        print(f"PasscodeHandler: Re-encryption complete: {counts}")
+        return counts
+
+    async def resume_reencryption(self, old_passcode):
+        """
+        Finish an interrupted passcode change.
+
+        The checkpoint never stores the old passcode, so the user enters it
+        again; the session must already be unlocked with the new one.
+        """
+        await self.bridge._ensure_client()
+        from backend.core import reencryption, validate_passcode
+        
+        passcode = self.bridge._session_passcode
+        if not passcode:
+            return {"error": "Unlock with the current passcode first"}
+        if not validate_passcode(old_passcode):
+            return {"error": "Passcode must be exactly 6 digits"}
+        checkpoint = await asyncio.to_thread(reencryption.load_checkpoint, passcode)
+        if not checkpoint:
+            return {"error": "No passcode change to resume"}
+        print(f"PasscodeHandler: Resuming re-encryption from message {checkpoint['offset_id']}")
+        counts = await self._reencrypt(old_passcode, passcode, checkpoint)
+        return {"success": True, **counts}
+
     async def reset_encryption(self):
         await self.bridge._ensure_client()
         from backend.core import reset_all_encrypted_data
-        result = await reset_all_encrypted_data(tg_client.client)
+        from backend.api.jobs import report_progress
+        result = await reset_all_encrypted_data(
+            tg_client.client,
+            progress_callback=lambda deleted, total: report_progress(stage="reset", done=deleted, total=total)
+        )
+        listing_cache.clear()
+        from backend.core import reencryption
+        from backend.core.crypto_utils import forget_derived_keys
+        reencryption.clear_checkpoint()
+        forget_derived_keys()
         
         if hasattr(self.bridge, '_session_passcode'):
             self.bridge._session_passcode = None
@@ -1,7 +1,12 @@
 import asyncio
+import json
+import os
 import threading
 from backend.core import tg_client
+from backend.core.progress import ProgressAggregator, fps_from_env
+from backend.core.metrics import metrics, monitor_loop_lag, install_flood_wait_hook, start_exporter
 from backend.api import AuthHandler, FileHandler, PasscodeHandler
+from backend.api.jobs import JobManager
 
 class Bridge:
     def __init__(self):
@@ -11,22 +16,39 @@ class Bridge:
         self._passcode_lockout_until = None
         self._session_passcode = None
         
+        # One aggregator batches progress of all transfers into a single push per frame
+        self.progress = ProgressAggregator(self._push_progress, fps=fps_from_env())
+        
         # Initialize Handlers
         self.auth = AuthHandler(self)
         self.files = FileHandler(self)
         self.passcode = PasscodeHandler(self)
+        self.jobs = JobManager(self)
         
         # Start a background event loop
         self.loop = asyncio.new_event_loop()
         self.loop_thread = threading.Thread(target=self._start_loop, daemon=True)
         self.loop_thread.start()
+        
+        # Metrics: loop lag sampling, telethon's silent flood waits, optional text exporter
+        asyncio.run_coroutine_threadsafe(monitor_loop_lag(metrics), self.loop)
+        install_flood_wait_hook(metrics)
+        metrics_port = os.getenv("TG_DRIVE_METRICS_PORT")
+        if metrics_port:
+            try:
+                start_exporter(metrics, int(metrics_port))
+            except (OSError, ValueError) as e:
+                print(f"Bridge: Metrics exporter not started: {e}")
 
     def _start_loop(self):
         print("Bridge: Starting background event loop...")
         asyncio.set_event_loop(self.loop)
-        self.loop.create_task(self._startup_check())
         self.loop.run_forever()
 
+    def _on_window_shown(self):
+        """Connect only once the window is visible so the network never delays first paint."""
+        asyncio.run_coroutine_threadsafe(self._startup_check(), self.loop)
+
     async def _startup_check(self):
         print("Bridge: Running startup auth check...")
         try:
@@ -42,6 +64,20 @@ class Bridge:
     def set_window(self, window):
         self._window = window
 
+    def _emit(self, event, *args):
+        """Call window.<event>(*args) in the frontend with JSON-encoded arguments."""
+        if not self._window:
+            return
+        window = self._window[0] if isinstance(self._window, list) else self._window
+        payload = ", ".join(json.dumps(arg) for arg in args)
+        try:
+            window.evaluate_js(f"window.{event} && window.{event}({payload})")
+        except Exception as e:
+            print(f"Bridge: Failed to emit {event}: {e}")
+
+    def _push_progress(self, batch):
+        self._emit("onTransferProgress", batch)
+
     def _run_async(self, coro):
         """Run a coroutine on the background loop and return the result."""
         future = asyncio.run_coroutine_threadsafe(coro, self.loop)
@@ -87,6 +123,9 @@ class Bridge:
     def change_passcode(self, old_passcode, new_passcode):
         return self._run_async(self.passcode.change_passcode(old_passcode, new_passcode))
     
+    def resume_reencryption(self, old_passcode):
+        return self._run_async(self.passcode.resume_reencryption(old_passcode))
+    
     def reset_encryption(self):
         return self._run_async(self.passcode.reset_encryption())
 
@@ -103,6 +142,26 @@ class Bridge:
     def list_files(self):
         return self._run_async(self.files.list_files())
 
+    def get_cached_files(self):
+        return self.files.get_cached_files()
+
+    def get_metrics(self):
+        """Snapshot of transfer metrics (latency histograms, bytes/s per DC, gauges)."""
+        return metrics.snapshot()
+
+    def get_concurrency(self):
+        """State of the adaptive upload / download concurrency limits."""
+        from backend.core import concurrency
+        return concurrency.snapshot()
+
+    def set_transfer_tracing(self, enabled, profiler="unchanged"):
+        """Record a Chrome trace (and optionally a cProfile / sampling profile) per transfer; profiler is kept unless given."""
+        from backend.core import tracing
+        try:
+            return tracing.configure(enabled=enabled, profiler=profiler)
+        except ValueError as e:
+            return {"error": str(e)}
+
     def pick_and_upload_file(self):
         # This one is synchronous wrapper around async logic inside handler
         return self.files.pick_and_upload_file()
@@ -111,7 +170,45 @@ class Bridge:
         return self.files.download_file(file_id)
 
     def rename_file(self, file_id, new_name, metadata_message_id):
-        return self.files.rename_file(file_id, new_name, metadata_message_id)
+        return self._run_async(self.files.rename_file(file_id, new_name, metadata_message_id))
 
     def delete_file(self, file_id, metadata_message_id):
-        return self.files.delete_file(file_id, metadata_message_id)
+        return self._run_async(self.files.delete_file(file_id, metadata_message_id))
+
+    def delete_files(self, files):
+        return self._run_async(self.files.delete_files(files))
+
+    def collect_garbage(self, dry_run=True, incremental=True, grace_hours=24):
+        return self._run_async(self.files.collect_garbage(dry_run, incremental, grace_hours))
+
+    # --- Jobs (non-blocking calls) ---
+
+    def _job_methods(self):
+        """Bridge calls that can run as jobs: name -> (coroutine factory, default timeout in seconds)."""
+        return {
+            "check_auth": (self.auth.check_auth, 60),
+            "list_files": (self.files.list_files, 120),
+            "rename_file": (self.files.rename_file, 60),
+            "delete_file": (self.files.delete_file, 120),
+            "delete_files": (self.files.delete_files, None),
+            "collect_garbage": (self.files.collect_garbage, None),
+            "has_passcode": (self.passcode.has_passcode, 60),
+            "verify_passcode": (self.passcode.verify_passcode, 60),
+            "change_passcode": (self.passcode.change_passcode, None),
+            "resume_reencryption": (self.passcode.resume_reencryption, None),
+            "reset_encryption": (self.passcode.reset_encryption, None),
+        }
+
+    def start_job(self, method, args=None, timeout=None):
+        """Start a bridge call without blocking; the result is pushed to window.onJobResult."""
+        entry = self._job_methods().get(method)
+        if not entry:
+            return {"error": f"Unknown job method: {method}"}
+        factory, default_timeout = entry
+        return self.jobs.start(method, factory(*(args or [])), timeout or default_timeout)
+
+    def cancel_job(self, job_id):
+        return self.jobs.cancel(job_id)
+
+    def list_jobs(self):
+        return self.jobs.list_jobs()
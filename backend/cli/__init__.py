@@ -0,0 +1,2 @@
+from .headless import HeadlessBridge
+from .commands import CommandError, run_command
@@ -0,0 +1,310 @@
+"""
+Headless commands shared by the one-shot CLI and the daemon.
+
+Every command is `async def cmd_x(bridge, params) -> dict`: params is a
+plain dict (so daemon requests and argparse results look the same) and the
+result is JSON-serializable. User-facing failures raise CommandError.
+"""
+import asyncio
+import os
+from backend.core import tg_client
+
+
+class CommandError(Exception):
+    pass
+
+
+DEFAULT_PARALLEL = 2  # files at a time; each file already uploads parts in parallel
+
+
+async def require_login(bridge):
+    await bridge._ensure_client()
+    if not await tg_client.is_user_authorized():
+        raise CommandError("Not logged in. Run the 'login' command first.")
+
+
+async def unlock(bridge, passcode=None, prompt=None):
+    """
+    Verify the session passcode if the account has one (needed to read V2 metadata).
+    
+    Args:
+        bridge: HeadlessBridge
+        passcode: Passcode from the command line / environment
+        prompt: Optional async callable asking the user when no passcode was given
+    """
+    if bridge._session_passcode:
+        return
+    if not (await bridge.passcode.has_passcode())["has_passcode"]:
+        return
+    if not passcode and prompt:
+        passcode = await prompt()
+    if not passcode:
+        raise CommandError("This account is passcode protected; pass --passcode or set TG_DRIVE_PASSCODE.")
+    result = await bridge.passcode.verify_passcode(passcode)
+    if not result.get("valid"):
+        raise CommandError(result.get("message", "Incorrect passcode"))
+
+
+def resolve_files(rows, refs):
+    """
+    Match file references against listing rows.
+
+    A reference is a file id, a unique id prefix or an exact file name.
+    """
+    matched = []
+    for ref in refs:
+        hits = [r for r in rows if r["id"] == ref or r["name"] == ref]
+        if not hits:
+            hits = [r for r in rows if r["id"].startswith(ref)]
+        if not hits:
+            raise CommandError(f"No such file: {ref}")
+        if len(hits) > 1:
+            raise CommandError(f"Ambiguous reference {ref!r}: matches {len(hits)} files, use the id")
+        matched.append(hits[0])
+    return matched
+
+
+def _target_path(base, name):
+    """Join a remote name (may contain '/') under base, refusing names that escape it."""
+    base = os.path.abspath(base)
+    path = os.path.abspath(os.path.join(base, *name.split("/")))
+    if os.path.commonpath([base, path]) != base:
+        raise CommandError(f"Refusing to write outside {base}: {name}")
+    return path
+
+
+async def _bounded(coros, limit):
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+async def cmd_whoami(bridge, params):
+    return await bridge.auth.check_auth()
+
+
+async def cmd_ls(bridge, params):
+    return {"files": await bridge.files.list_all_files()}
+
+
+async def cmd_upload(bridge, params):
+    paths = params["paths"]
+    if paths == ["-"]:
+        return await _upload_stdin(bridge, params)
+    for path in paths:
+        if not os.path.isfile(path):
+            raise CommandError(f"Not a file: {path}")
+
+    results = await _bounded(
+        [bridge.files._upload_logic(path) for path in paths],
+        params.get("parallel") or DEFAULT_PARALLEL
+    )
+    uploaded, failed = [], []
+    for path, result in zip(paths, results):
+        if "error" in result:
+            failed.append({"path": path, "error": result["error"]})
+        else:
+            uploaded.append({"path": path, **result["file"]})
+    return {"uploaded": uploaded, "failed": failed}
+
+
+async def _upload_stdin(bridge, params):
+    # Only the local CLI attaches the stream; a daemon has no caller's stdin to read
+    stream = params.get("stream")
+    if stream is None or not params.get("name"):
+        raise CommandError("Standard input uploads need a local stream and a name")
+    result = await bridge.files._upload_stream_logic(stream, params["name"])
+    if "error" in result:
+        return {"uploaded": [], "failed": [{"path": "-", "name": params["name"], "error": result["error"]}]}
+    return {"uploaded": [{"path": "-", **result["file"]}], "failed": []}
+
+
+async def cmd_download(bridge, params):
+    from backend.core.metadata_manager import FileMetadata
+    rows = resolve_files(await bridge.files.list_all_files(), params["files"])
+    out = params.get("out")
+    if out == "-":
+        return await _download_stdout(bridge, rows, params)
+    single_target = out and len(rows) == 1 and not params.get("out_is_dir") and not os.path.isdir(out)
+
+    async def download(row):
+        save_path = out if single_target else None
+        try:
+            save_path = save_path or _target_path(out or os.getcwd(), row["name"])
+            os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+            # The row is already full metadata; skip download_to_path's lookup
+            return await bridge.files.download_to_path(row["id"], save_path, FileMetadata.model_validate(row))
+        except Exception as e:
+            return {"file_id": row["id"], "path": save_path, "error": str(e)}
+
+    results = await _bounded([download(r) for r in rows], params.get("parallel") or DEFAULT_PARALLEL)
+    return {
+        "downloaded": [r for r in results if "error" not in r],
+        "failed": [r for r in results if "error" in r],
+    }
+
+
+async def _download_stdout(bridge, rows, params):
+    from backend.core.metadata_manager import FileMetadata
+    # Only the local CLI attaches the sink; a daemon has no caller's stdout to write
+    sink = params.get("sink")
+    if sink is None or len(rows) != 1:
+        raise CommandError("Standard output downloads need a local stream and exactly one file")
+    row = rows[0]
+    try:
+        async for data in bridge.files.iter_file(row["id"], FileMetadata.model_validate(row)):
+            # A blocking write to a pipe must not stall the event loop
+            await asyncio.to_thread(sink.write, data)
+        await asyncio.to_thread(sink.flush)
+    except Exception as e:
+        return {"downloaded": [], "failed": [{"file_id": row["id"], "path": "-", "error": str(e)}]}
+    return {"downloaded": [{"file_id": row["id"], "path": "-", "size": row["size"]}], "failed": []}
+
+
+async def cmd_rm(bridge, params):
+    rows = resolve_files(await bridge.files.list_all_files(), params["files"])
+    result = await bridge.files.delete_files(rows)
+    names = {r["id"]: r["name"] for r in rows}
+    deleted, failed = [], []
+    for file_id, outcome in result["results"].items():
+        if "error" in outcome:
+            failed.append({"id": file_id, "name": names.get(file_id), "error": outcome["error"]})
+        else:
+            deleted.append({"id": file_id, "name": names.get(file_id)})
+    return {"deleted": deleted, "failed": failed}
+
+
+_sync_locks = {}  # state path -> asyncio.Lock (daemon periodic sync vs. a manual one)
+
+
+def _plan_summary(plan):
+    """JSON-friendly view of a folder_sync plan."""
+    return {
+        "upload": [{"name": p["name"], "size": p["size"]} for p in plan["upload"]],
+        "update": [{"name": p["name"], "size": p["size"]} for p in plan["update"]],
+        "delete": [{"name": p["name"], "id": p["id"], "size": p["size"]} for p in plan["delete"]],
+        "unchanged": plan["unchanged"],
+        "hashed": plan["hashed"],
+    }
+
+
+async def cmd_sync(bridge, params):
+    """
+    Incrementally sync a directory (see backend.core.folder_sync).
+
+    Params: directory, prefix (remote name prefix), mirror (delete remote files
+    missing locally), rescan (rebuild the remote view from the full catalog),
+    dry_run, parallel. The plan is emitted as "onSyncPlan" before anything is
+    transferred.
+    """
+    from backend.core import folder_sync
+
+    root = os.path.abspath(params["directory"])
+    if not os.path.isdir(root):
+        raise CommandError(f"Not a directory: {root}")
+    prefix = (params.get("prefix") or "").strip("/")
+
+    lock = _sync_locks.setdefault(folder_sync.state_path(root, prefix), asyncio.Lock())
+    if lock.locked():
+        raise CommandError(f"A sync of {root} is already running")
+    async with lock:
+        return await _sync(bridge, root, prefix, params)
+
+
+async def _sync(bridge, root, prefix, params):
+    from backend.core import folder_sync
+    from backend.core.hash_cache import hash_cache
+
+    passcode = bridge._session_passcode
+    local = await asyncio.to_thread(folder_sync.scan_directory, root)
+    state = folder_sync.load_state(root, prefix)
+    if state is None:
+        state = {"root": root, "prefix": prefix, "files": {}}
+        await folder_sync.refresh_from_catalog(tg_client.client, passcode, state)
+    elif params.get("rescan"):
+        await folder_sync.refresh_from_catalog(tg_client.client, passcode, state)
+    else:
+        await folder_sync.drop_missing(tg_client.client, state)
+
+    plan = await folder_sync.build_plan(local, state, mirror=bool(params.get("mirror")))
+    summary = _plan_summary(plan)
+    bridge._emit("onSyncPlan", summary)
+
+    result = {"plan": summary, "uploaded": [], "deleted": [], "failed": []}
+    if params.get("dry_run"):
+        folder_sync.save_state(state)  # keeps hash confirmations
+        hash_cache.flush()
+        return result
+
+    async def upload(item):
+        outcome = await bridge.files._upload_logic(item["path"], name=folder_sync.remote_name(prefix, item["name"]))
+        if "error" in outcome:
+            result["failed"].append({"name": item["name"], "path": item["path"], "error": outcome["error"]})
+            return None
+        # A file modified while it uploaded gets re-hashed on the next run
+        try:
+            st = os.stat(item["path"])
+            stable = st.st_mtime_ns == item["mtime_ns"] and st.st_size == item["size"]
+        except OSError:
+            stable = False
+        state["files"][item["name"]] = folder_sync.entry_from_row(outcome["file"], item["mtime_ns"] if stable else None)
+        result["uploaded"].append({"name": item["name"], "path": item["path"], "id": outcome["file_id"]})
+        return item
+
+    try:
+        done = await _bounded(
+            [upload(item) for item in plan["upload"] + plan["update"]],
+            params.get("parallel") or DEFAULT_PARALLEL
+        )
+
+        # Mirrored deletions, plus the old versions of re-uploaded files
+        replaced = [{"name": item["name"], **item["replaces"]} for item in done if item and "replaces" in item]
+        removals = plan["delete"] + replaced
+        if removals:
+            outcome = await bridge.files.delete_files(
+                [{"id": r["id"], "metadata_message_id": r["metadata_message_id"]} for r in removals]
+            )
+            errors = {file_id: o["error"] for file_id, o in outcome["results"].items() if "error" in o}
+            for r in removals:
+                if r["id"] in errors:
+                    result["failed"].append({"name": r["name"], "id": r["id"], "error": f"delete: {errors[r['id']]}"})
+            for r in plan["delete"]:
+                if r["id"] not in errors:
+                    state["files"].pop(r["name"], None)
+                    result["deleted"].append({"name": r["name"], "id": r["id"]})
+    finally:
+        folder_sync.save_state(state)
+        hash_cache.flush()
+    return result
+
+
+async def cmd_metrics(bridge, params):
+    from backend.core.metrics import metrics
+    return metrics.snapshot()
+
+
+# name -> (handler, needs an unlocked session)
+COMMANDS = {
+    "whoami": (cmd_whoami, False),
+    "ls": (cmd_ls, True),
+    "upload": (cmd_upload, True),
+    "download": (cmd_download, True),
+    "rm": (cmd_rm, True),
+    "sync": (cmd_sync, True),
+    "metrics": (cmd_metrics, False),
+}
+
+
+async def run_command(bridge, name, params, passcode=None, prompt=None):
+    """Run one command on a ready bridge (login and unlock checks included)."""
+    if name not in COMMANDS:
+        raise CommandError(f"Unknown command: {name}")
+    handler, needs_session = COMMANDS[name]
+    if needs_session:
+        await require_login(bridge)
+        await unlock(bridge, passcode, prompt)
+    return await handler(bridge, params)
@@ -0,0 +1,218 @@
+"""
+Long-running daemon mode.
+
+Keeps one connected client and one unlocked session, and accepts commands
+as JSON lines over a local TCP socket:
+
+    -> {"id": "1", "command": "upload", "params": {"paths": ["/data/a.bin"]}, "token": "..."}
+    <- {"event": "progress", "transfers": [...]}        (any number, authenticated connections)
+    <- {"id": "1", "result": {...}}  or  {"id": "1", "error": "..."}
+
+Requests on a connection run concurrently. The one-shot CLI forwards to a
+daemon with --daemon HOST:PORT, so repeated commands skip connecting and
+unlocking. Optionally the daemon re-runs `sync` on a directory periodically.
+
+Every request must carry the daemon's token. Without --token one is
+generated on first start and kept in a file only the user can read, next
+to the session; local clients read it from there. Listening on anything
+but loopback requires an explicit --token.
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import uuid
+from typing import Optional
+
+from backend.core.client import SESSION_NAME
+from .commands import CommandError, run_command
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TOKEN_PATH = os.path.join(os.path.dirname(SESSION_NAME), "daemon_token")
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port or DEFAULT_PORT)
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def load_token() -> Optional[str]:
+    """The stored daemon token, or None if the daemon never generated one."""
+    try:
+        with open(TOKEN_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def ensure_token() -> str:
+    """The stored daemon token, generated (readable by the user only) on first use."""
+    token = load_token()
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(TOKEN_PATH) or ".", exist_ok=True)
+    # Write-then-rename; the mode is set explicitly since O_CREAT's is masked by umask
+    tmp_path = TOKEN_PATH + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, TOKEN_PATH)
+    return token
+
+
+async def serve(bridge, broadcast, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, passcode=None,
+                sync_directory=None, sync_interval=300):
+    """
+    Serve commands until cancelled.
+
+    Args:
+        bridge: HeadlessBridge (logged in, unlocked by the caller)
+        broadcast: BroadcastSink the bridge's progress aggregator writes to
+        host, port: Listen address (non-loopback hosts need an explicit token)
+        token: Shared secret every request must carry (default: the stored,
+               generated token)
+        passcode: Passcode used if the session has to be unlocked again
+        sync_directory: Directory to sync every sync_interval seconds
+        sync_interval: Seconds between periodic syncs
+
+    Raises:
+        CommandError: If a non-loopback host is given without a token
+    """
+    if not token:
+        if not is_loopback(host):
+            raise CommandError(f"Refusing to listen on {host} without --token")
+        token = ensure_token()
+        print(f"Daemon: Token stored in {TOKEN_PATH}")
+
+    async def handle(reader, writer):
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        subscribed = False
+
+        def write(message):
+            if not writer.is_closing():
+                writer.write((json.dumps(message) + "\n").encode())
+
+        def progress(batch):
+            loop.call_soon_threadsafe(write, {"event": "progress", "transfers": batch})
+
+        def subscribe():
+            # Progress names files: only connections that proved the token get it
+            nonlocal subscribed
+            if not subscribed:
+                subscribed = True
+                broadcast.add(progress)
+
+        async def process(request):
+            request_id = request.get("id")
+            try:
+                if not hmac.compare_digest(str(request.get("token", "")), token):
+                    raise CommandError("Invalid token")
+                subscribe()
+                if request.get("command") == "ping":
+                    result = {"pong": True}
+                else:
+                    result = await run_command(bridge, request.get("command"), request.get("params") or {}, passcode)
+                write({"id": request_id, "result": result})
+            except CommandError as e:
+                write({"id": request_id, "error": str(e)})
+            except Exception as e:
+                print(f"Daemon: {request.get('command')} failed: {e}")
+                write({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    write({"error": "Invalid JSON"})
+                    continue
+                task = asyncio.create_task(process(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # Client closed its side; let its requests finish before closing ours
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if subscribed:
+                broadcast.remove(progress)
+            writer.close()
+
+    async def periodic_sync():
+        while True:
+            try:
+                result = await run_command(bridge, "sync", {"directory": sync_directory}, passcode)
+                print(f"Daemon: sync of {sync_directory}: {len(result['uploaded'])} uploaded, "
+                      f"{len(result['failed'])} failed")
+            except Exception as e:
+                print(f"Daemon: sync of {sync_directory} failed: {e}")
+            await asyncio.sleep(sync_interval)
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Daemon: Listening on {host}:{port}")
+    sync_task = asyncio.create_task(periodic_sync()) if sync_directory else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if sync_task:
+            sync_task.cancel()
+
+
+async def call_daemon(address, command, params, token=None, on_progress=None):
+    """
+    Send one command to a running daemon and wait for its result.
+
+    Without a token, the one a local daemon stored is sent.
+
+    Raises:
+        CommandError: If the daemon reports an error or cannot be reached
+    """
+    host, port = parse_address(address)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        raise CommandError(f"Cannot reach daemon at {host}:{port}: {e}")
+
+    request_id = uuid.uuid4().hex
+    request = {"id": request_id, "command": command, "params": params}
+    token = token or load_token()
+    if token:
+        request["token"] = token
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise CommandError("Daemon closed the connection")
+            message = json.loads(line)
+            if message.get("event") == "progress":
+                if on_progress:
+                    on_progress(message["transfers"])
+                continue
+            if message.get("id") != request_id:
+                continue
+            if "error" in message:
+                raise CommandError(message["error"])
+            return message["result"]
+    finally:
+        writer.close()
@@ -0,0 +1,49 @@
+import asyncio
+from backend.core import tg_client
+from backend.core.progress import ProgressAggregator
+from backend.api import AuthHandler, FileHandler, PasscodeHandler
+from backend.api.jobs import JobManager
+
+
+class HeadlessBridge:
+    """
+    Window-less stand-in for backend.bridge.Bridge.
+
+    Handlers only need the bridge's state, `loop`, `progress`, `jobs`,
+    `_ensure_client` and `_emit`; here events go to registered listeners
+    and progress batches go to a pluggable sink instead of evaluate_js.
+    The loop is the caller's (asyncio.run), not a background thread.
+    """
+
+    def __init__(self, sink=None, fps=None):
+        self._window = None
+        self._failed_passcode_attempts = 0
+        self._passcode_lockout_until = None
+        self._session_passcode = None
+        self.loop = None
+        self.listeners = []  # callables(event, args)
+
+        self.progress = ProgressAggregator(sink or (lambda batch: None), fps=fps)
+
+        self.auth = AuthHandler(self)
+        self.files = FileHandler(self)
+        self.passcode = PasscodeHandler(self)
+        self.jobs = JobManager(self)
+
+    def attach_loop(self):
+        """Bind to the running event loop (call from inside asyncio.run)."""
+        self.loop = asyncio.get_running_loop()
+
+    async def _ensure_client(self):
+        if not tg_client.client or not tg_client.client.is_connected():
+            await tg_client.start()
+
+    def _emit(self, event, *args):
+        for listener in list(self.listeners):
+            try:
+                listener(event, args)
+            except Exception as e:
+                print(f"HeadlessBridge: listener failed for {event}: {e}")
+
+    async def close(self):
+        await tg_client.stop()
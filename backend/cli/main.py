@@ -0,0 +1,330 @@
+"""
+Headless command-line interface.
+
+    python cli.py login
+    python cli.py ls
+    python cli.py upload a.bin b.bin --parallel 2
+    pg_dump mydb | python cli.py upload - --name mydb.sql
+    python cli.py download <id|name> --out ./restore/
+    python cli.py download backup.tar --out - | tar -x
+    python cli.py rm <id|name> --yes
+    python cli.py sync ~/Documents --prefix Documents --delete --dry-run
+    python cli.py daemon --port 8765
+    python cli.py --daemon 127.0.0.1:8765 upload big.iso
+
+Results go to stdout (as JSON with --json); progress and diagnostics go
+to stderr. The passcode is taken from --passcode, TG_DRIVE_PASSCODE or an
+interactive prompt.
+"""
+import argparse
+import asyncio
+import getpass
+import json
+import logging
+import os
+import sys
+from contextlib import redirect_stdout
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tg-drive", description="TG-Drive headless client")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--passcode", default=os.getenv("TG_DRIVE_PASSCODE"), help="Session passcode (or TG_DRIVE_PASSCODE)")
+    parser.add_argument("--progress", choices=("auto", "bar", "json", "none"), default="auto",
+                        help="Progress output on stderr (auto: bar on a terminal, none otherwise)")
+    parser.add_argument("--daemon", metavar="HOST:PORT", help="Send the command to a running daemon")
+    parser.add_argument("--token", default=os.getenv("TG_DRIVE_DAEMON_TOKEN"), help="Daemon token (or TG_DRIVE_DAEMON_TOKEN; default: the one a local daemon stored)")
+    parser.add_argument("--trace", action="store_true", help="Save a Chrome trace per transfer")
+    parser.add_argument("--profile", choices=("cprofile", "sampling"), help="Profile each transfer")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show handler and client logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("login", help="Sign in with phone number and code")
+    p.add_argument("--phone")
+
+    sub.add_parser("whoami", help="Show the signed-in account")
+    sub.add_parser("ls", help="List files")
+
+    p = sub.add_parser("upload", help="Upload files")
+    p.add_argument("paths", nargs="+", help="Files to upload ('-' uploads standard input)")
+    p.add_argument("--name", help="Remote name for a standard input upload")
+    p.add_argument("--parallel", type=int, default=None, help="Files uploaded at once")
+
+    p = sub.add_parser("download", help="Download files by id, id prefix or name")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--out", help="Target file (single download) or directory; '-' writes to standard output")
+    p.add_argument("--parallel", type=int, default=None, help="Files downloaded at once")
+
+    p = sub.add_parser("rm", help="Delete files by id, id prefix or name")
+    p.add_argument("files", nargs="+")
+    p.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation")
+
+    p = sub.add_parser("sync", help="Upload new and changed files from a directory")
+    p.add_argument("directory")
+    p.add_argument("--prefix", default="", help="Remote name prefix for the directory's files")
+    p.add_argument("--delete", action="store_true", help="Delete remote files missing locally")
+    p.add_argument("--rescan", action="store_true", help="Rebuild the remote view from the full catalog")
+    p.add_argument("--dry-run", action="store_true", help="Only print the plan")
+    p.add_argument("--parallel", type=int, default=None, help="Files uploaded at once")
+
+    sub.add_parser("metrics", help="Print transfer metrics")
+
+    p = sub.add_parser("daemon", help="Run as a long-lived command server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--sync", metavar="DIRECTORY", help="Also sync this directory periodically")
+    p.add_argument("--interval", type=int, default=300, help="Seconds between periodic syncs")
+    # Also accepted after the subcommand; SUPPRESS keeps the global value when absent
+    p.add_argument("--token", default=argparse.SUPPRESS,
+                   help="Token clients must send (default: generated and stored next to the session; "
+                        "required for a non-loopback --host)")
+    return parser
+
+
+def command_params(args):
+    """The command's own arguments as a JSON-friendly dict (paths made absolute for the daemon)."""
+    params = {}
+    if args.command == "upload":
+        params = {"paths": [p if p == "-" else os.path.abspath(p) for p in args.paths],
+                  "name": args.name, "parallel": args.parallel}
+    elif args.command == "download":
+        out = args.out if args.out == "-" else os.path.abspath(args.out) if args.out else os.getcwd()
+        params = {"files": args.files, "out": out,
+                  "out_is_dir": not args.out or args.out.endswith(("/", os.sep)), "parallel": args.parallel}
+    elif args.command == "rm":
+        params = {"files": args.files}
+    elif args.command == "sync":
+        params = {"directory": os.path.abspath(args.directory), "prefix": args.prefix, "mirror": args.delete,
+                  "rescan": args.rescan, "dry_run": args.dry_run, "parallel": args.parallel}
+    return params
+
+
+def make_sink(args):
+    from .sinks import TerminalSink, JsonLinesSink, null_sink
+    mode = args.progress
+    if mode == "auto":
+        mode = "bar" if sys.stderr.isatty() and not args.json else "none"
+    if mode == "bar":
+        return TerminalSink(sys.stderr)
+    if mode == "json":
+        return JsonLinesSink(sys.stderr)
+    return null_sink
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def plan_lines(plan):
+    """Human-readable lines for a sync plan."""
+    lines = [f"+ {p['name']}  ({human_size(p['size'])})" for p in plan["upload"]]
+    lines += [f"~ {p['name']}  ({human_size(p['size'])})" for p in plan["update"]]
+    lines += [f"- {p['name']}" for p in plan["delete"]]
+    lines.append(f"Plan: {len(plan['upload'])} new, {len(plan['update'])} changed, "
+                 f"{len(plan['delete'])} to delete, {plan['unchanged']} unchanged ({plan['hashed']} hashed)")
+    return lines
+
+
+def format_result(command, result):
+    """Human-readable lines for a command result."""
+    lines = []
+    if command == "login":
+        lines.append("Already logged in" if result.get("already_logged_in") else "Logged in")
+    elif command == "whoami":
+        user = result.get("user")
+        if result.get("authenticated") and user:
+            handle = f" (@{user['username']})" if user.get("username") else ""
+            lines.append(f"Logged in as {user.get('first_name') or ''}{handle}")
+        else:
+            lines.append("Not logged in")
+    elif command == "ls":
+        for f in result["files"]:
+            lines.append(f"{f['id'][:8]}  {human_size(f['size']):>10}  {f['name']}")
+        lines.append(f"{len(result['files'])} files")
+    elif command == "upload":
+        lines += [f"✓ {f['name']}  {f['id']}" for f in result["uploaded"]]
+    elif command == "download":
+        lines += [f"✓ {f['path']}" for f in result["downloaded"]]
+    elif command == "rm":
+        lines += [f"✓ deleted {f['name']}" for f in result["deleted"]]
+    elif command == "sync":
+        lines += [f"✓ uploaded {f['name']}" for f in result["uploaded"]]
+        lines += [f"✓ deleted {f['name']}" for f in result["deleted"]]
+        lines.append(f"{len(result['uploaded'])} uploaded, {len(result['deleted'])} deleted, "
+                     f"{len(result['failed'])} failed")
+    elif command == "metrics":
+        lines.append(json.dumps(result, indent=2))
+    for f in result.get("failed", []) if isinstance(result, dict) else []:
+        lines.append(f"✗ {f.get('name') or f.get('path') or f.get('id')}: {f['error']}")
+    return lines
+
+
+def ask(prompt):
+    """input() that prompts on stderr (stdout is reserved for results)."""
+    sys.stderr.write(prompt)
+    sys.stderr.flush()
+    return input()
+
+
+async def prompt_passcode():
+    if not sys.stdin.isatty():
+        return None
+    return await asyncio.to_thread(getpass.getpass, "Passcode: ")
+
+
+async def login(bridge, phone):
+    from backend.core import tg_client
+    from .commands import CommandError
+    await bridge._ensure_client()
+    if await tg_client.is_user_authorized():
+        return {"success": True, "already_logged_in": True}
+    if not sys.stdin.isatty():
+        raise CommandError("login is interactive; run it from a terminal")
+
+    phone = phone or await asyncio.to_thread(ask, "Phone number (international format): ")
+    await bridge.auth.request_code(phone)
+    code = await asyncio.to_thread(ask, "Code: ")
+    result = await bridge.auth.sign_in(phone, code)
+    if result.get("status") == "needs_password":
+        password = await asyncio.to_thread(getpass.getpass, "Two-step verification password: ")
+        result = await bridge.auth.sign_in(phone, code, password)
+    if "error" in result:
+        raise CommandError(result["error"])
+    return {"success": True}
+
+
+async def run_local(args, sink, out):
+    from .headless import HeadlessBridge
+    from .commands import run_command
+    from .sinks import BroadcastSink
+
+    broadcast = BroadcastSink() if args.command == "daemon" else None
+    if broadcast:
+        broadcast.add(sink)
+    bridge = HeadlessBridge(sink=broadcast or sink)
+    bridge.attach_loop()
+    if args.command == "sync" and not args.json:
+        # Show the plan before anything is transferred
+        def print_plan(event, event_args):
+            if event == "onSyncPlan":
+                if hasattr(sink, "clear"):
+                    sink.clear()
+                for line in plan_lines(event_args[0]):
+                    print(line, file=out, flush=True)
+        bridge.listeners.append(print_plan)
+    try:
+        if args.command == "login":
+            return await login(bridge, args.phone)
+        if args.command == "daemon":
+            from backend.core.metrics import metrics, monitor_loop_lag, install_flood_wait_hook
+            from .commands import require_login, unlock
+            from .daemon import serve
+            install_flood_wait_hook(metrics)
+            asyncio.create_task(monitor_loop_lag(metrics))
+            await require_login(bridge)
+            await unlock(bridge, args.passcode, prompt_passcode)
+            await serve(bridge, broadcast, args.host, args.port, args.token, args.passcode,
+                        sync_directory=os.path.abspath(args.sync) if args.sync else None,
+                        sync_interval=args.interval)
+            return {}
+        params = command_params(args)
+        if args.command == "upload" and params["paths"] == ["-"]:
+            params["stream"] = sys.stdin.buffer
+        if args.command == "download" and params["out"] == "-":
+            params["sink"] = args.data_out
+        return await run_command(bridge, args.command, params, args.passcode, prompt_passcode)
+    finally:
+        await bridge.close()
+
+
+async def run_remote(args, sink, out):
+    from .daemon import call_daemon
+    result = await call_daemon(args.daemon, args.command, command_params(args), args.token, on_progress=sink)
+    if args.command == "sync" and not args.json:
+        # The daemon only returns the plan along with the result
+        for line in plan_lines(result["plan"]):
+            print(line, file=out)
+    return result
+
+
+def confirm_delete(args):
+    if args.yes or not sys.stdin.isatty():
+        return True
+    answer = input(f"Delete {len(args.files)} file(s)? [y/N] ")
+    return answer.strip().lower() in ("y", "yes")
+
+
+def main(argv=None):
+    from .commands import CommandError
+
+    args = build_parser().parse_args(argv)
+    if args.daemon and args.command in ("login", "daemon"):
+        print(f"error: {args.command} cannot be sent to a daemon", file=sys.stderr)
+        return 2
+    if args.command == "daemon" and not args.token:
+        from .daemon import is_loopback
+        if not is_loopback(args.host):
+            print(f"error: refusing to listen on {args.host} without --token", file=sys.stderr)
+            return 2
+    if args.command == "upload" and "-" in args.paths:
+        problem = ("'-' cannot be combined with other paths" if len(args.paths) > 1
+                   else "--name is required when uploading standard input" if not args.name
+                   else "standard input cannot be sent to a daemon" if args.daemon else None)
+        if problem:
+            print(f"error: {problem}", file=sys.stderr)
+            return 2
+    if args.command == "download" and args.out == "-":
+        problem = ("--out - takes exactly one file" if len(args.files) != 1
+                   else "standard output cannot be sent from a daemon" if args.daemon else None)
+        if problem:
+            print(f"error: {problem}", file=sys.stderr)
+            return 2
+    if args.command == "rm" and not confirm_delete(args):
+        return 1
+
+    # Handlers print diagnostics; keep stdout for results only (or for the file itself)
+    args.data_out = sys.stdout.buffer if args.command == "download" and args.out == "-" else None
+    results_out = sys.stderr if args.data_out else sys.stdout
+    diagnostics = sys.stderr if args.verbose else open(os.devnull, "w")
+    import backend.core.client  # noqa: F401  (configures logging on import)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if args.trace or args.profile:
+        from backend.core import tracing
+        tracing.configure(enabled=args.trace, profiler=args.profile)
+
+    sink = make_sink(args)
+    try:
+        with redirect_stdout(diagnostics):
+            runner = run_remote if args.daemon else run_local
+            result = asyncio.run(runner(args, sink, results_out))
+    except CommandError as e:
+        error = str(e)
+    except OSError as e:
+        # Telegram or the daemon unreachable (ConnectionError, timeouts, DNS)
+        error = str(e) or type(e).__name__
+    except KeyboardInterrupt:
+        return 130
+    else:
+        error = None
+    finally:
+        if hasattr(sink, "clear"):
+            sink.clear()
+
+    if error:
+        if args.json:
+            print(json.dumps({"error": error}), file=results_out)
+        else:
+            print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(result, indent=2), file=results_out)
+    else:
+        for line in format_result(args.command, result):
+            print(line, file=results_out)
+    return 1 if isinstance(result, dict) and result.get("failed") else 0
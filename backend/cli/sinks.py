@@ -0,0 +1,80 @@
+"""
+Progress sinks for ProgressAggregator outside the webview.
+
+A sink is any callable taking the batch of per-transfer payloads the
+aggregator flushes (see backend.core.progress). It is called from the
+aggregator's thread.
+"""
+import json
+import sys
+import threading
+
+
+def null_sink(batch):
+    pass
+
+
+class TerminalSink:
+    """Redraws one status line per flush on a terminal (stderr)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.lock = threading.Lock()
+        self.width = 0
+
+    def __call__(self, batch):
+        parts = []
+        for t in batch:
+            arrow = "↑" if t["kind"] == "upload" else "↓"
+            parts.append(f"{arrow} {t['name'] or t['id'][:8]} {t['progress']:3d}% {t['speed']}")
+        line = " | ".join(parts)
+        with self.lock:
+            pad = max(0, self.width - len(line))
+            self.stream.write("\r" + line + " " * pad)
+            self.stream.flush()
+            self.width = len(line)
+
+    def clear(self):
+        """Erase the status line (before printing a result)."""
+        with self.lock:
+            if self.width:
+                self.stream.write("\r" + " " * self.width + "\r")
+                self.stream.flush()
+                self.width = 0
+
+
+class JsonLinesSink:
+    """Writes {"event": "progress", "transfers": [...]} as one JSON line per flush."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        line = json.dumps({"event": "progress", "transfers": batch})
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class BroadcastSink:
+    """Fans one batch out to sinks added and removed at runtime (daemon connections)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sinks = []
+
+    def add(self, sink):
+        with self.lock:
+            self.sinks.append(sink)
+
+    def remove(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def __call__(self, batch):
+        with self.lock:
+            sinks = list(self.sinks)
+        for sink in sinks:
+            sink(batch)
@@ -1,11 +1,36 @@
-from .client import tg_client
-from .metadata_manager import MetadataManager, FileMetadata, FileChunk
-from .file_manager import split_file, get_file_hash, merge_files, CHUNK_SIZE
-from .crypto_utils import validate_passcode, encrypt_data, decrypt_data
-from .passcode_manager import (
-    has_passcode_on_telegram, 
-    set_passcode_on_telegram, 
-    verify_passcode_from_telegram, 
-    change_passcode_on_telegram, 
-    reset_all_encrypted_data
-)
+"""
+Core package. Exports are resolved lazily (PEP 562) so importing backend.core
+does not pull in telethon, pydantic or cryptography until they are used.
+"""
+import importlib
+
+_EXPORTS = {
+    "tg_client": ".client",
+    "MetadataManager": ".metadata_manager",
+    "FileMetadata": ".metadata_manager",
+    "FileChunk": ".metadata_manager",
+    "split_file": ".file_manager",
+    "get_file_hash": ".file_manager",
+    "merge_files": ".file_manager",
+    "CHUNK_SIZE": ".file_manager",
+    "StreamReader": ".file_manager",
+    "validate_passcode": ".crypto_utils",
+    "encrypt_data": ".crypto_utils",
+    "decrypt_data": ".crypto_utils",
+    "has_passcode_on_telegram": ".passcode_manager",
+    "set_passcode_on_telegram": ".passcode_manager",
+    "verify_passcode_from_telegram": ".passcode_manager",
+    "change_passcode_on_telegram": ".passcode_manager",
+    "reset_all_encrypted_data": ".passcode_manager",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
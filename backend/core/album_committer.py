@@ -0,0 +1,193 @@
+"""
+Batched commits of uploaded chunk documents.
+
+After its parts are uploaded, a chunk becomes a message in Saved Messages.
+Committing each chunk with its own send_file costs one sendMedia per chunk.
+Chunks that finish close together (several chunks of a file, or batch
+uploads of many files) are instead committed as albums of up to 10
+documents:
+- every document is turned into a server-side document with uploadMedia,
+  all concurrently (telethon's own album path does these one at a time)
+- a single sendMultiMedia creates all the messages, and the message ids
+  come back through UpdateMessageID keyed by each entry's random_id
+
+So a batch of N costs N concurrent uploadMedia calls plus one send: N+1
+requests and two round trips deep, against N concurrent sends one round
+trip deep. That only pays off when sends themselves are expensive, e.g.
+when Telegram's per-chat send limit queues them or answers them with flood
+waits. The committer therefore measures what a plain sendMedia costs
+(flood-wait sleeps included) against the fastest round trip seen, and only
+batches into albums while a send costs more than an album's two round
+trips. Otherwise every chunk is sent at once with send_file, without
+lingering. Lone chunks are always sent with send_file, which keeps the
+measurement current while batching. While batching, a commit waits for others
+only while more reserved chunks are still uploading, and never longer than
+the linger time.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from telethon import helpers, utils
+from telethon.tl import types
+from telethon.tl.functions.messages import SendMultiMediaRequest, UploadMediaRequest
+
+from .metrics import metrics
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_ALBUM_SIZE = 10  # Telegram's limit per sendMultiMedia
+DEFAULT_LINGER = 0.2  # seconds a commit may wait for chunks still uploading
+SEND_COST_ALPHA = 0.3  # weight of the newest send in the send-cost average
+MIN_SEND_PENALTY = 0.1  # margin in seconds before batching, so jitter does not flip modes
+
+
+class AlbumCommitter:
+    def __init__(self, client, linger: float = DEFAULT_LINGER, max_size: int = MAX_ALBUM_SIZE,
+                 albums: Optional[bool] = None):
+        """
+        Args:
+            client: Telethon TelegramClient instance
+            linger: Max seconds a ready chunk waits for others to batch with
+            max_size: Max documents per album
+            albums: Always (True) or never (False) batch; None decides from
+                    the measured send cost
+        """
+        self.client = client
+        self.linger = linger
+        self.max_size = max_size
+        self.force_albums = albums
+        self.reserved = 0  # chunks uploading parts that will commit here
+        self.pending = []  # (input_file, caption, future) ready to send
+        self._timer = None
+        self.send_cost = None  # moving average of seconds per send request
+        self.round_trip = None  # fastest request seen: one uncontended round trip
+
+    @property
+    def albums(self) -> bool:
+        """Whether ready chunks are batched: only while a send costs more than an album's two round trips."""
+        if self.force_albums is not None:
+            return self.force_albums
+        if self.send_cost is None:
+            return False
+        return self.send_cost > 2 * self.round_trip + MIN_SEND_PENALTY
+
+    def _observe(self, seconds: float, send: bool) -> None:
+        self.round_trip = seconds if self.round_trip is None else min(self.round_trip, seconds)
+        if send:
+            self.send_cost = seconds if self.send_cost is None else (
+                (1 - SEND_COST_ALPHA) * self.send_cost + SEND_COST_ALPHA * seconds
+            )
+
+    def reserve(self) -> None:
+        """A chunk started uploading; a commit may wait for it."""
+        self.reserved += 1
+
+    def release(self) -> None:
+        """The reserved chunk committed or failed (always pair with reserve)."""
+        self.reserved -= 1
+        self._schedule()
+
+    async def commit(self, input_file, caption: Optional[str] = None) -> int:
+        """
+        Send an uploaded chunk document to Saved Messages.
+
+        Returns:
+            The new message's id
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((input_file, caption, future))
+        self._schedule()
+        return await future
+
+    def _schedule(self) -> None:
+        if not self.pending:
+            return
+        # Everyone still uploading is already waiting here, or the album is full
+        waiting_for_others = (
+            self.albums and self.reserved > len(self.pending) and len(self.pending) < self.max_size
+        )
+        if not waiting_for_others:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        size = self.max_size if self.albums else 1
+        while self.pending:
+            batch, self.pending = self.pending[:size], self.pending[size:]
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch) -> None:
+        try:
+            if len(batch) == 1:
+                input_file, caption, future = batch[0]
+                start = time.perf_counter()
+                message = await self.client.send_file("me", input_file, caption=caption, force_document=True)
+                elapsed = time.perf_counter() - start
+                metrics.observe("rpc_latency_seconds", elapsed, method="sendMedia")
+                self._observe(elapsed, send=True)
+                metrics.inc("chunks_committed", mode="single")
+                if not future.done():
+                    future.set_result(message.id)
+                return
+            await self._send_album(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _upload_media(self, input_file):
+        media = types.InputMediaUploadedDocument(
+            file=input_file,
+            mime_type="application/octet-stream",
+            attributes=[types.DocumentAttributeFilename(file_name=input_file.name)],
+            force_file=True
+        )
+        start = time.perf_counter()
+        result = await self.client(UploadMediaRequest(peer=types.InputPeerSelf(), media=media))
+        elapsed = time.perf_counter() - start
+        metrics.observe("rpc_latency_seconds", elapsed, method="uploadMedia")
+        self._observe(elapsed, send=False)
+        return utils.get_input_media(result.document)
+
+    async def _send_album(self, batch) -> None:
+        documents = await asyncio.gather(
+            *(self._upload_media(input_file) for input_file, _, _ in batch),
+            return_exceptions=True
+        )
+
+        singles = {}  # random_id -> future
+        multi_media = []
+        for (input_file, caption, future), document in zip(batch, documents):
+            if isinstance(document, BaseException):
+                logger.warning(f"uploadMedia failed for {input_file.name}: {document}")
+                future.set_exception(document)
+                continue
+            random_id = helpers.generate_random_long()
+            singles[random_id] = future
+            multi_media.append(types.InputSingleMedia(media=document, message=caption or "", random_id=random_id))
+        if not multi_media:
+            return
+
+        start = time.perf_counter()
+        result = await self.client(SendMultiMediaRequest(peer=types.InputPeerSelf(), multi_media=multi_media))
+        elapsed = time.perf_counter() - start
+        metrics.observe("rpc_latency_seconds", elapsed, method="sendMultiMedia")
+        self._observe(elapsed, send=False)
+        metrics.inc("chunks_committed", len(multi_media), mode="album")
+        logger.info(f"Committed {len(multi_media)} chunks as one album")
+
+        for update in getattr(result, "updates", []):
+            if isinstance(update, types.UpdateMessageID) and update.random_id in singles:
+                future = singles.pop(update.random_id)
+                if not future.done():
+                    future.set_result(update.id)
+        for future in singles.values():
+            if not future.done():
+                future.set_exception(Exception("sendMultiMedia returned no message id"))
@@ -0,0 +1,71 @@
+"""
+Full metadata catalog streaming.
+
+list_files only looks at the most recent messages; bulk tools (sync, chunk
+GC, the headless CLI) need every record. Records are found with server-side
+searches for the METADATA_V1 / METADATA_V2_ENCRYPTED markers, so chunk
+messages are never downloaded, and V2 records are decrypted in parallel
+worker threads.
+"""
+import asyncio
+from typing import AsyncIterator, Optional, Tuple
+
+DECRYPT_BATCH_SIZE = 50
+
+
+async def iter_catalog(client, passcode: Optional[str] = None, unreadable: Optional[list] = None) -> AsyncIterator[Tuple[object, object]]:
+    """
+    Yield (FileMetadata, message) for every metadata record in Saved Messages.
+
+    Args:
+        client: Telegram client
+        passcode: Session passcode; without it V2 records are skipped
+        unreadable: Optional list that receives the ids of records that could
+                    not be read (no passcode, wrong passcode, corrupt)
+    """
+    from .metadata_manager import MetadataManager
+
+    async for msg in client.iter_messages("me", search="METADATA_V1"):
+        if msg.text and msg.text.startswith("METADATA_V1"):
+            try:
+                yield MetadataManager.from_message_text(msg.text), msg
+            except Exception as e:
+                print(f"Catalog: Cannot parse metadata {msg.id}: {e}")
+                if unreadable is not None:
+                    unreadable.append(msg.id)
+
+    def decrypt(text):
+        try:
+            return MetadataManager.from_message_text(text, passcode)
+        except Exception:
+            return None
+
+    batch = []
+
+    async def flush():
+        # PBKDF2 per record: decrypt a batch in parallel worker threads
+        results = await asyncio.gather(*(asyncio.to_thread(decrypt, m.text) for m in batch))
+        ready = []
+        for msg, metadata in zip(batch, results):
+            if metadata is None:
+                if unreadable is not None:
+                    unreadable.append(msg.id)
+                continue
+            ready.append((metadata, msg))
+        batch.clear()
+        return ready
+
+    async for msg in client.iter_messages("me", search="METADATA_V2_ENCRYPTED"):
+        if not (msg.text and msg.text.startswith("METADATA_V2_ENCRYPTED")):
+            continue
+        if not passcode:
+            if unreadable is not None:
+                unreadable.append(msg.id)
+            continue
+        batch.append(msg)
+        if len(batch) >= DECRYPT_BATCH_SIZE:
+            for item in await flush():
+                yield item
+    if batch:
+        for item in await flush():
+            yield item
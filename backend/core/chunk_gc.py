@@ -0,0 +1,168 @@
+"""
+Orphaned chunk collector.
+
+A failed upload or an interrupted delete can leave #TG_DRIVE_CHUNK /
+#ENCRYPTED_CHUNK messages that no metadata references. The collector:
+- Streams the metadata catalog (server-side search) into a compact sorted
+  array of referenced chunk message ids
+- Streams chunk messages per hashtag and reports the unreferenced ones
+  older than a grace period (younger ones may belong to a running upload)
+- Remembers a per-tag watermark so incremental runs only look at new chunks,
+  plus the chunk ids referenced at that point: chunks below the watermark
+  whose metadata has disappeared since (a delete interrupted between its
+  metadata and chunk batches, or done by an older client) are fetched by id
+  and checked again, so incremental runs still collect them
+
+If some encrypted metadata cannot be decrypted, #ENCRYPTED_CHUNK messages are
+left alone: their references are unknown.
+"""
+import bisect
+import json
+import os
+import time
+from array import array
+from typing import Optional
+
+from .client import SESSION_NAME
+
+STATE_PATH = os.path.join(os.path.dirname(SESSION_NAME), "chunk_gc_state.json")
+
+CHUNK_TAGS = ("#TG_DRIVE_CHUNK", "#ENCRYPTED_CHUNK")
+DEFAULT_GRACE_PERIOD = 24 * 3600  # seconds
+RECHECK_BATCH_SIZE = 100  # ids per messages.getMessages
+
+
+def load_state() -> dict:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"watermarks": {}, "referenced": []}
+
+
+def save_state(state: dict) -> None:
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+async def collect_referenced_ids(client, passcode: Optional[str] = None):
+    """
+    Stream the metadata catalog and gather every referenced chunk message id.
+
+    Returns:
+        (sorted array('q') of ids, number of files, whether all V2 records were readable)
+    """
+    from .catalog import iter_catalog
+
+    ids = array("q")
+    files = 0
+    unreadable = []
+
+    async for metadata, _ in iter_catalog(client, passcode, unreadable):
+        ids.extend(c.message_id for c in metadata.chunks)
+        files += 1
+
+    return array("q", sorted(ids)), files, not unreadable
+
+
+def _contains(sorted_ids, message_id) -> bool:
+    i = bisect.bisect_left(sorted_ids, message_id)
+    return i < len(sorted_ids) and sorted_ids[i] == message_id
+
+
+async def find_orphaned_chunks(
+    client,
+    passcode: Optional[str] = None,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+    incremental: bool = True
+) -> dict:
+    """
+    Find chunk messages that no metadata references.
+
+    Args:
+        client: Telegram client
+        passcode: Session passcode (needed to read V2 metadata)
+        grace_period: Seconds a chunk must be old before it counts as orphaned
+        incremental: Only scan chunks newer than the previous run's watermark,
+                     plus older ones whose metadata disappeared since that run
+
+    Returns:
+        Report dict: {"files", "referenced", "scanned", "rechecked",
+                      "orphaned": [{"id", "tag", "date", "size"}], "skipped_tags",
+                      "watermarks", "state"}; "state" is what save_state should
+        store once the orphans are gone
+    """
+    referenced, files, encrypted_readable = await collect_referenced_ids(client, passcode)
+    state = load_state() if incremental else {"watermarks": {}}
+    if "referenced" not in state:
+        # No record of what was referenced below the watermarks: full pass
+        state = {"watermarks": {}}
+    cutoff = time.time() - grace_period
+
+    report = {
+        "files": files,
+        "referenced": len(referenced),
+        "scanned": 0,
+        "rechecked": 0,
+        "orphaned": [],
+        "skipped_tags": [],
+        "watermarks": dict(state.get("watermarks", {})),
+    }
+
+    def add_orphan(msg, tag):
+        report["orphaned"].append({
+            "id": msg.id,
+            "tag": tag,
+            "date": msg.date.isoformat(),
+            "size": msg.file.size if msg.file else 0,
+        })
+
+    for tag in CHUNK_TAGS:
+        if tag == "#ENCRYPTED_CHUNK" and not encrypted_readable:
+            report["skipped_tags"].append(tag)
+            continue
+
+        min_id = report["watermarks"].get(tag, 0)
+        watermark = min_id
+        async for msg in client.iter_messages("me", search=tag, min_id=min_id):
+            if not (msg.text and tag in msg.text):
+                continue
+            report["scanned"] += 1
+            if msg.date.timestamp() > cutoff:
+                # Too young to judge; stays above the watermark for the next run
+                continue
+            watermark = max(watermark, msg.id)
+            if not _contains(referenced, msg.id):
+                add_orphan(msg, tag)
+        report["watermarks"][tag] = watermark
+
+    # Chunks referenced last time but not anymore lie below the watermarks,
+    # where the scan above no longer looks: check whether they still exist.
+    # Without every V2 record the dropped ids are unknown; a later run checks them
+    found = {c["id"] for c in report["orphaned"]}
+    dropped = [
+        i for i in state.get("referenced", []) if not _contains(referenced, i) and i not in found
+    ] if encrypted_readable else []
+    undecided = []  # still to check on a later run
+    for start in range(0, len(dropped), RECHECK_BATCH_SIZE):
+        msgs = await client.get_messages("me", ids=dropped[start:start + RECHECK_BATCH_SIZE])
+        report["rechecked"] += len(msgs)
+        for msg in msgs:
+            tag = next((t for t in CHUNK_TAGS if msg and msg.text and t in msg.text), None)
+            if tag is None:
+                continue  # already gone
+            if msg.date.timestamp() > cutoff:
+                undecided.append(msg.id)
+                continue
+            add_orphan(msg, tag)
+
+    next_referenced = referenced
+    if not encrypted_readable:
+        # V2 references are unknown this time: keep the ones recorded earlier
+        next_referenced = sorted(set(referenced).union(state.get("referenced", [])))
+    elif undecided:
+        next_referenced = sorted(set(referenced).union(undecided))
+    report["state"] = {"watermarks": dict(report["watermarks"]), "referenced": list(next_referenced)}
+    return report
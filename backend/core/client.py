@@ -1,5 +1,3 @@
-from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError
 import os
 import logging
 from dotenv import load_dotenv
@@ -36,6 +34,8 @@ class TGClient:
 
     def _init_client(self):
         logger.info(f"TGClient: Initializing TelegramClient with API_ID={API_ID}...")
+        from telethon import TelegramClient  # heavy, imported on first connect
+        
         if API_ID and API_HASH:
             self.client = TelegramClient(SESSION_NAME, int(API_ID), API_HASH)
             logger.info("TGClient: TelegramClient initialized")
@@ -71,6 +71,8 @@ class TGClient:
 
     async def sign_in(self, phone, code, password=None):
         logger.info(f"TGClient: sign_in called for {phone} (password={'YES' if password else 'NO'})")
+        from telethon.errors import SessionPasswordNeededError
+        
         if not self.client:
              await self.start()
         
@@ -126,7 +128,7 @@ class TGClient:
         logger.info(f"Uploading file using ParallelUploader: {file_path}")
         
         # Use new parallel uploader for better performance
-        uploader = ParallelUploader(self.client, workers=4)
+        uploader = ParallelUploader(self.client)
         input_file = await uploader.upload_file(file_path, progress_callback=progress_callback)
         
         # Send file to "me" (Saved Messages)
@@ -169,6 +171,35 @@ class TGClient:
              await self.start()
         await self.client.delete_messages("me", message_ids)
 
+    async def delete_messages_batched(self, message_ids, batch_size=100, concurrency=4):
+        """
+        Delete many messages in max-size batches, several batches at a time.
+        
+        Returns:
+            Set of message ids whose batch failed to delete
+        """
+        if not self.client:
+             await self.start()
+        import asyncio
+        
+        sem = asyncio.Semaphore(concurrency)
+        failed = set()
+        
+        async def delete_batch(batch):
+            async with sem:
+                try:
+                    await self.client.delete_messages("me", batch)
+                except Exception as e:
+                    logger.error(f"TGClient: Failed to delete batch of {len(batch)} messages: {e}")
+                    failed.update(batch)
+        
+        message_ids = list(message_ids)
+        await asyncio.gather(*(
+            delete_batch(message_ids[i:i + batch_size])
+            for i in range(0, len(message_ids), batch_size)
+        ))
+        return failed
+
     async def edit_message(self, message_id, text):
         if not self.client:
              await self.start()
@@ -0,0 +1,235 @@
+"""
+Adaptive (AIMD) concurrency limits for transfer RPCs.
+
+A controller is a semaphore whose limit moves with observed conditions:
+- Additive increase: after a decision window in which the limit was
+  actually reached and throughput rose, allow one more request in flight.
+  A flat but healthy link is probed with +1 every few windows.
+- Multiplicative decrease: an error, a flood wait (raised, or slept through
+  by telethon and seen by the metrics flood-wait hook) or latency inflated
+  well above the best seen for the same request size halves the limit (at
+  most once per window, so a burst of failures counts once).
+
+Telegram throttles per account and DC, not per file, so uploads and
+downloads each share one module-level controller across all transfers.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from .metrics import metrics
+
+
+class AIMDController:
+    def __init__(
+        self,
+        name: str,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        window: float = 2.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        growth_threshold: float = 0.05,
+        probe_every: int = 5,
+        publish: bool = True
+    ):
+        """
+        Args:
+            name: Label for metrics and state ("upload_part", ...)
+            initial, minimum, maximum: Concurrency limit bounds
+            window: Seconds of completed requests per decision
+            decrease: Factor applied to the limit on congestion
+            latency_tolerance: Latency / baseline ratio treated as congestion
+            growth_threshold: Relative throughput gain that justifies another slot
+            probe_every: Stable windows before probing one more slot
+            publish: Export the limit as the concurrency_limit gauge
+        """
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.window = window
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.growth_threshold = growth_threshold
+        self.probe_every = probe_every
+        self.publish = publish
+
+        self.active = 0
+        self._waiters = deque()
+        self._baseline = {}  # request size bucket -> best latency seen (drifts up slowly)
+        self._reset_window(time.monotonic())
+        self._throughput = None  # bytes/s of the last window
+        self._latency_ratio = None
+        self._stable_windows = 0
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.last_change = None
+        if publish:
+            metrics.set_gauge("concurrency_limit", self.limit, op=self.name)
+
+    # --- Slots ---
+
+    async def acquire(self) -> None:
+        while self.active >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Woken for a slot but cancelled before taking it: pass it on
+                    self._wake()
+                raise
+        self.active += 1
+        if self.active >= self.limit:
+            self._saturated = True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _wake(self) -> None:
+        free = self.limit - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    # --- Feedback ---
+
+    def record_success(self, nbytes: int, latency: float) -> None:
+        """One request of nbytes completed after latency seconds."""
+        bucket = max(nbytes, 1).bit_length()
+        best = self._baseline.get(bucket)
+        if best is None or latency < best:
+            self._baseline[bucket] = best = latency
+        else:
+            # Let the baseline follow a link that got slower for good
+            self._baseline[bucket] = best + (latency - best) * 0.01
+        self._bytes += nbytes
+        self._ratio_sum += latency / best if best > 0 else 1.0
+        self._samples += 1
+        self._maybe_adjust()
+
+    def record_error(self, flood_wait: Optional[float] = None) -> None:
+        """A request failed (flood_wait: seconds Telegram asked to wait, if any)."""
+        self._errors += 1
+        reason = f"flood wait {flood_wait}s" if flood_wait is not None else "error"
+        self._decrease(reason, time.monotonic())
+
+    def _reset_window(self, now: float) -> None:
+        self._window_start = now
+        self._bytes = 0
+        self._ratio_sum = 0.0
+        self._samples = 0
+        self._errors = 0
+        self._saturated = self.active >= self.limit
+
+    def _maybe_adjust(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.window or not self._samples:
+            return
+
+        throughput = self._bytes / elapsed
+        ratio = self._ratio_sum / self._samples
+        previous = self._throughput
+        self._throughput = throughput
+        self._latency_ratio = ratio
+
+        if self._errors:
+            pass  # already decreased when the error was recorded
+        elif ratio > self.latency_tolerance:
+            self._decrease(f"latency x{ratio:.1f}", now)
+        elif self._saturated:
+            rising = previous is None or throughput > previous * (1 + self.growth_threshold)
+            self._stable_windows = 0 if rising else self._stable_windows + 1
+            if rising:
+                self._increase("throughput rising", now)
+            elif self._stable_windows >= self.probe_every:
+                self._stable_windows = 0
+                self._increase("probe", now)
+        self._reset_window(now)
+
+    def _increase(self, reason: str, now: float) -> None:
+        if self.limit >= self.maximum:
+            return
+        self.limit += 1
+        self.increases += 1
+        self._changed(reason, now)
+        self._wake()
+
+    def _decrease(self, reason: str, now: float) -> None:
+        if now - self._last_decrease < self.window:
+            return
+        self._last_decrease = now
+        self._stable_windows = 0
+        new_limit = max(self.minimum, int(self.limit * self.decrease))
+        if new_limit == self.limit:
+            return
+        self.limit = new_limit
+        self.decreases += 1
+        self._changed(reason, now)
+
+    def _changed(self, reason: str, now: float) -> None:
+        self.last_change = {"limit": self.limit, "reason": reason, "at": time.time()}
+        if self.publish:
+            metrics.set_gauge("concurrency_limit", self.limit, op=self.name)
+            metrics.inc("concurrency_changes", op=self.name)
+
+    def state(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "throughput": self._throughput,
+            "latency_ratio": self._latency_ratio,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "last_change": self.last_change,
+        }
+
+
+def fixed(name: str, workers: int) -> AIMDController:
+    """A controller pinned to a fixed limit (explicit workers= arguments)."""
+    return AIMDController(name, initial=workers, minimum=workers, maximum=workers, publish=False)
+
+
+upload_parts = AIMDController("upload_part", initial=4, maximum=12)
+download_parts = AIMDController("download_part", initial=4, maximum=8)
+
+
+_REQUEST_CONTROLLERS = {
+    "SaveFilePartRequest": upload_parts,
+    "SaveBigFilePartRequest": upload_parts,
+    "GetFileRequest": download_parts,
+}
+
+
+def on_flood_wait(request_name: str, seconds: float) -> None:
+    """A flood wait telethon slept through (see metrics.install_flood_wait_hook)."""
+    controller = _REQUEST_CONTROLLERS.get(request_name)
+    if controller:
+        controller.record_error(seconds)
+
+
+def snapshot() -> dict:
+    return {c.name: c.state() for c in (upload_parts, download_parts)}
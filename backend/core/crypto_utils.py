@@ -4,6 +4,7 @@ Uses AES-256 encryption with PBKDF2HMAC key derivation from 6-digit passcode.
 """
 import os
 import base64
+import functools
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.fernet import Fernet
@@ -49,6 +50,36 @@ def derive_key(passcode: str, salt: bytes) -> bytes:
     return base64.urlsafe_b64encode(key)
 
 
+@functools.lru_cache(maxsize=256)
+def _derive_key_cached(passcode: str, salt: bytes) -> bytes:
+    """derive_key memoized per (passcode, salt); records sharing a salt cost one PBKDF2 run."""
+    return derive_key(passcode, salt)
+
+
+def forget_derived_keys() -> None:
+    """Drop memoized keys (logout / encryption reset)."""
+    _derive_key_cached.cache_clear()
+
+
+def encrypt_data_with_key(data: str, key: bytes, salt: bytes) -> str:
+    """
+    Encrypt data with a key already derived via derive_key(passcode, salt).
+    
+    Produces the same format as encrypt_data, so decrypt_data reads it back.
+    Used for bulk re-encryption where one derivation serves many records.
+    
+    Args:
+        data: Plaintext string to encrypt
+        key: Fernet key returned by derive_key
+        salt: The salt the key was derived with
+        
+    Returns:
+        Base64-encoded string containing salt + encrypted data
+    """
+    encrypted = Fernet(key).encrypt(data.encode())
+    return base64.b64encode(salt + encrypted).decode()
+
+
 def encrypt_data(data: str, passcode: str) -> str:
     """
     Encrypt data using AES-256 with passcode.
@@ -106,8 +137,8 @@ def decrypt_data(encrypted_data: str, passcode: str) -> str:
     salt = combined[:16]
     encrypted = combined[16:]
     
-    # Derive key from passcode
-    key = derive_key(passcode, salt)
+    # Derive key from passcode (memoized: re-encrypted records share a salt)
+    key = _derive_key_cached(passcode, salt)
     
     # Decrypt data
     f = Fernet(key)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import hashlib
 
 CHUNK_SIZE = 1024 * 1024 * 1024  # 1GB default
@@ -35,3 +36,58 @@ def merge_files(chunk_paths: list[str], output_path: str):
 def verify_file(file_path: str, expected_hash: str) -> bool:
     """Verify file integrity."""
     return get_file_hash(file_path) == expected_hash
+
+
+class StreamReader:
+    """
+    Reads exact-size pieces from a byte stream of unknown length.
+
+    The source is either an async iterable of bytes (async generator, aiohttp
+    response.content.iter_chunked, ...) or a file-like object with read(n):
+    a coroutine read (asyncio.StreamReader) is awaited, a blocking one
+    (sys.stdin.buffer, a pipe, an open file) runs in a worker thread.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.buffer = bytearray()  # bytes pulled past the last read
+        self.eof = False
+        self.total = 0  # bytes handed out so far
+        if hasattr(source, "read"):
+            read = source.read
+            if asyncio.iscoroutinefunction(read):
+                self._pull = read
+            else:
+                self._pull = lambda n: asyncio.to_thread(read, n)
+        elif hasattr(source, "__aiter__"):
+            iterator = source.__aiter__()
+
+            async def pull(_):
+                try:
+                    return await iterator.__anext__()
+                except StopAsyncIteration:
+                    return b""
+            self._pull = pull
+        else:
+            raise TypeError(f"Not a byte stream: {type(source).__name__}")
+
+    async def read(self, size: int) -> bytes:
+        """
+        Read size bytes, fewer only at the end of the stream.
+
+        Returns:
+            The bytes read (b"" once the stream is exhausted)
+        """
+        while len(self.buffer) < size and not self.eof:
+            data = await self._pull(size - len(self.buffer))
+            if not data:
+                self.eof = True
+            elif not self.buffer and len(data) == size:
+                self.total += size
+                return bytes(data)  # common case: no copy through the buffer
+            else:
+                self.buffer += data
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.total += len(data)
+        return data
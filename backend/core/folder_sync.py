@@ -0,0 +1,235 @@
+"""
+Incremental directory sync planning.
+
+A sync compares a local directory with the remote files stored under a name
+prefix and plans uploads (new files), updates (changed files, re-uploaded
+and the old version deleted) and, when mirroring, remote deletions.
+
+Per synced root a state file next to the session remembers every remote
+file the sync knows about: its id, metadata message, size and hash, and
+the local mtime_ns it was last confirmed against. A local file whose size
+and mtime still match its entry is unchanged without being read, so a run
+with nothing to do costs one directory scan plus a cheap existence check of
+the known metadata messages. The full catalog is only streamed (and V2
+records decrypted) on the first run or when a rescan is requested; files
+whose size matches a remote copy but whose mtime is unknown are hashed in
+parallel threads (through hash_cache) and compared with the stored hash.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Callable, Optional
+
+from .client import SESSION_NAME
+
+STATE_DIR = os.path.join(os.path.dirname(SESSION_NAME), "sync_state")
+
+VERIFY_BATCH_SIZE = 100  # ids per messages.getMessages
+VERIFY_CONCURRENCY = 4
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def state_path(root: str, prefix: str = "") -> str:
+    key = hashlib.sha1(f"{os.path.abspath(root)}\0{prefix}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(STATE_DIR, f"{key}.json")
+
+
+def load_state(root: str, prefix: str = "") -> Optional[dict]:
+    """
+    Read a root's sync state.
+
+    Returns:
+        {"root", "prefix", "files": {name: entry}}, or None before the first sync
+    """
+    try:
+        with open(state_path(root, prefix), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"FolderSync: Ignoring unreadable state: {e}")
+        return None
+
+
+def save_state(state: dict) -> None:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = state_path(state["root"], state["prefix"])
+    # Write-then-rename so a crash never leaves a truncated state
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def remote_name(prefix: str, name: str) -> str:
+    return f"{prefix.rstrip('/')}/{name}" if prefix else name
+
+
+def scan_directory(root: str) -> dict:
+    """
+    Stat every regular file under root (symlinked directories are not followed).
+
+    Returns:
+        {relative name using '/': {"path", "size", "mtime_ns"}}
+    """
+    files = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            print(f"FolderSync: Cannot read {directory}: {e}")
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError as e:
+                print(f"FolderSync: Cannot stat {entry.path}: {e}")
+                continue
+            name = os.path.relpath(entry.path, root).replace(os.sep, "/")
+            files[name] = {"path": entry.path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return files
+
+
+def entry_from_row(row: dict, mtime_ns: Optional[int] = None) -> dict:
+    """State entry for a remote file row (list_files / upload result shape)."""
+    return {
+        "id": row["id"],
+        "metadata_message_id": row["metadata_message_id"],
+        "size": row["size"],
+        "hash": row["hash"],
+        "mtime_ns": mtime_ns,
+    }
+
+
+async def refresh_from_catalog(client, passcode: Optional[str], state: dict) -> None:
+    """
+    Replace the state's remote view with the files under its prefix in the full catalog.
+
+    Local mtimes already confirmed for the same remote file are kept. When a
+    name exists several times remotely, the newest record wins.
+    """
+    from .catalog import iter_catalog
+
+    prefix = state["prefix"]
+    start = f"{prefix.rstrip('/')}/" if prefix else ""
+    newest = {}
+    async for metadata, msg in iter_catalog(client, passcode):
+        if not metadata.name.startswith(start):
+            continue
+        name = metadata.name[len(start):]
+        if name not in newest or msg.id > newest[name]["metadata_message_id"]:
+            newest[name] = {**metadata.model_dump(), "metadata_message_id": msg.id}
+
+    known = state["files"]
+    files = {}
+    for name, row in newest.items():
+        old = known.get(name)
+        mtime_ns = old["mtime_ns"] if old and old["id"] == row["id"] else None
+        files[name] = entry_from_row(row, mtime_ns)
+    state["files"] = files
+
+
+async def drop_missing(client, state: dict) -> list:
+    """
+    Forget entries whose metadata message no longer exists (deleted elsewhere).
+
+    Returns:
+        Names that were dropped
+    """
+    names = list(state["files"])
+    sem = asyncio.Semaphore(VERIFY_CONCURRENCY)
+    missing = []
+
+    async def check(batch):
+        ids = [state["files"][n]["metadata_message_id"] for n in batch]
+        async with sem:
+            msgs = await client.get_messages("me", ids=ids)
+        for name, msg in zip(batch, msgs):
+            if msg is None or not msg.text:
+                missing.append(name)
+
+    await asyncio.gather(*(
+        check(names[i:i + VERIFY_BATCH_SIZE]) for i in range(0, len(names), VERIFY_BATCH_SIZE)
+    ))
+    for name in missing:
+        del state["files"][name]
+    return missing
+
+
+async def build_plan(
+    local: dict,
+    state: dict,
+    mirror: bool = False,
+    hash_file: Optional[Callable[[str], str]] = None,
+    hash_workers: int = DEFAULT_HASH_WORKERS
+) -> dict:
+    """
+    Compare a directory scan with the state's remote view.
+
+    Files whose size matches a remote copy but whose mtime was never
+    confirmed are hashed (in parallel threads); matches are recorded in the
+    state so later runs skip them.
+
+    Args:
+        local: scan_directory result
+        state: Sync state (its "files" are the remote view)
+        mirror: Plan deleting remote files that no longer exist locally
+        hash_file: Hash function (default: hash_cache, with the upload chunk size
+                   so entries stored by earlier uploads are hits)
+        hash_workers: Files hashed at once
+
+    Returns:
+        {"upload": [...], "update": [...], "delete": [...], "unchanged": int, "hashed": int}
+        upload/update items are {"name", "path", "size", "mtime_ns"} (update adds
+        "replaces": state entry); delete items are {"name", **state entry}
+    """
+    if hash_file is None:
+        from .file_manager import CHUNK_SIZE
+        from .hash_cache import file_hashes
+
+        def hash_file(path):
+            return file_hashes(path, CHUNK_SIZE)[0]
+
+    remote = state["files"]
+    plan = {"upload": [], "update": [], "delete": [], "unchanged": 0, "hashed": 0}
+    to_hash = []
+
+    for name, f in sorted(local.items()):
+        entry = remote.get(name)
+        item = {"name": name, **f}
+        if entry is None:
+            plan["upload"].append(item)
+        elif entry["size"] != f["size"]:
+            plan["update"].append({**item, "replaces": entry})
+        elif entry["mtime_ns"] == f["mtime_ns"]:
+            plan["unchanged"] += 1
+        else:
+            to_hash.append(item)
+
+    sem = asyncio.Semaphore(max(1, hash_workers))
+
+    async def compare(item):
+        async with sem:
+            digest = await asyncio.to_thread(hash_file, item["path"])
+        entry = remote[item["name"]]
+        if digest == entry["hash"]:
+            entry["mtime_ns"] = item["mtime_ns"]
+            plan["unchanged"] += 1
+        else:
+            plan["update"].append({**item, "replaces": entry})
+
+    await asyncio.gather(*(compare(item) for item in to_hash))
+    plan["hashed"] = len(to_hash)
+    plan["update"].sort(key=lambda item: item["name"])
+
+    if mirror:
+        plan["delete"] = [{"name": name, **entry} for name, entry in sorted(remote.items()) if name not in local]
+    return plan
@@ -0,0 +1,190 @@
+"""
+Persistent local file-hash cache, stored next to the session file.
+
+Maps (device, inode, size, mtime_ns) to a file's whole-file SHA256 and its
+per-chunk SHA256s, so sync runs skip reading unchanged files. Uploads
+hash the bytes they send and record them here. An entry is only used when every key field still matches the file's
+stat; any difference drops it. Hashes are only stored when the file did not
+change while it was being read and its mtime is old enough that a later
+write could not land in the same timestamp tick (coarse-mtime filesystems).
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .client import SESSION_NAME
+
+CACHE_PATH = os.path.join(os.path.dirname(SESSION_NAME), "hash_cache.json")
+
+MAX_ENTRIES = 100_000
+FLUSH_INTERVAL = 5.0  # seconds between writes while entries keep changing
+RACY_WINDOW_NS = 2_000_000_000  # FAT mtime resolution
+READ_SIZE = 1024 * 1024
+
+
+def same_file(a: os.stat_result, b: os.stat_result) -> bool:
+    return (a.st_dev, a.st_ino, a.st_size, a.st_mtime_ns) == (b.st_dev, b.st_ino, b.st_size, b.st_mtime_ns)
+
+
+class HashCache:
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None  # "dev:ino" -> entry, loaded on first use
+        self.dirty = False
+        self.last_flush = 0.0
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)["entries"]
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            print(f"HashCache: Ignoring unreadable cache: {e}")
+            self.entries = {}
+
+    @staticmethod
+    def _key(st: os.stat_result) -> str:
+        return f"{st.st_dev}:{st.st_ino}"
+
+    def get(self, st: os.stat_result) -> Optional[dict]:
+        """
+        Cached entry for a file's stat, or None.
+
+        Returns:
+            {"size", "mtime_ns", "hash", "chunk_size", "chunks"} if size and
+            mtime_ns still match (a stale entry is dropped)
+        """
+        with self.lock:
+            self._load()
+            key = self._key(st)
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                del self.entries[key]
+                self.dirty = True
+                return None
+            return entry
+
+    def put(self, st: os.stat_result, file_hash: str, chunk_size: Optional[int] = None,
+            chunks: Optional[List[str]] = None) -> None:
+        """Remember the hashes of the file st describes (skipped for racily recent mtimes)."""
+        if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        with self.lock:
+            self._load()
+            key = self._key(st)
+            self.entries.pop(key, None)  # re-insert at the end: eviction is oldest-written first
+            self.entries[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "hash": file_hash,
+                "chunk_size": chunk_size if chunks is not None else None,
+                "chunks": chunks,
+            }
+            while len(self.entries) > MAX_ENTRIES:
+                del self.entries[next(iter(self.entries))]
+            self.dirty = True
+            due = time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the cache if it changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({"entries": self.entries})
+            self.dirty = False
+            self.last_flush = time.monotonic()
+        try:
+            # Write-then-rename so a crash never leaves a truncated cache
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"HashCache: Cannot save cache: {e}")
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries = {}
+            self.dirty = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+hash_cache = HashCache()
+atexit.register(hash_cache.flush)
+
+
+def compute_hashes(file_path: str, chunk_size: Optional[int] = None) -> Tuple[str, Optional[List[str]]]:
+    """
+    Whole-file SHA256 and, with chunk_size, the SHA256 of each chunk, in one read.
+
+    Returns:
+        (file hash, list of chunk hashes or None)
+    """
+    whole = hashlib.sha256()
+    chunks = [] if chunk_size else None
+    chunk = hashlib.sha256()
+    filled = 0
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            whole.update(block)
+            if chunks is None:
+                continue
+            view = memoryview(block)
+            while view:
+                take = min(len(view), chunk_size - filled)
+                chunk.update(view[:take])
+                filled += take
+                view = view[take:]
+                if filled == chunk_size:
+                    chunks.append(chunk.hexdigest())
+                    chunk = hashlib.sha256()
+                    filled = 0
+    if chunks is not None and filled:
+        chunks.append(chunk.hexdigest())
+    return whole.hexdigest(), chunks
+
+
+def file_hashes(file_path: str, chunk_size: Optional[int] = None,
+                cache: Optional[HashCache] = None) -> Tuple[str, Optional[List[str]]]:
+    """
+    Hashes of a file, from the cache when the file is unchanged.
+
+    Args:
+        file_path: File to hash
+        chunk_size: Also return per-chunk hashes for this chunk size
+        cache: Cache to use (default: the module-level cache)
+
+    Returns:
+        (file hash, list of chunk hashes or None)
+    """
+    cache = cache or hash_cache
+    st = os.stat(file_path)
+    entry = cache.get(st)
+    if entry and (chunk_size is None or entry["chunk_size"] == chunk_size):
+        return entry["hash"], entry["chunks"] if chunk_size else None
+
+    file_hash, chunks = compute_hashes(file_path, chunk_size)
+    if same_file(st, os.stat(file_path)):
+        cache.put(st, file_hash, chunk_size, chunks)
+    return file_hash, chunks
+
+
+def file_hash(file_path: str) -> str:
+    """Cached drop-in for file_manager.get_file_hash on user files (not temp files)."""
+    return file_hashes(file_path)[0]
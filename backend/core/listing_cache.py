@@ -0,0 +1,117 @@
+"""
+Last known file listing, persisted next to the session file.
+
+Lets the UI show the catalog instantly at startup while it is revalidated
+against Telegram in the background. Once a passcode is set the listing is
+stored encrypted with it (same scheme as V2 metadata), so nothing decoded
+sits on disk in plaintext.
+"""
+import json
+import os
+from typing import List, Optional
+
+from .client import SESSION_NAME
+
+CACHE_PATH = os.path.join(os.path.dirname(SESSION_NAME), "listing_cache.json")
+
+
+def load(passcode: Optional[str] = None) -> Optional[List[dict]]:
+    """
+    Read the cached listing.
+
+    Args:
+        passcode: Session passcode, needed if the cache is encrypted
+
+    Returns:
+        List of file rows, or None if there is no usable cache
+    """
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("encrypted"):
+            if not passcode:
+                return None
+            from .crypto_utils import decrypt_data
+            return json.loads(decrypt_data(stored["data"], passcode))
+        return stored["data"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"ListingCache: Ignoring unreadable cache: {e}")
+        return None
+
+
+def is_encrypted() -> bool:
+    """Whether the stored cache is encrypted."""
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return bool(json.load(f).get("encrypted"))
+    except FileNotFoundError:
+        return False
+    except Exception:
+        return False  # unreadable: load() ignores it, so it may be replaced
+
+
+def save(files: List[dict], passcode: Optional[str] = None) -> bool:
+    """
+    Persist the listing, encrypted with the passcode if one is set.
+
+    Without a passcode an encrypted cache is left alone: the session is
+    locked on a passcode account and its listing lacks the encrypted files.
+
+    Returns:
+        Whether the cache was written
+    """
+    if not passcode and is_encrypted():
+        return False
+    if passcode:
+        from .crypto_utils import encrypt_data
+        stored = {"encrypted": True, "data": encrypt_data(json.dumps(files), passcode)}
+    else:
+        stored = {"encrypted": False, "data": files}
+
+    # Write-then-rename so a crash never leaves a truncated cache
+    tmp_path = CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    os.replace(tmp_path, CACHE_PATH)
+    return True
+
+
+def clear() -> None:
+    """Drop the cache (logout, passcode change or reset)."""
+    try:
+        os.remove(CACHE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def diff_listings(old: List[dict], new: List[dict]) -> dict:
+    """
+    Compute the patch that turns `old` into `new`.
+
+    Returns:
+        {"added": [rows], "changed": [rows], "removed": [file ids]}
+    """
+    old_by_id = {f["id"]: f for f in old}
+    new_ids = set()
+    added, changed = [], []
+    for row in new:
+        new_ids.add(row["id"])
+        previous = old_by_id.get(row["id"])
+        if previous is None:
+            added.append(row)
+        elif previous != row:
+            changed.append(row)
+    removed = [file_id for file_id in old_by_id if file_id not in new_ids]
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def apply_patch(files: List[dict], patch: dict) -> List[dict]:
+    """Apply a list patch; mirrors applyFilesPatch in the frontend store."""
+    removed = set(patch.get("removed", []))
+    changed = {f["id"]: f for f in patch.get("changed", [])}
+    result = [changed.get(f["id"], f) for f in files if f["id"] not in removed]
+    known = {f["id"] for f in result}
+    added = [f for f in patch.get("added", []) if f["id"] not in known]
+    return added + result
@@ -93,3 +93,42 @@ class MetadataManager:
         
         json_str = decrypt_data(encrypted_str, passcode)
         return MetadataManager.from_json(json_str)
+    
+    @staticmethod
+    def from_message_text(text: str, passcode: Optional[str] = None) -> Optional[FileMetadata]:
+        """
+        Parse metadata from a Saved Messages text (V1 or V2 format).
+        
+        Args:
+            text: Message text starting with the METADATA_V1 / METADATA_V2_ENCRYPTED marker
+            passcode: Session passcode, required for V2 messages
+            
+        Returns:
+            FileMetadata object, or None if the message is not readable metadata
+            
+        Raises:
+            cryptography.fernet.InvalidToken: If passcode is wrong
+        """
+        if not text:
+            return None
+        if text.startswith("METADATA_V1"):
+            return MetadataManager.from_json(text.split("\n", 1)[1])
+        if text.startswith("METADATA_V2_ENCRYPTED") and passcode:
+            return MetadataManager.from_json_encrypted(text.split("\n", 1)[1], passcode)
+        return None
+    
+    @staticmethod
+    def to_message_text(metadata: FileMetadata, passcode: Optional[str] = None) -> str:
+        """
+        Serialize metadata as a Saved Messages text, encrypted (V2) if a passcode is set.
+        
+        Args:
+            metadata: FileMetadata object
+            passcode: Session passcode, or None for plaintext V1
+            
+        Returns:
+            Message text including the format marker
+        """
+        if passcode:
+            return f"METADATA_V2_ENCRYPTED\n{MetadataManager.to_json_encrypted(metadata, passcode)}"
+        return f"METADATA_V1\n{MetadataManager.to_json(metadata)}"
@@ -0,0 +1,340 @@
+"""
+Transfer metrics.
+
+One process-wide registry (`metrics`) collects structured numbers from the
+uploader, downloader and file handler:
+- Counters      retries, flood-wait seconds, bytes per data center
+- Gauges        queue depths, bytes held in memory, event-loop lag
+- Histograms    per-request latency (fixed buckets, cheap to update)
+- Rates         bytes/second per data center over a sliding window
+
+The registry is read through Bridge.get_metrics() and can optionally be
+served as Prometheus-style text on localhost (TG_DRIVE_METRICS_PORT).
+Stdlib only, so it is safe to import on the startup path.
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
+
+# Seconds; covers a fast small-part RPC up to a slow send_file
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_WINDOW = 10.0  # seconds of history behind bytes/second rates
+LOOP_LAG_INTERVAL = 0.5
+
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus layout)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        def bound(q):
+            # JSON has no Infinity; the frontend gets "+Inf" like the bucket keys
+            value = self.quantile(q)
+            return "+Inf" if value == float("inf") else value
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": bound(0.5),
+            "p95": bound(0.95),
+            "p99": bound(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class RateMeter:
+    """Bytes/second over the last `window` seconds."""
+
+    def __init__(self, window: float = RATE_WINDOW):
+        self.window = window
+        self.samples = deque()  # (monotonic time, amount)
+        self.in_window = 0
+
+    def add(self, amount: int, now: float) -> None:
+        self.samples.append((now, amount))
+        self.in_window += amount
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.in_window -= self.samples.popleft()[1]
+
+    def rate(self, now: float) -> float:
+        self._prune(now)
+        return self.in_window / self.window
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, gauges, histograms and rates."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.rates: Dict[tuple, RateMeter] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def record_bytes(self, direction: str, dc_id, amount: int) -> None:
+        """Count transferred bytes for a data center (feeds totals and bytes/s)."""
+        key = _key("transfer_bytes", {"direction": direction, "dc": dc_id})
+        now = time.monotonic()
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            meter = self.rates.get(key)
+            if meter is None:
+                meter = self.rates[key] = RateMeter()
+            meter.add(amount, now)
+
+    def time(self, name: str, **labels) -> "_Timer":
+        """Context manager observing the elapsed seconds into a histogram."""
+        return _Timer(self, name, labels)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.rates.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """JSON-friendly view of every metric."""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                "uptime": round(time.time() - self.started, 3),
+                "counters": [_row(k, v) for k, v in self.counters.items()],
+                "gauges": [_row(k, v) for k, v in self.gauges.items()] + [
+                    _row(_key("process_resident_bytes", {}), value)
+                    for value in [_resident_bytes()] if value is not None
+                ],
+                "histograms": [_row(k, h.snapshot()) for k, h in self.histograms.items()],
+                "rates": [
+                    _row(_key("transfer_bytes_per_second", dict(k[1])), round(m.rate(now), 1))
+                    for k, m in self.rates.items()
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Render the registry in the Prometheus text exposition format."""
+        now = time.monotonic()
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"tg_drive_{name}_total{_labels(labels)} {value}")
+            gauges = dict(self.gauges)
+            resident = _resident_bytes()
+            if resident is not None:
+                gauges[_key("process_resident_bytes", {})] = resident
+            for (name, labels), value in sorted(gauges.items()):
+                lines.append(f"tg_drive_{name}{_labels(labels)} {value}")
+            for (name, labels), meter in sorted(self.rates.items()):
+                lines.append(f"tg_drive_{name}_per_second{_labels(labels)} {meter.rate(now):.1f}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += n
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(f"tg_drive_{name}_bucket{_labels(bucket_labels)} {cumulative}")
+                lines.append(f"tg_drive_{name}_sum{_labels(labels)} {hist.sum}")
+                lines.append(f"tg_drive_{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _row(key, value) -> dict:
+    name, labels = key
+    return {"name": name, "labels": dict(labels), "value": value}
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _resident_bytes() -> Optional[int]:
+    """Current resident set size (Linux), else peak RSS where available."""
+    try:
+        import os
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def dc_of(client, message=None):
+    """Data center a message's media lives on (falls back to the session's home DC)."""
+    media = getattr(message, "media", None) if message is not None else None
+    document = getattr(media, "document", None)
+    dc_id = getattr(document, "dc_id", None)
+    if dc_id is None:
+        session = getattr(client, "session", None)
+        dc_id = getattr(session, "dc_id", None)
+    return dc_id if dc_id is not None else "unknown"
+
+
+def flood_wait_seconds(error) -> Optional[int]:
+    """Seconds of a FloodWait-style error, or None for other errors."""
+    seconds = getattr(error, "seconds", None)
+    return seconds if isinstance(seconds, int) else None
+
+
+async def monitor_loop_lag(registry: "MetricsRegistry", interval: float = LOOP_LAG_INTERVAL):
+    """
+    Measure how late the event loop wakes up from a timed sleep.
+
+    Lag means something blocked the loop (sync hashing, file I/O, PBKDF2 on
+    the loop thread) and every transfer on it stalled for that long.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        registry.set_gauge("event_loop_lag_seconds", round(lag, 6))
+        registry.observe("event_loop_lag_seconds", lag)
+
+
+class _FloodWaitLogHandler(logging.Handler):
+    """
+    Counts flood waits telethon sleeps through on its own.
+
+    Waits under flood_sleep_threshold never reach our code as exceptions;
+    telethon only logs them ("Sleeping for %ds (%s) on %s flood wait").
+    """
+
+    def __init__(self, registry):
+        super().__init__(level=logging.INFO)
+        self.registry = registry
+
+    def emit(self, record):
+        if not (isinstance(record.msg, str) and record.msg.endswith("flood wait")):
+            return
+        try:
+            _early, seconds, _delta, request = record.args
+        except (TypeError, ValueError):
+            return
+        self.registry.inc("flood_waits", request=request)
+        self.registry.inc("flood_wait_seconds", seconds, op=request)
+        from .concurrency import on_flood_wait
+        on_flood_wait(request, seconds)
+
+
+def install_flood_wait_hook(registry: "MetricsRegistry") -> None:
+    """Feed telethon's internal flood-wait sleeps into the registry (idempotent)."""
+    logger = logging.getLogger("telethon.client.users")
+    if any(isinstance(h, _FloodWaitLogHandler) for h in logger.handlers):
+        return
+    logger.addHandler(_FloodWaitLogHandler(registry))
+    if logger.getEffectiveLevel() > logging.INFO:
+        logger.setLevel(logging.INFO)
+
+
+def start_exporter(registry: "MetricsRegistry", port: int, host: str = "127.0.0.1"):
+    """
+    Serve the registry as Prometheus text at http://host:port/metrics.
+
+    Runs in a daemon thread; bound to localhost by default.
+
+    Returns:
+        The HTTPServer instance
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics: Serving Prometheus text on http://{host}:{port}/metrics")
+    return server
+
+
+metrics = MetricsRegistry()
@@ -1,11 +1,15 @@
 """
 Parallel File Downloader for Telegram
 
-Strategy: Download parts to SEPARATE files, then merge!
-- No file lock contention (each worker writes to own file)
-- Cross-platform (no pwrite needed)
-- Simple and fast
-- Same approach as aria2, IDM, wget
+Strategy: fetch parts in parallel, hand them out IN ORDER!
+- Workers download parts concurrently into memory
+- A small reorder window (bounded number of parts) puts them back in order
+- Callers consume an ordered byte stream, so hashes can be updated and the
+  file written as bytes arrive - no part files, no merge pass, no re-read
+- A failed part is retried with backoff by the worker that owns it, resuming
+  after the bytes it already has; an expired file reference refetches the
+  message once for all workers, a dropped connection is reconnected, and
+  parts already downloaded are never fetched again
 
 Author: Inspired by user's brilliant suggestion!
 """
@@ -13,22 +17,53 @@ Author: Inspired by user's brilliant suggestion!
 import asyncio
 import math
 import os
-import shutil
-from typing import Callable, Optional
-from pathlib import Path
+import random
+import time
+from typing import AsyncIterator, Callable, List, Optional
 
-from telethon import TelegramClient
+from telethon import TelegramClient, errors
+
+from .concurrency import AIMDController, fixed, download_parts
+from .metrics import metrics, dc_of, flood_wait_seconds
+from .tracing import span
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+MAX_PART_RETRIES = 5
+RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled per attempt
+MAX_RETRY_BACKOFF = 30.0
+
+FILE_REFERENCE_ERRORS = (errors.FileReferenceExpiredError, errors.FilerefUpgradeNeededError)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient failures (network, server, flood wait, stale file reference) are worth retrying."""
+    if isinstance(error, FILE_REFERENCE_ERRORS):
+        return True
+    # Bad requests and auth errors fail the same way every time
+    return not isinstance(error, (
+        errors.BadRequestError, errors.UnauthorizedError, errors.ForbiddenError, ValueError, TypeError
+    ))
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retry number `attempt` (1-based)."""
+    wait = flood_wait_seconds(error)
+    if wait is not None:
+        return wait
+    if isinstance(error, FILE_REFERENCE_ERRORS):
+        return 0.0  # nothing to wait for once the reference is refreshed
+    backoff = min(MAX_RETRY_BACKOFF, RETRY_BACKOFF * 2 ** (attempt - 1))
+    return backoff * random.uniform(0.5, 1.0)  # jitter: workers that failed together retry apart
+
 
 def get_optimal_download_part_size(file_size: int) -> int:
     """
     Calculate optimal part size for download.
     Larger parts = fewer concurrent requests but better throughput.
-    
+
     - < 10MB: 512KB (small files don't benefit from too many parts)
     - ≤ 50MB: 1MB
     - > 50MB: 2MB
@@ -43,166 +78,285 @@ def get_optimal_download_part_size(file_size: int) -> int:
 
 class ParallelDownloader:
     """
-    Downloads file in parallel parts to separate temp files, then merges.
-    
+    Downloads file parts in parallel and yields them in order.
+
     Advantages:
-    - No file locking needed (each part = separate file)
-    - Cross-platform (works on Windows without pwrite)
-    - Simple implementation
-    - Clean separation of concerns
+    - Bytes arrive in file order (inline hashing / streaming writes)
+    - Memory bounded by the reorder window (window * part_size)
+    - Cross-platform (plain sequential writes, no pwrite needed)
     """
-    
-    def __init__(self, client: TelegramClient, workers: int = 1):
+
+    def __init__(self, client: TelegramClient, workers: Optional[int] = None, window: Optional[int] = None,
+                 controller: Optional[AIMDController] = None):
         """
         Initialize parallel downloader.
-        
+
         Args:
             client: Telethon TelegramClient instance
-            workers: Number of parallel download workers (default: 1)
-                    Note: Using > 1 workers may trigger Telegram FloodWait rate limits
+            workers: Fixed number of parts in flight (default: adaptive, the
+                    shared download_parts limit backs off on FloodWait)
+            window: Max parts downloaded or buffered ahead of the consumer
+                    (default: 2 * the most parts that can be in flight)
+            controller: Concurrency controller (default: the shared download_parts)
         """
         self.client = client
-        self.workers = workers
-        
-    async def download_file(
+        self.controller = controller or (fixed("download_part", workers) if workers else download_parts)
+        self.workers = self.controller.maximum
+        self.window = window or 2 * self.workers
+        self._reconnect_lock = asyncio.Lock()
+
+    async def _fetch_part(self, message, offset: int, limit: int, pieces: Optional[List[bytes]] = None) -> bytes:
+        """
+        Download `limit` bytes starting at `offset`.
+
+        Args:
+            pieces: Bytes already received for this part by an earlier attempt;
+                    appended to as data arrives, so a retry resumes after them
+        """
+        # IMPORTANT: iter_download's 'limit' is requestSize per chunk,
+        # NOT total bytes! We need to stop after 'limit' total bytes.
+        pieces = [] if pieces is None else pieces
+        bytes_downloaded = sum(len(p) for p in pieces)
+        if bytes_downloaded >= limit:
+            return b''.join(pieces)
+        dc_id = dc_of(self.client, message)
+        request_start = time.perf_counter()
+
+        async for chunk in self.client.iter_download(
+            message.media,
+            offset=offset + bytes_downloaded,
+            request_size=min(limit - bytes_downloaded, 1024 * 1024)  # Max 1MB per request
+        ):
+            # Each yielded chunk is one upload.getFile round trip
+            now = time.perf_counter()
+            metrics.observe("rpc_latency_seconds", now - request_start, method="getFile")
+            self.controller.record_success(len(chunk), now - request_start)
+            metrics.record_bytes("download", dc_id, len(chunk))
+            request_start = now
+
+            # Only take what we need
+            bytes_needed = limit - bytes_downloaded
+            if bytes_needed <= 0:
+                break
+
+            if len(chunk) > bytes_needed:
+                pieces.append(chunk[:bytes_needed])
+                bytes_downloaded += bytes_needed
+                break
+            else:
+                pieces.append(chunk)
+                bytes_downloaded += len(chunk)
+                if bytes_downloaded >= limit:
+                    # Done: don't let the iterator issue one more request
+                    break
+
+        return b''.join(pieces)
+
+    async def _refetch_message(self, message):
+        """The same message again, with a fresh file reference."""
+        chat = getattr(message, "input_chat", None) or "me"
+        fresh = await self.client.get_messages(chat, ids=message.id)
+        if not fresh or not fresh.file or fresh.file.size != message.file.size:
+            raise Exception(f"Message {message.id} no longer holds the file")
+        return fresh
+
+    async def _reconnect(self) -> None:
+        async with self._reconnect_lock:
+            if not self.client.is_connected():
+                logger.warning("Connection lost, reconnecting")
+                metrics.inc("reconnects", op="download_part")
+                await self.client.connect()
+
+    async def iter_download(
         self,
         message,
-        file_path: str,
         part_size: Optional[int] = None,
         progress_callback: Optional[Callable[[int, int], None]] = None
-    ) -> str:
+    ) -> AsyncIterator[bytes]:
         """
-        Download file in parallel parts, then merge.
-        
+        Yield the file's bytes in order, fetched by parallel workers.
+
         Args:
             message: Telegram message object containing the file
-            file_path: Path where file should be saved
             part_size: Size of each part (auto-calculated if None)
             progress_callback: Optional callback(downloaded_bytes, total_bytes)
-            
-        Returns:
-            Path to downloaded file
+
+        Yields:
+            Consecutive parts of the file
         """
-        # Get file info
         if not message.file:
             raise ValueError("Message does not contain a file")
-        
+
         file_size = message.file.size
-        file_name = message.file.name or os.path.basename(file_path)
-        
+
         # Determine part size
         if part_size is None:
             part_size = get_optimal_download_part_size(file_size)
-        
+
         # Calculate parts
         part_count = math.ceil(file_size / part_size)
-        
+
         logger.info(
-            f"Starting parallel download: {file_name} "
+            f"Starting parallel download: {message.file.name or message.id} "
             f"({file_size} bytes, {part_count} parts, "
-            f"part_size={part_size})"
+            f"part_size={part_size}, window={self.window})"
         )
-        
-        # Create temp directory for parts
-        temp_dir = f"{file_path}.parts"
-        os.makedirs(temp_dir, exist_ok=True)
-        
+
+        queue = asyncio.Queue()
+        for i in range(part_count):
+            offset = i * part_size
+            await queue.put((i, offset, min(part_size, file_size - offset)))
+
+        # A slot is taken BEFORE dequeuing a part and freed when the part is
+        # yielded, so parts start in order and the lowest pending part always
+        # holds a slot (no deadlock), while at most `window` parts are in memory.
+        slots = asyncio.Semaphore(self.window)
+        finished = asyncio.Queue()
+        current = {"message": message}  # replaced when its file reference expires
+        refresh_lock = asyncio.Lock()
+        metrics.add_gauge("download_parts_pending", part_count)
+        buffered = 0  # bytes downloaded but not yet handed to the consumer
+
+        def track_buffer(delta):
+            nonlocal buffered
+            buffered += delta
+            metrics.add_gauge("buffered_bytes", delta, stage="download_reorder")
+
+        async def refresh(stale):
+            async with refresh_lock:
+                # Workers that failed together refresh once
+                if current["message"] is stale:
+                    logger.info(f"File reference expired, refetching message {stale.id}")
+                    metrics.inc("file_reference_refreshes")
+                    current["message"] = await self._refetch_message(stale)
+
+        async def recover(error, attempt, used):
+            """Get ready for retry number `attempt` after `error`."""
+            if isinstance(error, FILE_REFERENCE_ERRORS):
+                await refresh(used)
+            delay = retry_delay(error, attempt)
+            if delay:
+                with span("retry_wait", attempt=attempt):
+                    await asyncio.sleep(delay)
+            if not self.client.is_connected():
+                await self._reconnect()
+
+        async def fetch_with_retries(part_index, offset, limit):
+            # Retried here rather than at the back of the queue: this worker holds
+            # the part's window slot, and the consumer may be waiting for it
+            pieces = []
+            error = None
+            used = current["message"]  # the message the last attempt fetched with
+            for attempt in range(MAX_PART_RETRIES + 1):
+                try:
+                    if attempt:
+                        # Pass what actually failed, not the current message: another
+                        # worker may have refreshed the reference in the meantime
+                        await recover(error, attempt, used)
+                    with span("fetch_part", part=part_index, size=limit, attempt=attempt):
+                        async with self.controller.slot():
+                            used = current["message"]  # may have been refreshed while waiting
+                            return await self._fetch_part(used, offset, limit, pieces)
+                except Exception as e:
+                    error = e
+                    wait = flood_wait_seconds(e)
+                    if wait is not None:
+                        metrics.inc("flood_wait_seconds", wait, op="download_part")
+                    if not isinstance(e, FILE_REFERENCE_ERRORS):
+                        self.controller.record_error(wait)
+                    if not is_retryable(e) or attempt == MAX_PART_RETRIES:
+                        raise
+                    metrics.inc("retries", op="download_part")
+                    logger.warning(
+                        f"Failed part {part_index} (Attempt {attempt+1}/{MAX_PART_RETRIES}, "
+                        f"{sum(len(p) for p in pieces)}/{limit} bytes kept): {e!r}. Retrying..."
+                    )
+
+        async def download_worker():
+            """Worker task to download parts from queue"""
+            while True:
+                await slots.acquire()
+                try:
+                    part_index, offset, limit = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    slots.release()
+                    return
+
+                try:
+                    data = await fetch_with_retries(part_index, offset, limit)
+                    logger.debug(f"Part {part_index}/{part_count} downloaded ({len(data)} bytes)")
+                    track_buffer(len(data))
+                    await finished.put((part_index, data, None))
+                except Exception as e:
+                    logger.error(f"Failed to download part {part_index}: {e}")
+                    metrics.inc("errors", op="download_part")
+                    await finished.put((part_index, None, e))
+                    return
+
+        workers_tasks = [
+            asyncio.create_task(download_worker())
+            for _ in range(min(self.workers, part_count))
+        ]
+
         try:
-            # Create download queue
-            queue = asyncio.Queue()
-            for i in range(part_count):
-                offset = i * part_size
-                limit = min(part_size, file_size - offset)
-                part_file = os.path.join(temp_dir, f"part_{i:04d}")
-                await queue.put((i, offset, limit, part_file))
-            
-            # Track progress
+            reorder = {}  # part_index -> bytes, waiting for earlier parts
+            next_index = 0
             downloaded_bytes = 0
-            progress_lock = asyncio.Lock()
-            errors = []
-            
-            async def download_worker():
-                """Worker task to download parts from queue"""
-                nonlocal downloaded_bytes
-                
-                while not queue.empty():
-                    try:
-                        part_index, offset, limit, part_file = await queue.get()
-                    except asyncio.QueueEmpty:
-                        break
-                    
-                    try:
-                        # Download this part to separate file - NO LOCKS NEEDED!
-                        # IMPORTANT: iter_download's 'limit' is requestSize per chunk,
-                        # NOT total bytes! We need to stop after 'limit' total bytes.
-                        part_data = b''
-                        bytes_downloaded = 0
-                        
-                        async for chunk in self.client.iter_download(
-                            message.media,
-                            offset=offset,
-                            request_size=min(limit, 1024 * 1024)  # Max 1MB per request
-                        ):
-                            # Only take what we need
-                            bytes_needed = limit - bytes_downloaded
-                            if bytes_needed <= 0:
-                                break
-                            
-                            if len(chunk) > bytes_needed:
-                                part_data += chunk[:bytes_needed]
-                                bytes_downloaded += bytes_needed
-                                break
-                            else:
-                                part_data += chunk
-                                bytes_downloaded += len(chunk)
-                        
-                        # Write to separate file (simple!)
-                        with open(part_file, 'wb') as f:
-                            f.write(part_data)
-                        
-                        # Update progress
-                        async with progress_lock:
-                            downloaded_bytes += len(part_data)
-                            if progress_callback:
-                                progress_callback(downloaded_bytes, file_size)
-                        
-                        logger.debug(f"Part {part_index}/{part_count} downloaded ({len(part_data)} bytes)")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to download part {part_index}: {e}")
-                        errors.append((part_index, e))
-                        
-                    finally:
-                        queue.task_done()
-            
-            # Create and run workers
-            workers_tasks = [
-                asyncio.create_task(download_worker())
-                for _ in range(min(self.workers, part_count))
-            ]
-            
-            # Wait for all workers
-            await asyncio.gather(*workers_tasks)
-            
-            # Check for errors
-            if errors:
-                raise Exception(f"Download failed for {len(errors)} parts: {errors[0][1]}")
-            
-            # Merge all parts into final file
-            logger.info(f"Merging {part_count} parts...")
-            
-            with open(file_path, 'wb') as output_file:
-                for i in range(part_count):
-                    part_file = os.path.join(temp_dir, f"part_{i:04d}")
-                    with open(part_file, 'rb') as part:
-                        shutil.copyfileobj(part, output_file)
-            
-            logger.info(f"Download complete: {file_name} ({file_size} bytes)")
-            
+
+            while next_index < part_count:
+                with span("wait_part", part=next_index):
+                    part_index, data, error = await finished.get()
+                if error:
+                    raise Exception(f"Download failed for part {part_index}: {error}")
+                reorder[part_index] = data
+
+                while next_index in reorder:
+                    data = reorder.pop(next_index)
+                    next_index += 1
+                    slots.release()
+                    track_buffer(-len(data))
+                    metrics.add_gauge("download_parts_pending", -1)
+
+                    downloaded_bytes += len(data)
+                    if progress_callback:
+                        progress_callback(downloaded_bytes, file_size)
+                    yield data
+
+            logger.info(f"Download complete: {message.file.name or message.id} ({file_size} bytes)")
         finally:
-            # Clean up temp directory and parts
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                logger.debug(f"Cleaned up temp directory: {temp_dir}")
-        
+            for task in workers_tasks:
+                task.cancel()
+            await asyncio.gather(*workers_tasks, return_exceptions=True)
+            # Drop whatever was still buffered or pending (early exit / error)
+            track_buffer(-buffered)
+            metrics.add_gauge("download_parts_pending", -(part_count - next_index))
+
+    async def download_file(
+        self,
+        message,
+        file_path: str,
+        part_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> str:
+        """
+        Download file in parallel parts, writing them in order.
+
+        Args:
+            message: Telegram message object containing the file
+            file_path: Path where file should be saved
+            part_size: Size of each part (auto-calculated if None)
+            progress_callback: Optional callback(downloaded_bytes, total_bytes)
+
+        Returns:
+            Path to downloaded file
+        """
+        try:
+            with open(file_path, 'wb') as output_file:
+                async for data in self.iter_download(message, part_size, progress_callback):
+                    output_file.write(data)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
         return file_path
@@ -14,16 +14,26 @@ import asyncio
 import hashlib
 import math
 import os
-from typing import Callable, Optional
+import threading
+import time
+from typing import Callable, Optional, Tuple, Union
 
 from telethon import TelegramClient, helpers
 from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
 from telethon.tl.types import InputFile, InputFileBig
 
+from .concurrency import AIMDController, fixed, upload_parts
+from .metrics import metrics, dc_of, flood_wait_seconds
+from .tracing import span
+
 import logging
 
 logger = logging.getLogger(__name__)
 
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024  # larger files must use saveBigFilePart
+STREAM_PART_SIZE = 512 * 1024  # streams have no size to pick a part size from
+MAX_RETRIES = 5
+
 
 def get_optimal_part_size(file_size: int) -> int:
     """
@@ -45,27 +55,79 @@ def get_optimal_part_size(file_size: int) -> int:
         return 512 * 1024
 
 
+class PartReader:
+    """
+    Reads parts of one file through a single descriptor.
+
+    Each part is one positional read (os.pread) into a fresh bytes object,
+    which is what the TL request serializes, so parts need no open/seek per
+    read and workers need no lock. Without os.pread (Windows) reads fall back
+    to seek + read under a lock.
+    """
+
+    def __init__(self, file_path: str):
+        self.fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        self.lock = None if hasattr(os, "pread") else threading.Lock()
+
+    def read(self, offset: int, size: int) -> bytes:
+        if self.lock is not None:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                return self._read_fully(lambda n, _: os.read(self.fd, n), offset, size)
+        return self._read_fully(lambda n, at: os.pread(self.fd, n, at), offset, size)
+
+    @staticmethod
+    def _read_fully(read, offset, size):
+        data = read(size, offset)
+        if len(data) == size or not data:
+            return data
+        # Short read (rare on regular files): keep reading until size or EOF
+        parts = [data]
+        got = len(data)
+        while got < size:
+            more = read(size - got, offset + got)
+            if not more:
+                break
+            parts.append(more)
+            got += len(more)
+        return b"".join(parts)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class ParallelUploader:
     """
     Uploads file in parallel parts to Telegram.
     
     Matches tdlib approach but in Python:
     - Dynamic part sizing
-    - Parallel upload with worker tasks
+    - Parallel upload with worker tasks, parts in flight capped by an
+      adaptive (AIMD) limit shared by all uploads
     - Progress tracking
     - Error handling with retries
     """
     
-    def __init__(self, client: TelegramClient, workers: int = 4):
+    def __init__(self, client: TelegramClient, workers: Optional[int] = None,
+                 controller: Optional[AIMDController] = None):
         """
         Initialize parallel uploader.
         
         Args:
             client: Telethon TelegramClient instance
-            workers: Number of parallel upload workers (default: 4)
+            workers: Fixed number of parts in flight (default: adaptive)
+            controller: Concurrency controller (default: the shared upload_parts)
         """
         self.client = client
-        self.workers = workers
+        self.controller = controller or (fixed("upload_part", workers) if workers else upload_parts)
         
     async def upload_file(
         self,
@@ -93,7 +155,7 @@ class ParallelUploader:
         
         # Calculate parts
         part_count = math.ceil(file_size / part_size)
-        is_big = file_size > 10 * 1024 * 1024  # > 10MB
+        is_big = file_size > BIG_FILE_THRESHOLD
         
         # Generate unique file ID
         file_id = helpers.generate_random_long()
@@ -111,12 +173,30 @@ class ParallelUploader:
             size = min(part_size, file_size - offset)
             await queue.put((i, offset, size))
         
+        dc_id = dc_of(self.client)
+        rpc_method = "saveBigFilePart" if is_big else "saveFilePart"
+        metrics.add_gauge("upload_parts_pending", part_count)
+        
         # Track progress and retries
         uploaded_bytes = 0
         progress_lock = asyncio.Lock()
         final_errors = [] # Only store errors that exceeded max retries
         retry_counts = {} # part_index -> count
-        MAX_RETRIES = 5
+        
+        # InputFile needs the MD5 of small files: feed it from the part buffers
+        # in part order instead of reading the file again at the end
+        md5 = None if is_big else hashlib.md5()
+        md5_next = 0
+        md5_pending = {}  # part_index -> data read ahead of a missing earlier part
+        
+        def feed_md5(part_index, data):
+            nonlocal md5_next
+            if part_index < md5_next or part_index in md5_pending:
+                return  # re-read for a retry
+            md5_pending[part_index] = data
+            while md5_next in md5_pending:
+                md5.update(md5_pending.pop(md5_next))
+                md5_next += 1
         
         async def upload_worker(worker_id):
             """Worker task to upload parts from queue"""
@@ -128,28 +208,39 @@ class ParallelUploader:
                 except asyncio.QueueEmpty:
                     break
                 
+                bytes_data = b""
                 try:
-                    logger.info(f"[Worker {worker_id}] Starting part {part_index}/{part_count} ({size} bytes)")
-                    
-                    # Read part from file
-                    with open(file_path, 'rb') as f:
-                        f.seek(offset)
-                        bytes_data = f.read(size)
-                    
-                    # Upload part
-                    if is_big:
-                        await self.client(SaveBigFilePartRequest(
-                            file_id=file_id,
-                            file_part=part_index,
-                            file_total_parts=part_count,
-                            bytes=bytes_data
-                        ))
-                    else:
-                        await self.client(SaveFilePartRequest(
-                            file_id=file_id,
-                            file_part=part_index,
-                            bytes=bytes_data
-                        ))
+                    # Read only once a slot is free, so waiting parts hold no memory
+                    async with self.controller.slot():
+                        logger.info(f"[Worker {worker_id}] Starting part {part_index}/{part_count} ({size} bytes)")
+                        
+                        # Read part through the transfer's shared descriptor
+                        with span("read_part", part=part_index):
+                            bytes_data = reader.read(offset, size)
+                        if md5 is not None:
+                            feed_md5(part_index, bytes_data)
+                        metrics.add_gauge("buffered_bytes", len(bytes_data), stage="upload_part")
+                        
+                        # Upload part
+                        request_start = time.perf_counter()
+                        with span("save_part", part=part_index, size=len(bytes_data)), \
+                                metrics.time("rpc_latency_seconds", method=rpc_method):
+                            if is_big:
+                                await self.client(SaveBigFilePartRequest(
+                                    file_id=file_id,
+                                    file_part=part_index,
+                                    file_total_parts=part_count,
+                                    bytes=bytes_data
+                                ))
+                            else:
+                                await self.client(SaveFilePartRequest(
+                                    file_id=file_id,
+                                    file_part=part_index,
+                                    bytes=bytes_data
+                                ))
+                        self.controller.record_success(len(bytes_data), time.perf_counter() - request_start)
+                    metrics.record_bytes("upload", dc_id, len(bytes_data))
+                    metrics.add_gauge("upload_parts_pending", -1)
                     
                     # Update progress
                     async with progress_lock:
@@ -161,26 +252,36 @@ class ParallelUploader:
                     logger.info(f"[Worker {worker_id}] Finished part {part_index}/{part_count}")
                     
                 except Exception as e:
+                    wait = flood_wait_seconds(e)
+                    if wait is not None:
+                        metrics.inc("flood_wait_seconds", wait, op="upload_part")
+                    self.controller.record_error(wait)
                     current_retries = retry_counts.get(part_index, 0)
                     if current_retries < MAX_RETRIES:
                         retry_counts[part_index] = current_retries + 1
+                        metrics.inc("retries", op="upload_part")
                         logger.warning(f"[Worker {worker_id}] Failed part {part_index} (Attempt {current_retries+1}/{MAX_RETRIES}): {e}. Retrying...")
                         await queue.put((part_index, offset, size))
                     else:
                         logger.error(f"[Worker {worker_id}] Failed part {part_index} after {MAX_RETRIES} attempts: {e}")
                         final_errors.append((part_index, e))
+                        metrics.inc("errors", op="upload_part")
+                        metrics.add_gauge("upload_parts_pending", -1)
                     
                 finally:
+                    metrics.add_gauge("buffered_bytes", -len(bytes_data), stage="upload_part")
                     queue.task_done()
         
         # Create and run workers
-        workers_tasks = [
-            asyncio.create_task(upload_worker(i))
-            for i in range(min(self.workers, part_count))
-        ]
-        
-        # Wait for all workers
-        await asyncio.gather(*workers_tasks)
+        with PartReader(file_path) as reader:
+            # Enough workers for the highest limit; the controller decides how many send
+            workers_tasks = [
+                asyncio.create_task(upload_worker(i))
+                for i in range(min(self.controller.maximum, part_count))
+            ]
+            
+            # Wait for all workers
+            await asyncio.gather(*workers_tasks)
         
         # Check for errors
         if final_errors:
@@ -196,12 +297,178 @@ class ParallelUploader:
                 name=file_name
             )
         else:
-            # Calculate MD5 for small files
-            with open(file_path, 'rb') as f:
-                md5 = hashlib.md5(f.read()).hexdigest()
+            if md5_next != part_count:
+                raise Exception(f"MD5 incomplete: {md5_next}/{part_count} parts hashed")
             return InputFile(
                 id=file_id,
                 parts=part_count,
                 name=file_name,
-                md5_checksum=md5
+                md5_checksum=md5.hexdigest()
             )
+
+    async def upload_stream(
+        self,
+        reader,
+        name: str,
+        limit: Optional[int] = None,
+        part_size: int = STREAM_PART_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        on_data: Optional[Callable[[bytes], None]] = None
+    ) -> Tuple[Optional[Union[InputFile, InputFileBig]], int]:
+        """
+        Upload bytes from a stream of unknown length as one document.
+
+        Parts are sent while the stream is still being read, with at most
+        about two parts per worker buffered. The first 10MB are held back: a
+        stream that ends within them is sent as a small file (saveFilePart,
+        MD5 from the buffered parts). Longer streams use saveBigFilePart with
+        file_total_parts=-1 on every part but the last, which is kept until
+        the next read hits the end so it can carry the real count.
+
+        Args:
+            reader: file_manager.StreamReader over the source
+            name: File name of the uploaded document
+            limit: Stop after this many bytes (None: read until the stream ends)
+            part_size: Size of each part (fixed for the whole stream)
+            progress_callback: Optional callback(uploaded_bytes, total_bytes);
+                               total_bytes is 0 while the size is unknown
+            on_data: Optional callback receiving every part's bytes in stream order
+
+        Returns:
+            (InputFile or InputFileBig, size in bytes); (None, 0) if the stream was empty
+        """
+        remaining = limit
+        read_bytes = 0
+        
+        async def next_part():
+            nonlocal remaining, read_bytes
+            size = part_size if remaining is None else min(part_size, remaining)
+            if size <= 0:
+                return b""
+            with span("read_part"):
+                data = await reader.read(size)
+            read_bytes += len(data)
+            if remaining is not None:
+                remaining -= len(data)
+            if data and on_data:
+                on_data(data)
+            return data
+        
+        # Buffer up to the small-file threshold to learn which upload kind this is
+        head = []
+        head_bytes = 0
+        while head_bytes <= BIG_FILE_THRESHOLD:
+            data = await next_part()
+            if not data:
+                break
+            head.append(data)
+            head_bytes += len(data)
+        if not head:
+            return None, 0
+        is_big = head_bytes > BIG_FILE_THRESHOLD
+        
+        file_id = helpers.generate_random_long()
+        dc_id = dc_of(self.client)
+        rpc_method = "saveBigFilePart" if is_big else "saveFilePart"
+        logger.info(f"Starting stream upload: {name} (part_size={part_size}, big={is_big})")
+        
+        # Bounded: reading stalls while every worker is busy and the queue is full
+        queue = asyncio.Queue(maxsize=self.controller.maximum)
+        uploaded_bytes = 0
+        size_known = 0
+        final_errors = []
+        
+        async def send(part_index, data, total_parts):
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    async with self.controller.slot():
+                        request_start = time.perf_counter()
+                        with span("save_part", part=part_index, size=len(data)), \
+                                metrics.time("rpc_latency_seconds", method=rpc_method):
+                            if is_big:
+                                await self.client(SaveBigFilePartRequest(
+                                    file_id=file_id,
+                                    file_part=part_index,
+                                    file_total_parts=total_parts,
+                                    bytes=data
+                                ))
+                            else:
+                                await self.client(SaveFilePartRequest(
+                                    file_id=file_id,
+                                    file_part=part_index,
+                                    bytes=data
+                                ))
+                        self.controller.record_success(len(data), time.perf_counter() - request_start)
+                    return
+                except Exception as e:
+                    wait = flood_wait_seconds(e)
+                    if wait is not None:
+                        metrics.inc("flood_wait_seconds", wait, op="upload_part")
+                    self.controller.record_error(wait)
+                    if attempt == MAX_RETRIES:
+                        raise
+                    metrics.inc("retries", op="upload_part")
+                    logger.warning(f"Failed stream part {part_index} (Attempt {attempt+1}/{MAX_RETRIES}): {e}. Retrying...")
+        
+        async def upload_worker():
+            nonlocal uploaded_bytes
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                part_index, data, total_parts = item
+                try:
+                    # After a failure keep draining so the reader never blocks on a full queue
+                    if not final_errors:
+                        await send(part_index, data, total_parts)
+                        metrics.record_bytes("upload", dc_id, len(data))
+                        uploaded_bytes += len(data)
+                        if progress_callback:
+                            progress_callback(uploaded_bytes, size_known)
+                except Exception as e:
+                    logger.error(f"Failed stream part {part_index} after {MAX_RETRIES} attempts: {e}")
+                    final_errors.append((part_index, e))
+                    metrics.inc("errors", op="upload_part")
+                finally:
+                    metrics.add_gauge("buffered_bytes", -len(data), stage="upload_stream")
+        
+        async def put(part_index, data, total_parts):
+            metrics.add_gauge("buffered_bytes", len(data), stage="upload_stream")
+            await queue.put((part_index, data, total_parts))
+        
+        workers_tasks = [asyncio.create_task(upload_worker()) for _ in range(self.controller.maximum)]
+        part_count = 0
+        md5 = None
+        try:
+            if is_big:
+                # One part is always held back: only a read past it shows it is the last
+                held = head.pop(0)
+                while not final_errors:
+                    data = head.pop(0) if head else await next_part()
+                    if not data:
+                        break
+                    await put(part_count, held, -1)
+                    part_count += 1
+                    held = data
+                part_count += 1
+                size_known = read_bytes
+                await put(part_count - 1, held, part_count)
+            else:
+                size_known = head_bytes
+                md5 = hashlib.md5()
+                for data in head:
+                    md5.update(data)
+                    await put(part_count, data, part_count)
+                    part_count += 1
+        finally:
+            for _ in workers_tasks:
+                await queue.put(None)
+            await asyncio.gather(*workers_tasks)
+        
+        if final_errors:
+            raise Exception(f"Upload failed for {len(final_errors)} parts. First error: {final_errors[0][1]}")
+        
+        logger.info(f"Stream upload complete: {name} ({uploaded_bytes} bytes, {part_count} parts)")
+        if is_big:
+            return InputFileBig(id=file_id, parts=part_count, name=name), uploaded_bytes
+        return InputFile(id=file_id, parts=part_count, name=name, md5_checksum=md5.hexdigest()), uploaded_bytes
@@ -1,9 +1,45 @@
 """
 Passcode manager - stores encrypted passcode on Telegram.
 Zero-knowledge approach: passcode encrypted by itself, no local storage.
+
+The PASSCODE_HASH record is located once per session with a server-side
+search (so it is found however old it is) and its message id is cached;
+later operations fetch just that message.
 """
+import asyncio
+import weakref
 from typing import Optional
 
+# client -> message id of its PASSCODE_HASH record
+_passcode_message_ids = weakref.WeakKeyDictionary()
+
+
+async def _find_passcode_message(client):
+    """
+    Return the PASSCODE_HASH message, or None if no passcode is set.
+    
+    Uses the cached message id when available (one targeted fetch) and falls
+    back to a server-side search if the record moved or was never located.
+    """
+    cached_id = _passcode_message_ids.get(client)
+    if cached_id is not None:
+        msg = await client.get_messages("me", ids=cached_id)
+        if msg and msg.text and msg.text.startswith("PASSCODE_HASH\n"):
+            return msg
+        _passcode_message_ids.pop(client, None)
+    
+    async for msg in client.iter_messages("me", search="PASSCODE_HASH"):
+        if msg.text and msg.text.startswith("PASSCODE_HASH\n"):
+            _passcode_message_ids[client] = msg.id
+            return msg
+    
+    return None
+
+
+def forget_passcode_message(client) -> None:
+    """Drop the cached record id (after it was deleted)."""
+    _passcode_message_ids.pop(client, None)
+
 
 async def set_passcode_on_telegram(client, passcode: str) -> None:
     """
@@ -27,7 +63,8 @@ async def set_passcode_on_telegram(client, passcode: str) -> None:
     encrypted_passcode = encrypt_data(passcode, passcode)
     
     # Send to Saved Messages (entity "me")
-    await client.send_message("me", f"PASSCODE_HASH\n{encrypted_passcode}")
+    msg = await client.send_message("me", f"PASSCODE_HASH\n{encrypted_passcode}")
+    _passcode_message_ids[client] = msg.id
 
 
 async def verify_passcode_from_telegram(client, passcode: str) -> bool:
@@ -48,23 +85,21 @@ async def verify_passcode_from_telegram(client, passcode: str) -> bool:
         return False
     
     # Fetch passcode hash from Telegram
-    messages = await client.get_messages("me", limit=100)
+    msg = await _find_passcode_message(client)
+    if not msg:
+        # No passcode hash found
+        return False
     
-    for msg in messages:
-        if msg.text and msg.text.startswith("PASSCODE_HASH\n"):
-            encrypted_passcode = msg.text.split("\n", 1)[1]
-            
-            try:
-                # Try to decrypt with provided passcode
-                decrypted = decrypt_data(encrypted_passcode, passcode)
-                # If decryption succeeds and result matches input = correct passcode
-                return decrypted == passcode
-            except (InvalidToken, Exception):
-                # Wrong passcode or corrupted data
-                return False
+    encrypted_passcode = msg.text.split("\n", 1)[1]
     
-    # No passcode hash found
-    return False
+    try:
+        # Try to decrypt with provided passcode
+        decrypted = decrypt_data(encrypted_passcode, passcode)
+        # If decryption succeeds and result matches input = correct passcode
+        return decrypted == passcode
+    except (InvalidToken, Exception):
+        # Wrong passcode or corrupted data
+        return False
 
 
 async def has_passcode_on_telegram(client) -> bool:
@@ -77,13 +112,7 @@ async def has_passcode_on_telegram(client) -> bool:
     Returns:
         True if passcode hash exists, False otherwise
     """
-    messages = await client.get_messages("me", limit=100)
-    
-    for msg in messages:
-        if msg.text and msg.text.startswith("PASSCODE_HASH\n"):
-            return True
-    
-    return False
+    return await _find_passcode_message(client) is not None
 
 
 async def change_passcode_on_telegram(client, old_passcode: str, new_passcode: str) -> bool:
@@ -111,12 +140,11 @@ async def change_passcode_on_telegram(client, old_passcode: str, new_passcode: s
     if not await verify_passcode_from_telegram(client, old_passcode):
         return False
     
-    # Delete old passcode hash
-    messages = await client.get_messages("me", limit=100)
-    for msg in messages:
-        if msg.text and msg.text.startswith("PASSCODE_HASH\n"):
-            await client.delete_messages("me", [msg.id])
-            break
+    # Delete old passcode hash (located by the verification above)
+    msg = await _find_passcode_message(client)
+    if msg:
+        await client.delete_messages("me", [msg.id])
+        forget_passcode_message(client)
     
     # Set new passcode
     await set_passcode_on_telegram(client, new_passcode)
@@ -131,60 +159,81 @@ async def delete_passcode_from_telegram(client) -> None:
     Args:
         client: Telegram client
     """
-    messages = await client.get_messages("me", limit=100)
-    
-    for msg in messages:
-        if msg.text and msg.text.startswith("PASSCODE_HASH\n"):
-            await client.delete_messages("me", [msg.id])
-            break
+    msg = await _find_passcode_message(client)
+    if msg:
+        await client.delete_messages("me", [msg.id])
+        forget_passcode_message(client)
+
+
+# (server-side search query, result key, exact match on message text)
+RESET_TARGETS = (
+    ("PASSCODE_HASH", "passcode_deleted", lambda text: text.startswith("PASSCODE_HASH\n")),
+    ("METADATA_V2_ENCRYPTED", "encrypted_files_deleted", lambda text: text.startswith("METADATA_V2_ENCRYPTED\n")),
+    ("#ENCRYPTED_CHUNK", "chunks_deleted", lambda text: "#ENCRYPTED_CHUNK" in text),
+)
+DELETE_BATCH_SIZE = 100  # Max ids per messages.deleteMessages
+DELETE_CONCURRENCY = 4
 
 
-async def reset_all_encrypted_data(client) -> dict:
+async def reset_all_encrypted_data(client, progress_callback=None) -> dict:
     """
     NUCLEAR OPTION: Delete all encrypted data (passcode + V2 metadata).
     This is the ONLY recovery option if passcode is forgotten.
     
+    Streams matches of server-side searches for each marker instead of loading
+    the whole history, and deletes full batches with bounded concurrency, so
+    memory stays constant in the size of Saved Messages.
+    
     Args:
         client: Telegram client
+        progress_callback: Optional callback(deleted, total)
         
     Returns:
-        dict with counts: {"passcode_deleted": int, "encrypted_files_deleted": int}
+        dict with counts: {"passcode_deleted": int, "encrypted_files_deleted": int, "chunks_deleted": int}
     """
-    messages = await client.get_messages("me", limit=None) # Fetch all messages to ensure full cleanup
-    
-    passcode_deleted = 0
-    metadata_deleted = 0
-    chunks_deleted = 0
-    
-    ids_to_delete = []
-    
-    for msg in messages:
-        if msg.text:
-            # Delete passcode hash
-            if msg.text.startswith("PASSCODE_HASH\n"):
-                ids_to_delete.append(msg.id)
-                passcode_deleted += 1
-            
-            # Delete V2 encrypted metadata
-            elif msg.text.startswith("METADATA_V2_ENCRYPTED\n"):
-                ids_to_delete.append(msg.id)
-                metadata_deleted += 1
-                
-            # Delete encrypted chunks (orphaned data)
-            elif "#ENCRYPTED_CHUNK" in msg.text:
-                ids_to_delete.append(msg.id)
-                chunks_deleted += 1
-                
-    if ids_to_delete:
-        # Batch delete for efficiency
-        # Telethon delete_messages can handle list of IDs
-        # Split into chunks of 100 just to be safe
-        for i in range(0, len(ids_to_delete), 100):
-            batch = ids_to_delete[i:i+100]
-            await client.delete_messages("me", batch)
-    
-    return {
-        "passcode_deleted": passcode_deleted,
-        "encrypted_files_deleted": metadata_deleted,
-        "chunks_deleted": chunks_deleted
-    }
+    forget_passcode_message(client)
+    
+    counts = {key: 0 for _, key, _ in RESET_TARGETS}
+    total = 0
+    for query, _, _ in RESET_TARGETS:
+        total += (await client.get_messages("me", search=query, limit=0)).total
+    
+    deleted = 0
+    in_flight = set()
+    
+    async def delete_batch(ids):
+        nonlocal deleted
+        await client.delete_messages("me", ids)
+        deleted += len(ids)
+        if progress_callback:
+            progress_callback(deleted, total)
+    
+    async def submit(ids):
+        nonlocal in_flight
+        # Bound concurrent deletes (and the ids held in memory)
+        while len(in_flight) >= DELETE_CONCURRENCY:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        in_flight.add(asyncio.create_task(delete_batch(ids)))
+    
+    try:
+        for query, key, matches in RESET_TARGETS:
+            batch = []
+            async for msg in client.iter_messages("me", search=query):
+                if msg.text and matches(msg.text):
+                    batch.append(msg.id)
+                    counts[key] += 1
+                    if len(batch) >= DELETE_BATCH_SIZE:
+                        await submit(batch)
+                        batch = []
+            if batch:
+                await submit(batch)
+        
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+    
+    return counts
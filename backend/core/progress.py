@@ -0,0 +1,169 @@
+"""
+Coalesced transfer progress reporting.
+
+Every active transfer gets a TransferTracker registered with one shared
+ProgressAggregator:
+- Part callbacks only adjust running byte totals (O(1) per update)
+- A single background thread flushes one batched payload for all
+  transfers at a fixed frame rate
+- The payload goes to a pluggable sink (webview bridge, CLI printer, ...)
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_FPS = 10
+
+
+def fps_from_env(name: str = "TG_DRIVE_PROGRESS_FPS") -> Optional[float]:
+    """
+    Read a progress frame rate from the environment.
+
+    Args:
+        name: Environment variable holding the frames per second
+
+    Returns:
+        The frame rate, or None (use the default) when unset, 0 or invalid
+    """
+    value = os.getenv(name, "").strip()
+    if not value:
+        return None
+    try:
+        fps = float(value)
+    except ValueError:
+        fps = None
+    if fps is None or not math.isfinite(fps) or fps < 0:
+        print(f"ProgressAggregator: Ignoring {name}={value!r}, using {DEFAULT_FPS} fps")
+        return None
+    return fps or None
+
+
+def format_speed(speed: float) -> str:
+    """Format a bytes/second value for display."""
+    if speed > 1024 * 1024:
+        return f"{speed / (1024 * 1024):.1f} MB/s"
+    elif speed > 1024:
+        return f"{speed / 1024:.1f} KB/s"
+    return f"{speed:.0f} B/s"
+
+
+class TransferTracker:
+    """
+    Progress state of a single transfer.
+
+    Keeps the last reported byte count per chunk plus a running total,
+    so an update never has to re-sum all chunks.
+    """
+
+    def __init__(self, aggregator, total_size, file_id, name=None, is_upload=True):
+        self.aggregator = aggregator
+        self.total_size = total_size
+        self.file_id = file_id
+        self.name = name
+        self.is_upload = is_upload
+        self.start_time = time.time()
+        self.chunk_progress = {}  # chunk_index -> bytes_transferred
+        self.transferred = 0
+        self.status = "Transferring..."
+
+    def update(self, chunk_index, current, total):
+        with self.aggregator.lock:
+            previous = self.chunk_progress.get(chunk_index, 0)
+            self.chunk_progress[chunk_index] = current
+            self.transferred += current - previous
+            self.aggregator.dirty = True
+
+    def set_status(self, status):
+        with self.aggregator.lock:
+            self.status = status
+            self.aggregator.dirty = True
+
+    def close(self):
+        """Stop reporting this transfer."""
+        self.aggregator.remove(self.file_id)
+
+    def snapshot(self, now) -> dict:
+        """Build the payload entry for this transfer (caller holds the lock)."""
+        progress = int((self.transferred / self.total_size) * 100) if self.total_size else 0
+        duration = max(now - self.start_time, 0.1)
+        return {
+            "id": self.file_id,
+            "name": self.name,
+            "kind": "upload" if self.is_upload else "download",
+            "progress": min(progress, 100),
+            "transferred": self.transferred,
+            "total": self.total_size,
+            "speed": format_speed(self.transferred / duration),
+            "status": self.status,
+        }
+
+
+class ProgressAggregator:
+    """
+    Collects progress from all trackers and pushes it in batches.
+
+    The flush thread only runs while transfers are active and only emits
+    when something changed since the previous frame.
+    """
+
+    def __init__(self, sink: Callable[[List[dict]], None], fps: Optional[float] = None):
+        """
+        Initialize aggregator.
+
+        Args:
+            sink: Callable receiving a list of per-transfer payload dicts
+            fps: Maximum number of flushes per second (default: 10)
+        """
+        self.sink = sink
+        self.fps = fps or DEFAULT_FPS
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.transfers: Dict[str, TransferTracker] = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def track(self, total_size, file_id, name=None, is_upload=True) -> TransferTracker:
+        """Register a transfer and return its tracker."""
+        tracker = TransferTracker(self, total_size, file_id, name=name, is_upload=is_upload)
+        with self.lock:
+            self.transfers[file_id] = tracker
+            self.dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return tracker
+
+    def remove(self, file_id):
+        with self.lock:
+            self.transfers.pop(file_id, None)
+
+    def flush(self):
+        """Push one batch if anything changed since the last flush."""
+        with self.lock:
+            if not self.dirty or not self.transfers:
+                self.dirty = False
+                return
+            now = time.time()
+            batch = [t.snapshot(now) for t in self.transfers.values()]
+            self.dirty = False
+        try:
+            self.sink(batch)
+        except Exception as e:
+            print(f"ProgressAggregator: sink failed: {e}")
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        while True:
+            with self.lock:
+                idle = not self.transfers
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            time.sleep(interval)
+            self.flush()
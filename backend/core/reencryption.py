@@ -0,0 +1,170 @@
+"""
+Metadata re-encryption after a passcode change.
+
+- Only METADATA_V2_ENCRYPTED messages are visited (server-side search)
+- The new key is derived once; every record is re-encrypted with it
+- Decryption (PBKDF2) runs in worker threads, edits run with bounded concurrency
+- A checkpoint (encrypted with the new passcode) is saved after every batch,
+  so an interrupted run resumes where it stopped instead of restarting.
+  It holds only the position and the ids of records that failed; the old
+  passcode is never written to disk and must be entered again to resume
+"""
+import asyncio
+import json
+import os
+from typing import Callable, Iterable, Optional
+
+from .client import SESSION_NAME
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(SESSION_NAME), "reencrypt_checkpoint.json")
+
+BATCH_SIZE = 50
+DEFAULT_CONCURRENCY = 8
+WALK_COMPLETE = 1  # offset_id once the whole history was walked (ids start at 1)
+
+
+def save_checkpoint(new_passcode: str, offset_id: int = 0, done: int = 0, failed_ids: Iterable[int] = ()) -> None:
+    """
+    Persist re-encryption progress, encrypted with the new passcode.
+
+    Args:
+        new_passcode: Passcode the catalog is being migrated to
+        offset_id: Every V2 record with an id >= offset_id is migrated, except
+                   failed_ids (0 = none yet, WALK_COMPLETE = all were visited)
+        done: Number of records visited so far
+        failed_ids: Message ids that could not be migrated and must be retried
+    """
+    from .crypto_utils import encrypt_data
+    state = {"offset_id": offset_id, "done": done, "failed_ids": sorted(failed_ids)}
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(encrypt_data(json.dumps(state), new_passcode))
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def load_checkpoint(passcode: str) -> Optional[dict]:
+    """
+    Return the pending re-encryption state if it belongs to `passcode`, else None.
+
+    Returns:
+        {"offset_id", "done", "failed_ids"}
+    """
+    from .crypto_utils import decrypt_data
+    try:
+        with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+            return json.loads(decrypt_data(f.read(), passcode))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Written for another passcode (e.g. a change that never went through)
+        return None
+
+
+def clear_checkpoint() -> None:
+    try:
+        os.remove(CHECKPOINT_PATH)
+    except FileNotFoundError:
+        pass
+
+
+async def reencrypt_metadata(
+    client,
+    old_passcode: str,
+    new_passcode: str,
+    offset_id: int = 0,
+    done: int = 0,
+    retry_ids: Iterable[int] = (),
+    concurrency: int = DEFAULT_CONCURRENCY,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """
+    Re-encrypt all V2 metadata from old_passcode to new_passcode.
+
+    Args:
+        client: Telegram client
+        old_passcode: Passcode records are currently encrypted with
+        new_passcode: Passcode to re-encrypt with
+        offset_id: Resume point from a checkpoint (0 = start from newest)
+        done: Records already migrated before offset_id (for progress)
+        retry_ids: Records that failed in an earlier run, retried first
+        concurrency: Maximum parallel decrypt+edit operations
+        progress_callback: Optional callback(done, total)
+
+    Returns:
+        dict with counts: {"reencrypted": int, "skipped": int, "failed": int}
+    """
+    from cryptography.fernet import InvalidToken
+    from .crypto_utils import derive_key, decrypt_data, encrypt_data_with_key
+
+    # One PBKDF2 run for the new key instead of one per record
+    new_salt = os.urandom(16)
+    new_key = await asyncio.to_thread(derive_key, new_passcode, new_salt)
+
+    total = (await client.get_messages("me", search="METADATA_V2_ENCRYPTED", limit=0)).total
+    counts = {"reencrypted": 0, "skipped": 0, "failed": 0}
+    failed_ids = set()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def process(msg):
+        async with sem:
+            encrypted_str = msg.text.split("\n", 1)[1]
+            try:
+                json_str = await asyncio.to_thread(decrypt_data, encrypted_str, old_passcode)
+            except InvalidToken:
+                # Already migrated by an earlier, interrupted run?
+                try:
+                    await asyncio.to_thread(decrypt_data, encrypted_str, new_passcode)
+                    counts["skipped"] += 1
+                except Exception as e:
+                    print(f"Reencryption: Cannot decrypt message {msg.id}: {e}")
+                    counts["failed"] += 1
+                    failed_ids.add(msg.id)
+                return
+            try:
+                new_content = encrypt_data_with_key(json_str, new_key, new_salt)
+                await msg.edit(f"METADATA_V2_ENCRYPTED\n{new_content}")
+                counts["reencrypted"] += 1
+            except Exception as e:
+                print(f"Reencryption: Failed to re-encrypt message {msg.id}: {e}")
+                counts["failed"] += 1
+                failed_ids.add(msg.id)
+
+    async def flush(batch):
+        nonlocal done, offset_id
+        await asyncio.gather(*(process(msg) for msg in batch))
+        done += len(batch)
+        # History is walked newest -> oldest, so everything >= the oldest id is
+        # finished except the failures, which the checkpoint keeps for a retry
+        offset_id = batch[-1].id
+        await asyncio.to_thread(save_checkpoint, new_passcode, offset_id, done, failed_ids)
+        if progress_callback:
+            progress_callback(done, total)
+
+    # Failures of an earlier run lie above offset_id; the walk below never sees them again
+    retry_ids = sorted(retry_ids)
+    if retry_ids:
+        retry_msgs = await client.get_messages("me", ids=retry_ids)
+        await asyncio.gather(*(
+            process(msg) for msg in retry_msgs
+            if msg and msg.text and msg.text.startswith("METADATA_V2_ENCRYPTED")
+        ))
+        await asyncio.to_thread(save_checkpoint, new_passcode, offset_id, done, failed_ids)
+
+    if offset_id != WALK_COMPLETE:
+        batch = []
+        async for msg in client.iter_messages("me", search="METADATA_V2_ENCRYPTED", offset_id=offset_id):
+            if not (msg.text and msg.text.startswith("METADATA_V2_ENCRYPTED")):
+                continue
+            batch.append(msg)
+            if len(batch) >= BATCH_SIZE:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+
+    if not failed_ids:
+        clear_checkpoint()
+    else:
+        # Only the failures are left for the next resume
+        await asyncio.to_thread(save_checkpoint, new_passcode, WALK_COMPLETE, done, failed_ids)
+    return counts
@@ -0,0 +1,258 @@
+"""
+Stage-level tracing and opt-in profiling for transfers.
+
+A transfer runs inside transfer_trace(); every span() opened by code running
+in it (including tasks and threads it spawns - they inherit the context) is
+recorded as a Chrome trace-format "complete" event. Concurrent tasks get
+their own lanes so overlapping part uploads are shown side by side.
+
+Output (one set per transfer, in TRACE_DIR):
+- <kind>_<id>.trace.json   open in chrome://tracing, Perfetto or speedscope
+- <kind>_<id>.prof         cProfile stats (profiler="cprofile")
+- <kind>_<id>.folded       folded stacks of the loop thread (profiler="sampling"),
+                           for flamegraph.pl / speedscope
+
+Off by default; enable with TG_DRIVE_TRACE=1 and TG_DRIVE_PROFILE=cprofile|sampling,
+or at runtime via configure(). When off, span() is a near-free no-op.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from .client import SESSION_NAME
+
+TRACE_DIR = os.getenv("TG_DRIVE_TRACE_DIR") or os.path.join(os.path.dirname(SESSION_NAME), "traces")
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+UNCHANGED = "unchanged"  # configure() argument that keeps the current setting
+
+_enabled = os.getenv("TG_DRIVE_TRACE", "") not in ("", "0")
+_profiler = os.getenv("TG_DRIVE_PROFILE") or None
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# cProfile / the sampler can only watch one transfer at a time
+_profile_lock = threading.Lock()
+
+
+def configure(enabled: Optional[bool] = None, profiler: Optional[str] = UNCHANGED) -> dict:
+    """
+    Turn tracing / profiling on or off for transfers started from now on.
+
+    Args:
+        enabled: Record span traces
+        profiler: None, "cprofile" or "sampling" (default: leave as is)
+
+    Returns:
+        Current settings
+    """
+    global _enabled, _profiler
+    if enabled is not None:
+        _enabled = bool(enabled)
+    if profiler != UNCHANGED:
+        if profiler not in (None, "cprofile", "sampling"):
+            raise ValueError(f"Unknown profiler: {profiler}")
+        _profiler = profiler
+    return {"enabled": _enabled, "profiler": _profiler, "trace_dir": TRACE_DIR}
+
+
+class Trace:
+    """Span events of one transfer."""
+
+    def __init__(self, kind: str, transfer_id: str, name: Optional[str] = None):
+        self.kind = kind
+        self.transfer_id = transfer_id
+        self.name = name
+        self.origin = time.perf_counter()
+        self.events = []
+        self.lanes = {}  # task / thread -> lane id
+        self.lock = threading.Lock()
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        owner = task if task is not None else threading.current_thread()
+        with self.lock:
+            lane = self.lanes.get(id(owner))
+            if lane is None:
+                lane = self.lanes[id(owner)] = len(self.lanes) + 1
+                label = task.get_name() if task is not None else f"thread {owner.name}"
+                self.events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": label}})
+            return lane
+
+    def add(self, name: str, start: float, end: float, args: dict) -> None:
+        event = {
+            "name": name,
+            "cat": self.kind,
+            "ph": "X",
+            "ts": round((start - self.origin) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": 1,
+            "tid": self._lane(),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    def to_chrome(self) -> dict:
+        return {
+            "traceEvents": [
+                {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"{self.kind} {self.name or self.transfer_id}"}}
+            ] + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"kind": self.kind, "transfer_id": self.transfer_id, "name": self.name},
+        }
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, trace, name, args):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace.add(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+def span(name: str, **args):
+    """Time a pipeline stage of the current transfer (no-op outside a traced transfer)."""
+    trace = current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, args)
+
+
+def iter_spans(iterable, name: str, **args):
+    """Yield from `iterable`, timing each step (e.g. reading the next chunk) as a span."""
+    iterator = iter(iterable)
+    index = 0
+    while True:
+        with span(name, index=index, **args):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+        index += 1
+
+
+class _StackSampler:
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tg-drive-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        import sys
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda kv: -kv[1]):
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def transfer_trace(kind: str, transfer_id: str, name: Optional[str] = None):
+    """
+    Trace (and optionally profile) one transfer.
+
+    Args:
+        kind: "upload" or "download"
+        transfer_id: File id, used in the output file names
+        name: Display name of the file
+
+    Yields:
+        The Trace, or None when tracing and profiling are off
+    """
+    if not _enabled and not _profiler:
+        yield None
+        return
+
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    base_path = os.path.join(TRACE_DIR, f"{kind}_{transfer_id}")
+    trace = Trace(kind, transfer_id, name) if _enabled else None
+    token = current_trace.set(trace)
+
+    profiler = None
+    sampler = None
+    if _profiler and _profile_lock.acquire(blocking=False):
+        if _profiler == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Another profiler (debugger, coverage) is already active
+                print(f"Tracing: cProfile not started: {e}")
+                profiler = None
+        else:
+            sampler = _StackSampler(threading.get_ident())
+            sampler.start()
+        if profiler is None and sampler is None:
+            _profile_lock.release()
+    elif _profiler:
+        print(f"Tracing: Another transfer is being profiled; {kind} {transfer_id} runs unprofiled")
+
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(base_path + ".prof")
+            _profile_lock.release()
+        if sampler is not None:
+            sampler.stop()
+            sampler.save(base_path + ".folded")
+            _profile_lock.release()
+        if trace is not None:
+            with open(base_path + ".trace.json", "w", encoding="utf-8") as f:
+                json.dump(trace.to_chrome(), f)
+            print(f"Tracing: Saved {base_path}.trace.json")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Catalog-scale benchmark for the metadata paths.
+
+Fills the simulated Saved Messages (benchmarks/fake_telegram.py) with a
+synthetic catalog of METADATA_V1 or METADATA_V2_ENCRYPTED records, then times:
+- list_all         FileHandler.list_all_files (every record, via iter_catalog)
+- lookup           FileHandler._find_metadata for the oldest file (falls
+                   back to the full catalog past the newest messages)
+- rename           FileHandler.rename_file
+- delete           FileHandler.delete_file
+- change_passcode  PasscodeHandler.change_passcode (hash swap + re-encryption)
+
+For each operation it reports wall time, round trips issued (simulated RPCs),
+CPU time spent in decrypt_data (PBKDF2 + Fernet, summed over worker threads),
+number of decryptions and peak traced memory. Each (size, format) case runs
+in a fresh interpreter; peak RSS is reported per case. A case fails unless
+list_all returns every file and lookup finds the oldest one, so the numbers
+always cover the whole catalog.
+
+V2 reads pay one PBKDF2 run per record (~30 ms per core), so re-encrypting a
+100k catalog takes a long time by design - use --ops to leave it out.
+
+Usage:
+    python benchmarks/catalog_bench.py
+    python benchmarks/catalog_bench.py --sizes 10k --formats v2 --latency 0.05
+    python benchmarks/catalog_bench.py --sizes 100k --ops list_all,lookup,rename,delete
+    python benchmarks/catalog_bench.py --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "catalog.json"
+OPS = ("list_all", "lookup", "rename", "delete", "change_passcode")
+FORMATS = ("v1", "v2")
+DEFAULT_SIZES = "10k,100k"
+PASSCODE = "123456"
+NEW_PASSCODE = "654321"
+
+
+def parse_count(text):
+    """'10k' -> 10000"""
+    units = {"K": 1000, "M": 1000 ** 2}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((peak if sys.platform == "darwin" else peak * 1024) / (1024 * 1024), 1)
+
+
+class DecryptMeter:
+    """Wraps crypto_utils.decrypt_data to sum the CPU time of every call."""
+
+    def __init__(self):
+        from backend.core import crypto_utils
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cpu_seconds = 0.0
+        original = crypto_utils.decrypt_data
+
+        def metered(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                spent = time.thread_time() - start
+                with self._lock:
+                    self.calls += 1
+                    self.cpu_seconds += spent
+
+        # Callers import decrypt_data at call time, so they pick this up
+        crypto_utils.decrypt_data = metered
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.cpu_seconds = 0.0
+
+
+async def run_case(count, fmt, ops, client):
+    from fake_telegram import FakeBridge, populate_catalog
+    from backend.core import tg_client
+    from backend.core.crypto_utils import forget_derived_keys
+    from backend.core.passcode_manager import set_passcode_on_telegram
+    from backend.api.files import FileHandler
+    from backend.api.passcode import PasscodeHandler
+
+    passcode = PASSCODE if fmt == "v2" else None
+    rows = populate_catalog(client, count, passcode=passcode)
+    await set_passcode_on_telegram(client, PASSCODE)
+    tg_client.client = client
+
+    bridge = FakeBridge(loop=asyncio.get_running_loop(), passcode=passcode)
+    files = FileHandler(bridge)
+    passcodes = PasscodeHandler(bridge)
+    meter = DecryptMeter()
+
+    oldest, second_oldest = rows[0], rows[1]
+    calls = {
+        "list_all": lambda: files.list_all_files(),
+        "lookup": lambda: files._find_metadata(oldest["id"]),
+        "rename": lambda: files.rename_file(oldest["id"], "renamed.bin", oldest["metadata_message_id"]),
+        "delete": lambda: files.delete_file(second_oldest["id"], second_oldest["metadata_message_id"]),
+        "change_passcode": lambda: passcodes.change_passcode(PASSCODE, NEW_PASSCODE),
+    }
+
+    results = {}
+    for op in ops:
+        forget_derived_keys()
+        meter.reset()
+        rpc_before = dict(client.stats)
+        tracemalloc.start()
+        start = time.perf_counter()
+        outcome = await calls[op]()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        check(op, outcome, count)
+
+        rpcs = {
+            k[len("rpc."):]: v - rpc_before.get(k, 0)
+            for k, v in client.stats.items()
+            if k.startswith("rpc.") and k != "rpc.total" and v - rpc_before.get(k, 0)
+        }
+        results[op] = {
+            "seconds": round(elapsed, 4),
+            "round_trips": client.stats["rpc.total"] - rpc_before.get("rpc.total", 0),
+            "rpc": rpcs,
+            "decrypts": meter.calls,
+            "decrypt_cpu_seconds": round(meter.cpu_seconds, 4),
+            "peak_traced_mb": round(peak / (1024 * 1024), 2),
+            "result": summarize(op, outcome),
+        }
+    return results
+
+
+def check(op, outcome, count):
+    """Refuse results that did not cover the whole catalog (they would not scale with it)."""
+    if op == "list_all" and len(outcome) != count:
+        raise RuntimeError(f"list_all returned {len(outcome)} of {count} files")
+    if op == "lookup" and outcome is None:
+        raise RuntimeError("lookup did not find the oldest file")
+
+
+def summarize(op, outcome):
+    """Short, JSON-safe description of what an operation returned."""
+    if op == "list_all":
+        return {"listed": len(outcome)}
+    if op == "lookup":
+        return {"found": outcome is not None}
+    if isinstance(outcome, dict):
+        return {k: v for k, v in outcome.items() if k != "patch"}
+    return None
+
+
+def child(args):
+    """Child process: run one (size, format) case and print its JSON result."""
+    from fake_telegram import FakeTelegramClient
+    from backend.core import listing_cache, reencryption, chunk_gc
+
+    count, fmt = args.case.split(":")
+    client = FakeTelegramClient(latency=args.latency, jitter=args.jitter)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep the real session dir untouched
+        listing_cache.CACHE_PATH = os.path.join(workdir, "listing_cache.json")
+        reencryption.CHECKPOINT_PATH = os.path.join(workdir, "reencrypt_checkpoint.json")
+        chunk_gc.STATE_PATH = os.path.join(workdir, "chunk_gc_state.json")
+        ops = [op for op in args.ops.split(",") if op]
+        results = asyncio.run(run_case(int(count), fmt, ops, client))
+
+    print(json.dumps({"case": args.case, "peak_rss_mb": peak_rss_mb(), "ops": results}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TG-Drive catalog-scale benchmarks (simulated Telegram)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated file counts, e.g. 10k,100k")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="v1 (plaintext) and/or v2 (encrypted)")
+    parser.add_argument("--ops", default=",".join(OPS))
+    parser.add_argument("--latency", type=float, default=0.05, help="Per-request latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Max extra random latency in seconds")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed regression vs baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--case", help=argparse.SUPPRESS)  # internal: run one case in this process
+    args = parser.parse_args()
+
+    if args.case:
+        child(args)
+        return 0
+
+    results = {}
+    for fmt in args.formats.split(","):
+        for size_text in args.sizes.split(","):
+            case = f"{parse_count(size_text)}:{fmt}"
+            proc = subprocess.run(
+                [sys.executable, __file__, "--case", case, "--ops", args.ops,
+                 "--latency", str(args.latency), "--jitter", str(args.jitter)],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"ERROR: {case} failed:\n{proc.stderr[-2000:]}")
+                return 2
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results[case] = result
+            print(f"{fmt} {size_text} files (peak RSS {result['peak_rss_mb']} MB)")
+            for op, r in result["ops"].items():
+                print(f"  {op:16s} {r['seconds']:9.3f}s  rtt {r['round_trips']:6d}  "
+                      f"decrypts {r['decrypts']:6d} ({r['decrypt_cpu_seconds']:.2f}s cpu)  "
+                      f"peak {r['peak_traced_mb']} MB  {r['result']}")
+
+    if args.update_baseline:
+        os.makedirs(BASELINE_PATH.parent, exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("No baseline yet. Run with --update-baseline to record one.")
+        return 0
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    failed = False
+    for case, result in results.items():
+        for op, r in result["ops"].items():
+            base = baseline.get(case, {}).get("ops", {}).get(op)
+            if not base:
+                continue
+            if r["seconds"] > base["seconds"] * (1 + args.tolerance):
+                failed = True
+                print(f"ERROR: {case} {op} took {r['seconds']}s > baseline {base['seconds']}s")
+            if r["round_trips"] > base["round_trips"]:
+                failed = True
+                print(f"ERROR: {case} {op} issued {r['round_trips']} round trips > baseline {base['round_trips']}")
+    if not failed:
+        print(f"✓ All operations within {args.tolerance:.0%} of baseline")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
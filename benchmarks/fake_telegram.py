@@ -0,0 +1,458 @@
+"""
+In-process fake of the parts of TelegramClient that TG-Drive uses.
+
+Implements SaveFilePartRequest / SaveBigFilePartRequest, UploadMediaRequest
+and SendMultiMediaRequest (via __call__), send_file, send_message, get_messages, iter_messages, iter_download and
+delete_messages against an in-memory Saved Messages store, with a simulated
+network:
+- latency + jitter per request
+- one shared link of limited bandwidth (bytes queue behind each other,
+  latencies overlap)
+- a per-chat send limit: message-creating requests are spaced send_interval
+  apart, however many are in flight
+- FloodWaitError injection; waits under flood_sleep_threshold are slept
+  through like telethon does, longer ones are raised
+- dropped connections during downloads (requests fail until connect())
+  and file references that expire on demand (expire_file_references())
+
+Document content is never required to live in memory: uploads can be kept
+as size-only records and benchmark inputs can be synthetic blobs whose bytes
+are generated from the offset.
+
+populate_catalog() fills the store with METADATA_V1 / METADATA_V2_ENCRYPTED
+records (and their chunk messages) for catalog-scale benchmarks.
+"""
+import asyncio
+import copy
+import datetime
+import hashlib
+import logging
+import random
+import time
+from collections import Counter
+
+
+SEND_METHODS = ("sendMedia", "sendMultiMedia", "sendMessage")
+
+
+class TotalList(list):
+    """list with a .total attribute, like telethon.helpers.TotalList."""
+    total = 0
+
+
+class SyntheticBlob:
+    """Deterministic pseudo-random content generated on demand (nothing stored)."""
+
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self._block = random.Random(seed).randbytes(self.BLOCK_SIZE)
+
+    def read(self, offset, length):
+        length = max(0, min(length, self.size - offset))
+        out = bytearray()
+        while len(out) < length:
+            start = (offset + len(out)) % self.BLOCK_SIZE
+            out += self._block[start:start + length - len(out)]
+        return bytes(out)
+
+    def sha256(self):
+        h = hashlib.sha256()
+        for offset in range(0, self.size, self.BLOCK_SIZE):
+            h.update(self.read(offset, self.BLOCK_SIZE))
+        return h.hexdigest()
+
+
+class UploadedBlob:
+    """Content assembled from uploaded parts (or just its size if not kept)."""
+
+    def __init__(self, parts, size):
+        self.parts = parts  # list of bytes, or None when content was discarded
+        self.size = size
+
+    def read(self, offset, length):
+        if self.parts is None:
+            raise RuntimeError("Content of this upload was not kept (keep_uploads=False)")
+        data = b"".join(self.parts)
+        return data[offset:offset + length]
+
+
+class FakeFile:
+    def __init__(self, blob, name):
+        self.size = blob.size
+        self.name = name
+
+
+class FakeMedia:
+    def __init__(self, blob, file_reference=0):
+        self.blob = blob
+        self.file_reference = file_reference  # epoch it was fetched in
+
+
+class FakeMessage:
+    def __init__(self, client, msg_id, text=None, blob=None, name=None):
+        self.client = client
+        self.id = msg_id
+        self.text = text
+        self.message = text
+        self.date = datetime.datetime.now(datetime.timezone.utc)
+        self.media = FakeMedia(blob) if blob else None
+        self.file = FakeFile(blob, name) if blob else None
+
+    async def edit(self, text):
+        await self.client._rpc("editMessage", len(text or ""))
+        self.text = self.message = text
+        return self
+
+
+class FakeTelegramClient:
+    def __init__(
+        self,
+        latency=0.05,
+        jitter=0.0,
+        bandwidth=None,
+        flood_wait_rate=0.0,
+        flood_wait_seconds=1,
+        flood_sleep_threshold=60,
+        drop_rate=0.0,
+        send_interval=0.0,
+        keep_uploads=True,
+        seed=0
+    ):
+        """
+        Args:
+            latency: Seconds of round-trip latency per request
+            jitter: Max extra random latency per request (seconds)
+            bandwidth: Shared link speed in bytes/second (None = unlimited)
+            flood_wait_rate: Probability that a request hits a FloodWait
+            flood_wait_seconds: Duration of injected flood waits
+            flood_sleep_threshold: Waits up to this are slept through, longer ones raise
+            drop_rate: Probability that a getFile drops the connection
+            send_interval: Min seconds between sent messages (sendMedia, sendMultiMedia, sendMessage)
+            keep_uploads: Keep uploaded bytes (needed to download them again)
+            seed: RNG seed for jitter and flood injection
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.drop_rate = drop_rate
+        self.send_interval = send_interval
+        self.keep_uploads = keep_uploads
+        self.rng = random.Random(seed)
+
+        self.messages = {}  # id -> FakeMessage
+        self.next_id = 1
+        self.uploads = {}  # file_id -> {part_index: bytes or size}
+        self.documents = {}  # document id -> (blob, name), from uploadMedia
+        self.upload_totals = {}  # file_id -> file_total_parts values seen (big files)
+        self.stats = Counter()
+        self.connected = True
+        self.file_reference_epoch = 0  # media fetched in an older epoch is expired
+        self._link_free_at = 0.0
+        self._send_free_at = 0.0
+        self.session = type("Session", (), {"dc_id": 2})()
+
+    # --- Simulated network ---
+
+    async def _rpc(self, method, payload_bytes=0):
+        if not self.connected:
+            raise ConnectionError("Cannot send requests while disconnected")
+        self.stats[f"rpc.{method}"] += 1
+        self.stats["rpc.total"] += 1
+        self.stats["bytes.transferred"] += payload_bytes
+
+        while self.flood_wait_rate and self.rng.random() < self.flood_wait_rate:
+            self.stats["flood_waits"] += 1
+            if self.flood_wait_seconds > self.flood_sleep_threshold:
+                from telethon.errors import FloodWaitError
+                raise FloodWaitError(request=None, capture=self.flood_wait_seconds)
+            self.stats["flood_wait_seconds"] += self.flood_wait_seconds
+            # Logged exactly like telethon, so the metrics flood-wait hook sees it
+            request = method if method.endswith("Request") else f"{method[0].upper()}{method[1:]}Request"
+            logging.getLogger("telethon.client.users").info(
+                "Sleeping%s for %ds (%s) on %s flood wait", "", self.flood_wait_seconds,
+                datetime.timedelta(seconds=self.flood_wait_seconds), request
+            )
+            await asyncio.sleep(self.flood_wait_seconds)
+
+        now = time.monotonic()
+        done_at = now
+        if self.bandwidth and payload_bytes:
+            # Bytes share one link: queue behind earlier transfers
+            start = max(now, self._link_free_at)
+            self._link_free_at = start + payload_bytes / self.bandwidth
+            done_at = self._link_free_at
+        if self.send_interval and method in SEND_METHODS:
+            # Messages into one chat are rate limited: queue behind earlier sends
+            start = max(now, self._send_free_at)
+            self._send_free_at = start + self.send_interval
+            done_at = max(done_at, start)
+        delay = (done_at - now) + self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # --- Connection ---
+
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self):
+        if not self.connected:
+            self.stats["reconnects"] += 1
+        self.connected = True
+        return True
+
+    async def disconnect(self):
+        return True
+
+    async def is_user_authorized(self):
+        return True
+
+    async def get_me(self):
+        return type("User", (), {"id": 1, "first_name": "Bench", "last_name": None, "username": None, "phone": None})()
+
+    # --- Uploads ---
+
+    async def __call__(self, request):
+        name = type(request).__name__
+        if name in ("SaveFilePartRequest", "SaveBigFilePartRequest"):
+            await self._rpc(name, len(request.bytes))
+            parts = self.uploads.setdefault(request.file_id, {})
+            parts[request.file_part] = bytes(request.bytes) if self.keep_uploads else len(request.bytes)
+            if name == "SaveBigFilePartRequest":
+                # -1 while a streamed upload's size is unknown, the real count otherwise
+                self.upload_totals.setdefault(request.file_id, set()).add(request.file_total_parts)
+            return True
+        if name == "UploadMediaRequest":
+            await self._rpc("uploadMedia")
+            return self._upload_media(request.media)
+        if name == "SendMultiMediaRequest":
+            await self._rpc("sendMultiMedia")
+            return self._send_multi_media(request.multi_media)
+        raise NotImplementedError(f"FakeTelegramClient does not implement {name}")
+
+    def _upload_media(self, media):
+        from telethon.tl import types
+        blob = self._blob_from_input_file(media.file)
+        doc_id = len(self.documents) + 1
+        self.documents[doc_id] = (blob, media.file.name)
+        document = types.Document(
+            id=doc_id, access_hash=0, file_reference=b"", date=None,
+            mime_type=media.mime_type, size=blob.size, dc_id=self.session.dc_id, attributes=media.attributes
+        )
+        return types.MessageMediaDocument(document=document)
+
+    def _send_multi_media(self, multi_media):
+        from telethon.tl import types
+        updates = []
+        for single in multi_media:
+            blob, name = self.documents[single.media.id.id]
+            msg = self.add_message(text=single.message, blob=blob, name=name)
+            updates.append(types.UpdateMessageID(id=msg.id, random_id=single.random_id))
+        return types.Updates(updates=updates, users=[], chats=[], date=None, seq=0)
+
+    def _blob_from_input_file(self, input_file):
+        parts = self.uploads.pop(input_file.id, None)
+        if parts is None or len(parts) != input_file.parts:
+            raise ValueError(f"FILE_PARTS_INVALID: got {0 if parts is None else len(parts)} of {input_file.parts}")
+        totals = self.upload_totals.pop(input_file.id, set())
+        if totals - {-1, input_file.parts} or (-1 in totals and input_file.parts not in totals):
+            raise ValueError(f"FILE_PARTS_INVALID: file_total_parts {sorted(totals)} for {input_file.parts} parts")
+        ordered = [parts[i] for i in range(input_file.parts)]
+        if self.keep_uploads:
+            return UploadedBlob(ordered, sum(len(p) for p in ordered))
+        return UploadedBlob(None, sum(ordered))
+
+    def add_message(self, text=None, blob=None, name=None):
+        """Insert a message directly (no simulated network), e.g. to seed a catalog."""
+        msg = FakeMessage(self, self.next_id, text=text, blob=blob, name=name)
+        self.messages[msg.id] = msg
+        self.next_id += 1
+        return msg
+
+    async def send_file(self, entity, file, caption=None, force_document=False, **kwargs):
+        if isinstance(file, (list, tuple)):
+            await self._rpc("sendMultiMedia")
+            captions = caption if isinstance(caption, (list, tuple)) else [caption] * len(file)
+            return [
+                self.add_message(text=c, blob=self._blob_from_input_file(f), name=f.name)
+                for f, c in zip(file, captions)
+            ]
+        await self._rpc("sendMedia")
+        return self.add_message(text=caption, blob=self._blob_from_input_file(file), name=file.name)
+
+    async def send_message(self, entity, message, **kwargs):
+        await self._rpc("sendMessage", len(message))
+        return self.add_message(text=message)
+
+    # --- Reads ---
+
+    def _matching(self, search=None, offset_id=0, min_id=0):
+        """Messages newest first, filtered like a server-side search."""
+        for msg_id in sorted(self.messages, reverse=True):
+            if offset_id and msg_id >= offset_id:
+                continue
+            if msg_id <= min_id:
+                continue
+            msg = self.messages[msg_id]
+            if search and not (msg.text and search in msg.text):
+                continue
+            yield msg
+
+    async def get_messages(self, entity, limit=None, ids=None, search=None, offset_id=0, min_id=0, **kwargs):
+        if ids is not None:
+            await self._rpc("getMessages")
+            if isinstance(ids, (list, tuple)):
+                return [self._fetched(self.messages.get(i)) for i in ids]
+            return self._fetched(self.messages.get(ids))
+
+        matches = list(self._matching(search, offset_id, min_id))
+        result = TotalList(matches[:limit] if limit is not None else matches)
+        result.total = len(matches)
+        # One request per 100 messages, at least one (limit=0 still asks for the count)
+        for _ in range(max(1, -(-len(result) // 100))):
+            await self._rpc("search" if search else "getHistory")
+        return result
+
+    async def iter_messages(self, entity, limit=None, search=None, offset_id=0, min_id=0, **kwargs):
+        page = []
+        count = 0
+        for msg in self._matching(search, offset_id, min_id):
+            if limit is not None and count >= limit:
+                break
+            if not page:
+                await self._rpc("search" if search else "getHistory")
+            page.append(msg)
+            count += 1
+            if len(page) == 100:
+                for m in page:
+                    yield m
+                page = []
+        for m in page:
+            yield m
+
+    def expire_file_references(self):
+        """Expire the file reference of every media fetched so far."""
+        self.file_reference_epoch += 1
+
+    def _fetched(self, msg):
+        """A message as get_messages returns it: media carries a current file reference."""
+        if msg is None or msg.media is None or msg.media.file_reference == self.file_reference_epoch:
+            return msg
+        fresh = copy.copy(msg)
+        fresh.media = FakeMedia(msg.media.blob, self.file_reference_epoch)
+        return fresh
+
+    async def iter_download(self, media, offset=0, request_size=128 * 1024, **kwargs):
+        from telethon.errors import FileReferenceExpiredError
+        blob = media.blob
+        while offset < blob.size:
+            if media.file_reference != self.file_reference_epoch:
+                await self._rpc("getFile")  # the server answers with the error
+                raise FileReferenceExpiredError(request=None)
+            if self.drop_rate and self.rng.random() < self.drop_rate:
+                self.connected = False
+                self.stats["connection_drops"] += 1
+                raise ConnectionError("Connection reset by peer")
+            data = blob.read(offset, request_size)
+            await self._rpc("getFile", len(data))
+            offset += len(data)
+            yield data
+
+    # --- Writes ---
+
+    async def delete_messages(self, entity, message_ids, **kwargs):
+        if not isinstance(message_ids, (list, tuple)):
+            message_ids = [message_ids]
+        await self._rpc("deleteMessages")
+        for msg_id in message_ids:
+            self.messages.pop(msg_id, None)
+
+    async def edit_message(self, entity, message_id, text, **kwargs):
+        return await self.messages[message_id].edit(text)
+
+
+def populate_catalog(client, count, passcode=None, chunks_per_file=1, chunk_size=4 * 1024 * 1024, salt_pool=512):
+    """
+    Fill the fake Saved Messages with a synthetic file catalog.
+
+    Args:
+        client: FakeTelegramClient to fill (no simulated network is used)
+        count: Number of files
+        passcode: Encrypt metadata as METADATA_V2_ENCRYPTED with this passcode (None = V1)
+        chunks_per_file: Chunk messages per file
+        chunk_size: Declared size of every chunk
+        salt_pool: Distinct salts used for V2 records. Real records each have
+            their own salt; deriving one key per record would make generating
+            100k records take an hour, so records cycle through a pool. Keep it
+            above the decrypt key cache size (256) so reads still pay one
+            PBKDF2 run per record.
+
+    Returns:
+        List of {"id", "name", "metadata_message_id"} rows, oldest first
+    """
+    import os
+    from backend.core.metadata_manager import FileChunk, FileMetadata
+    from backend.core.crypto_utils import derive_key, encrypt_data_with_key
+
+    keys = []
+    if passcode:
+        for _ in range(salt_pool):
+            salt = os.urandom(16)
+            keys.append((derive_key(passcode, salt), salt))
+
+    # Chunk content is never read by catalog operations; share one blob
+    chunk_blob = SyntheticBlob(chunk_size)
+    tag = "#ENCRYPTED_CHUNK" if passcode else "#TG_DRIVE_CHUNK"
+
+    rows = []
+    for i in range(count):
+        file_id = f"{i:08x}-0000-4000-8000-{i:012x}"
+        chunks = []
+        for index in range(chunks_per_file):
+            msg = client.add_message(text=tag, blob=chunk_blob, name=f"{file_id}_part{index}")
+            chunks.append(FileChunk(index=index, message_id=msg.id, size=chunk_size, hash="0" * 64))
+        metadata = FileMetadata(
+            id=file_id,
+            name=f"file_{i:06d}.bin",
+            size=chunk_size * chunks_per_file,
+            chunks=chunks,
+            hash="0" * 64,
+            mime_type="application/octet-stream"
+        )
+        json_str = metadata.model_dump_json()
+        if passcode:
+            key, salt = keys[i % len(keys)]
+            text = f"METADATA_V2_ENCRYPTED\n{encrypt_data_with_key(json_str, key, salt)}"
+        else:
+            text = f"METADATA_V1\n{json_str}"
+        msg = client.add_message(text=text)
+        rows.append({"id": file_id, "name": metadata.name, "metadata_message_id": msg.id})
+    return rows
+
+
+class FakeBridge:
+    """
+    Minimal stand-in for backend.bridge.Bridge so FileHandler can run
+    against a FakeTelegramClient without a window.
+    """
+
+    def __init__(self, loop=None, passcode=None):
+        from backend.core.progress import ProgressAggregator
+        self.loop = loop
+        self._window = None
+        self._session_passcode = passcode
+        self._failed_passcode_attempts = 0
+        self._passcode_lockout_until = None
+        self.events = []
+        self.progress = ProgressAggregator(lambda batch: None)
+
+    async def _ensure_client(self):
+        return None
+
+    def _emit(self, event, *args):
+        self.events.append((event, args))
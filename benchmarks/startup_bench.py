@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for TG-Drive.
+
+Measures what happens before the window can be created:
+1. `python -X importtime` over the startup import path, reporting the
+   slowest modules and failing if heavy modules are imported eagerly
+2. Wall-clock cold start (fresh interpreter: imports + Bridge()),
+   median of several runs, compared against a stored baseline
+
+Usage:
+    python benchmarks/startup_bench.py                    # check against baseline
+    python benchmarks/startup_bench.py --update-baseline  # record new baseline
+    python benchmarks/startup_bench.py --runs 10 --tolerance 0.25
+
+Exit code is 1 when cold start regresses beyond the tolerance, a heavy
+module is imported before the window exists, or there is no baseline to
+check against (record one per machine with --update-baseline; timings
+from another machine would not compare).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "startup.json"
+
+# Everything app.py does before webview.create_window()
+STARTUP_SNIPPET = "import app; from backend.bridge import Bridge; Bridge()"
+
+# Must stay off the startup path; they load on first connect / first use
+HEAVY_MODULES = ("telethon", "pydantic", "cryptography")
+
+
+def run_importtime():
+    """Run the startup path under -X importtime and parse the report."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SNIPPET],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"ERROR: startup snippet failed:\n{result.stderr[-2000:]}")
+        sys.exit(2)
+
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = [p.strip() for p in line.replace("import time:", "|", 1).split("|")]
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return modules
+
+
+def measure_cold_start(runs):
+    """Wall-clock time of a fresh interpreter running the startup path."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", STARTUP_SNIPPET], cwd=ROOT, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def load_baseline():
+    if not BASELINE_PATH.exists():
+        return None
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def save_baseline(data):
+    os.makedirs(BASELINE_PATH.parent, exist_ok=True)
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(data, f, indent=2)
+    print(f"Baseline written to {BASELINE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TG-Drive startup benchmark")
+    parser.add_argument("--runs", type=int, default=7, help="Cold-start runs (median is used)")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed regression vs baseline (0.20 = 20%%)")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to print")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    failed = False
+
+    print("\n=== Import time (-X importtime) ===")
+    modules = run_importtime()
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {self_us / 1000:8.1f} ms self  {name}")
+
+    eager = sorted({m[0] for m in modules if m[0].split(".")[0] in HEAVY_MODULES})
+    if eager:
+        failed = True
+        print(f"ERROR: heavy modules imported before the window is created: {', '.join(eager[:10])}")
+    else:
+        print(f"✓ None of {', '.join(HEAVY_MODULES)} imported at startup")
+
+    print(f"\n=== Cold start ({args.runs} runs) ===")
+    timings = measure_cold_start(args.runs)
+    median = statistics.median(timings)
+    print(f"median {median * 1000:.1f} ms  (min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms)")
+
+    result = {
+        "cold_start_median_s": round(median, 4),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+    }
+
+    if args.update_baseline:
+        save_baseline(result)
+        return 1 if failed else 0
+
+    baseline = load_baseline()
+    if baseline is None:
+        # A check without a baseline would pass any regression
+        failed = True
+        print(f"ERROR: no baseline at {BASELINE_PATH}. Run with --update-baseline to record one.")
+    else:
+        limit = baseline["cold_start_median_s"] * (1 + args.tolerance)
+        if median > limit:
+            failed = True
+            print(f"ERROR: cold start regressed: {median * 1000:.1f} ms > {limit * 1000:.1f} ms "
+                  f"(baseline {baseline['cold_start_median_s'] * 1000:.1f} ms + {args.tolerance:.0%})")
+        else:
+            print(f"✓ Within {args.tolerance:.0%} of baseline ({baseline['cold_start_median_s'] * 1000:.1f} ms)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Transfer benchmark suite backed by the simulated Telegram client.
+
+Scenarios:
+- uploader      ParallelUploader.upload_file + send_file
+- downloader    ParallelDownloader.download_file of a synthetic document
+- upload_logic  FileHandler._upload_logic end to end (hashing, chunking, metadata)
+- commit_single, commit_album, commit_auto
+                AlbumCommitter sending already uploaded 64K chunks one
+                message each, as albums, or as it measures best; not run
+                by default, compare them with and without --send-interval
+
+Each (scenario, size) case runs in a fresh interpreter so peak RSS is per
+case. Reported: throughput, peak RSS, bytes written/read through syscalls,
+and RPC counts. Results are compared against benchmarks/baselines/transfer.json.
+
+Usage:
+    python benchmarks/transfer_bench.py
+    python benchmarks/transfer_bench.py --sizes 1M,10M,100M --latency 0.08 --bandwidth 20M
+    python benchmarks/transfer_bench.py --flood-rate 0.01 --scenarios uploader
+    python benchmarks/transfer_bench.py --drop-rate 0.02 --scenarios downloader
+    python benchmarks/transfer_bench.py --scenarios commit_single,commit_album,commit_auto --sizes 1M --send-interval 0.3
+    python benchmarks/transfer_bench.py --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "transfer.json"
+SCENARIOS = ("uploader", "downloader", "upload_logic")
+COMMIT_MODES = {"commit_single": False, "commit_album": True, "commit_auto": None}
+COMMIT_CHUNK_SIZE = 64 * 1024
+DEFAULT_SIZES = "1M,10M,100M"
+
+
+def parse_size(text):
+    """'10M' -> 10485760"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def read_proc_io():
+    """Bytes passed to read()/write() syscalls so far (Linux only)."""
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def write_input_file(path, size):
+    from fake_telegram import SyntheticBlob
+    blob = SyntheticBlob(size, seed=1)
+    with open(path, "wb") as f:
+        for offset in range(0, size, blob.BLOCK_SIZE):
+            f.write(blob.read(offset, blob.BLOCK_SIZE))
+
+
+async def run_scenario(scenario, size, client, workdir):
+    """Run one transfer; returns the timed section's extra info."""
+    from fake_telegram import SyntheticBlob
+
+    if scenario == "uploader":
+        from backend.core.parallel_uploader import ParallelUploader
+        path = os.path.join(workdir, "input.bin")
+        write_input_file(path, size)
+        start_io = read_proc_io()
+        start = time.perf_counter()
+        input_file = await ParallelUploader(client).upload_file(path)
+        await client.send_file("me", input_file, caption="#TG_DRIVE_CHUNK", force_document=True)
+        return time.perf_counter() - start, start_io
+
+    if scenario == "downloader":
+        from backend.core.parallel_downloader import ParallelDownloader
+        msg = client.add_message(text="#TG_DRIVE_CHUNK", blob=SyntheticBlob(size, seed=1), name="input.bin")
+        start_io = read_proc_io()
+        start = time.perf_counter()
+        await ParallelDownloader(client, workers=4).download_file(msg, os.path.join(workdir, "output.bin"))
+        return time.perf_counter() - start, start_io
+
+    if scenario == "upload_logic":
+        from fake_telegram import FakeBridge
+        from backend.core import tg_client
+        from backend.api.files import FileHandler
+        # Load lazily imported modules now so imports are not timed
+        import backend.core.metadata_manager, backend.core.file_manager, backend.core.parallel_uploader  # noqa: F401
+        path = os.path.join(workdir, "input.bin")
+        write_input_file(path, size)
+        tg_client.client = client
+        bridge = FakeBridge(loop=asyncio.get_running_loop())
+        start_io = read_proc_io()
+        start = time.perf_counter()
+        await FileHandler(bridge)._upload_logic(path)
+        elapsed = time.perf_counter() - start
+        errors = [args for event, args in bridge.events if event == "onUploadError"]
+        if errors:
+            raise RuntimeError(f"upload failed: {errors[0]}")
+        return elapsed, start_io
+
+    if scenario in COMMIT_MODES:
+        from telethon.tl import types
+        from backend.core.album_committer import AlbumCommitter, MAX_ALBUM_SIZE
+        files = []
+        for i in range(max(1, size // COMMIT_CHUNK_SIZE)):
+            client.uploads[i] = {0: COMMIT_CHUNK_SIZE}  # parts already uploaded
+            files.append(types.InputFile(id=i, parts=1, name=f"chunk{i}", md5_checksum=""))
+        committer = AlbumCommitter(client, albums=COMMIT_MODES[scenario])
+
+        async def commit(input_file):
+            try:
+                return await committer.commit(input_file, "#TG_DRIVE_CHUNK")
+            finally:
+                committer.release()
+
+        start_io = read_proc_io()
+        start = time.perf_counter()
+        # Chunks finish uploading in waves, as many as an album holds at a time
+        for offset in range(0, len(files), MAX_ALBUM_SIZE):
+            wave = files[offset:offset + MAX_ALBUM_SIZE]
+            for _ in wave:
+                committer.reserve()
+            await asyncio.gather(*(commit(f) for f in wave))
+        return time.perf_counter() - start, start_io
+
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_case(args):
+    """Child process: run a single case and print its JSON result."""
+    from fake_telegram import FakeTelegramClient
+
+    scenario, size = args.case.split(":")
+    size = int(size)
+    client = FakeTelegramClient(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=parse_size(args.bandwidth) if args.bandwidth else None,
+        flood_wait_rate=args.flood_rate,
+        flood_wait_seconds=args.flood_seconds,
+        drop_rate=args.drop_rate,
+        send_interval=args.send_interval,
+        keep_uploads=False
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # _upload_logic writes temp_uploads/ relative to cwd
+        elapsed, (read_before, written_before) = asyncio.run(run_scenario(scenario, size, client, workdir))
+        read_after, written_after = read_proc_io()
+
+    result = {
+        "case": args.case,
+        "seconds": round(elapsed, 4),
+        "throughput_mb_s": round(size / elapsed / (1024 * 1024), 2),
+        "peak_rss_mb": round(peak_rss_bytes() / (1024 * 1024), 1) if peak_rss_bytes() else None,
+        "bytes_written": written_after - written_before if written_before is not None else None,
+        "bytes_read": read_after - read_before if read_before is not None else None,
+        "rpc": {k: v for k, v in client.stats.items()},
+    }
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TG-Drive transfer benchmarks (simulated Telegram)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated sizes, e.g. 1M,10M,100M")
+    parser.add_argument("--latency", type=float, default=0.05, help="Per-request latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Max extra random latency in seconds")
+    parser.add_argument("--bandwidth", default="50M", help="Shared link bandwidth per second (empty = unlimited)")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability of a FloodWait per request")
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability a download request drops the connection")
+    parser.add_argument("--send-interval", type=float, default=0.0, help="Min seconds between sent messages")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed regression vs baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--case", help=argparse.SUPPRESS)  # internal: run one case in this process
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args)
+        return 0
+
+    network_args = [
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--bandwidth", args.bandwidth, "--flood-rate", str(args.flood_rate),
+        "--flood-seconds", str(args.flood_seconds), "--drop-rate", str(args.drop_rate),
+        "--send-interval", str(args.send_interval),
+    ]
+    results = {}
+    for scenario in args.scenarios.split(","):
+        for size_text in args.sizes.split(","):
+            case = f"{scenario}:{parse_size(size_text)}"
+            proc = subprocess.run(
+                [sys.executable, __file__, "--case", case] + network_args,
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"ERROR: {case} failed:\n{proc.stderr[-2000:]}")
+                return 2
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results[case] = result
+            print(f"{scenario:13s} {size_text:>6s}  {result['throughput_mb_s']:8.2f} MB/s  "
+                  f"rss {result['peak_rss_mb']} MB  written {result['bytes_written']}  "
+                  f"read {result['bytes_read']}  rpcs {result['rpc'].get('rpc.total', 0)}")
+
+    if args.update_baseline:
+        os.makedirs(BASELINE_PATH.parent, exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("No baseline yet. Run with --update-baseline to record one.")
+        return 0
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    failed = False
+    for case, result in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        if result["throughput_mb_s"] < base["throughput_mb_s"] * (1 - args.tolerance):
+            failed = True
+            print(f"ERROR: {case} throughput {result['throughput_mb_s']} MB/s < baseline {base['throughput_mb_s']} MB/s")
+        if result["peak_rss_mb"] and base.get("peak_rss_mb") and result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + args.tolerance):
+            failed = True
+            print(f"ERROR: {case} peak RSS {result['peak_rss_mb']} MB > baseline {base['peak_rss_mb']} MB")
+    if not failed:
+        print(f"✓ All cases within {args.tolerance:.0%} of baseline")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the uploader's part read path.
+
+Reads a file in upload-sized parts and builds the saveFilePart request body
+for each part, the way ParallelUploader does, with three read strategies:
+
+- open_per_part   open + seek + read per part (the uploader before PartReader)
+- shared_fd       PartReader: one descriptor, one os.pread per part
+- bytearray_pool  readinto a preallocated, reused buffer, then bytes() for the
+                  request (telethon only serializes bytes, so a pool adds a copy)
+
+Reported per GB read: wall time (best of --repeat), opens, read syscalls
+(/proc/self/io, Linux; each open also costs fstat/ioctl/lseek/close syscalls
+that this does not count) and bytes allocated (sum of per-part tracemalloc
+peaks, measured in a separate pass so tracing does not skew the timings).
+
+Usage:
+    python benchmarks/uploader_io_bench.py
+    python benchmarks/uploader_io_bench.py --size 1G --part-size 512K --no-serialize
+    python benchmarks/uploader_io_bench.py --json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from transfer_bench import parse_size  # noqa: E402
+
+STRATEGIES = ("open_per_part", "shared_fd", "bytearray_pool")
+GB = 1024 ** 3
+
+opens = 0
+
+
+def count_opens(event, args):
+    global opens
+    if event == "open":
+        opens += 1
+
+
+def read_syscalls():
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["syscr"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def make_reader(strategy, path, part_size):
+    """Returns (read(offset, size) -> bytes, close())."""
+    if strategy == "open_per_part":
+        def read(offset, size):
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+        return read, lambda: None
+
+    if strategy == "shared_fd":
+        from backend.core.parallel_uploader import PartReader
+        reader = PartReader(path)
+        return reader.read, reader.close
+
+    if strategy == "bytearray_pool":
+        f = open(path, "rb", buffering=0)
+        pool = [bytearray(part_size) for _ in range(4)]
+        state = {"next": 0}
+
+        def read(offset, size):
+            buf = pool[state["next"] % len(pool)]
+            state["next"] += 1
+            view = memoryview(buf)[:size]
+            f.seek(offset)
+            n = f.readinto(view)
+            return bytes(view[:n])
+        return read, f.close
+
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+
+def run_pass(strategy, path, file_size, part_size, serialize, trace_memory):
+    from telethon.tl.functions.upload import SaveFilePartRequest
+
+    read, close = make_reader(strategy, path, part_size)
+    allocated = 0
+    syscr_before = read_syscalls()
+    opens_before = opens  # after reading /proc/self/io, which is an open too
+    start = time.perf_counter()
+    try:
+        for index, offset in enumerate(range(0, file_size, part_size)):
+            if trace_memory:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            data = read(offset, min(part_size, file_size - offset))
+            if serialize:
+                SaveFilePartRequest(file_id=1, file_part=index, bytes=data)._bytes()
+            if trace_memory:
+                allocated += tracemalloc.get_traced_memory()[1] - base
+            del data
+    finally:
+        close()
+    elapsed = time.perf_counter() - start
+    opened = opens - opens_before
+    syscr_after = read_syscalls()
+    return {
+        "elapsed": elapsed,
+        "opens": opened,
+        "read_syscalls": None if syscr_before is None else syscr_after - syscr_before,
+        "allocated": allocated,
+    }
+
+
+def run(args):
+    file_size = parse_size(args.size)
+    part_size = parse_size(args.part_size)
+    per_gb = GB / file_size
+    sys.addaudithook(count_opens)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "input.bin")
+        with open(path, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(0, file_size, len(block)):
+                f.write(block)
+            f.truncate(file_size)
+
+        for strategy in args.strategies.split(","):
+            run_pass(strategy, path, file_size, part_size, args.serialize, False)  # warm page cache
+            timed = min(
+                (run_pass(strategy, path, file_size, part_size, args.serialize, False) for _ in range(args.repeat)),
+                key=lambda r: r["elapsed"]
+            )
+            tracemalloc.start()
+            try:
+                traced = run_pass(strategy, path, file_size, part_size, args.serialize, True)
+            finally:
+                tracemalloc.stop()
+            results.append({
+                "strategy": strategy,
+                "seconds_per_gb": timed["elapsed"] * per_gb,
+                "mb_per_s": file_size / timed["elapsed"] / 1024 ** 2,
+                "opens_per_gb": timed["opens"] * per_gb,
+                "read_syscalls_per_gb": None if timed["read_syscalls"] is None else timed["read_syscalls"] * per_gb,
+                "allocated_mb_per_gb": traced["allocated"] * per_gb / 1024 ** 2,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="256M", help="File size (results are scaled per GB)")
+    parser.add_argument("--part-size", default="512K", help="Upload part size")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per strategy (best is kept)")
+    parser.add_argument("--no-serialize", dest="serialize", action="store_false",
+                        help="Only read; skip building the request body")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'strategy':<16}{'s/GB':>8}{'MB/s':>9}{'opens/GB':>10}{'reads/GB':>10}{'alloc MB/GB':>13}")
+    for r in results:
+        reads = "n/a" if r["read_syscalls_per_gb"] is None else f"{r['read_syscalls_per_gb']:.0f}"
+        print(f"{r['strategy']:<16}{r['seconds_per_gb']:>8.3f}{r['mb_per_s']:>9.0f}"
+              f"{r['opens_per_gb']:>10.0f}{reads:>10}{r['allocated_mb_per_gb']:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
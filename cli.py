@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""Headless TG-Drive: python cli.py --help"""
+import sys
+
+from backend.cli.main import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,56 @@ const call = async (method, ...args) => {
     }
 };
 
+// Jobs - non-blocking bridge calls. The backend returns a job id right away
+// and pushes the outcome through window.onJobResult / window.onJobError.
+const pendingJobs = new Map();   // jobId -> { resolve, reject, onProgress }
+const settledEarly = new Map();  // jobId -> { result } | { error } pushed before start_job returned
+const cancelledJobs = new Set(); // jobIds cancelled here whose backend outcome is still to come
+
+const settleJob = (jobId, outcome) => {
+    const pending = pendingJobs.get(jobId);
+    if (!pending) {
+        // Already rejected by cancelJob: nobody is waiting for this outcome
+        if (cancelledJobs.delete(jobId)) return;
+        settledEarly.set(jobId, outcome);
+        return;
+    }
+    pendingJobs.delete(jobId);
+    if ('error' in outcome) pending.reject(new Error(outcome.error));
+    else pending.resolve(outcome.result);
+};
+
+if (typeof window !== 'undefined') {
+    window.onJobResult = (jobId, result) => settleJob(jobId, { result });
+    window.onJobError = (jobId, error) => settleJob(jobId, { error });
+    window.onJobProgress = (jobId, data) => {
+        const pending = pendingJobs.get(jobId);
+        if (pending && pending.onProgress) pending.onProgress(data);
+    };
+}
+
+const job = async (method, args = [], { timeout = null, onProgress = null } = {}) => {
+    const res = await call('start_job', method, args, timeout);
+    if (res.error) throw new Error(res.error);
+    return new Promise((resolve, reject) => {
+        pendingJobs.set(res.job_id, { resolve, reject, onProgress });
+        if (settledEarly.has(res.job_id)) {
+            const outcome = settledEarly.get(res.job_id);
+            settledEarly.delete(res.job_id);
+            settleJob(res.job_id, outcome);
+        }
+    });
+};
+
+export const cancelJob = async (jobId) => {
+    const res = await call('cancel_job', jobId);
+    settleJob(jobId, { error: 'Cancelled' });
+    // A job the backend still knew about will push its final outcome later
+    if (!settledEarly.delete(jobId) && res && res.success) cancelledJobs.add(jobId);
+    return res;
+};
+export const listJobs = () => call('list_jobs');
+
 // Auth
 export const checkAuth = () => call('check_auth');
 export const requestOtp = (phone) => call('request_code', phone);
@@ -31,7 +81,9 @@ export const checkQRStatus = (tokenId) => call('check_qr_status', tokenId);
 // cancelQR not strictly needed if we just stop polling, or implement in bridge
 
 // Files
-export const listFiles = () => call('list_files');
+export const listFiles = () => job('list_files');
+// Last known listing (instant); a revalidation patch follows via window.onFilesPatch
+export const getCachedFiles = () => call('get_cached_files');
 
 // Upload - Triggers native picker
 export const uploadFile = () => call('pick_and_upload_file');
@@ -39,15 +91,29 @@ export const uploadFile = () => call('pick_and_upload_file');
 // Download - Triggers native save dialog
 export const downloadFile = (fileId) => call('download_file', fileId);
 
-export const renameFile = (fileId, newName, metadataMessageId) => call('rename_file', fileId, newName, metadataMessageId);
-export const deleteFile = (fileId, metadataMessageId) => call('delete_file', fileId, metadataMessageId);
+export const renameFile = (fileId, newName, metadataMessageId) => job('rename_file', [fileId, newName, metadataMessageId]);
+export const deleteFile = (fileId, metadataMessageId) => job('delete_file', [fileId, metadataMessageId]);
+// Orphaned chunk cleanup; dryRun only reports what would be deleted
+export const collectGarbage = (dryRun = true, incremental = true, graceHours = 24) => job('collect_garbage', [dryRun, incremental, graceHours]);
+// Bulk delete: files = [{ id, metadata_message_id }], returns { results, patch }
+export const deleteFiles = (files) => job('delete_files', [files.map(f => ({ id: f.id, metadata_message_id: f.metadata_message_id }))]);
+
+// Transfer metrics: latency histograms, bytes/s per data center, queue depths, loop lag
+export const getMetrics = () => call('get_metrics');
+// Adaptive concurrency: { upload_part: {limit, active, throughput, last_change, ...}, download_part: {...} }
+export const getConcurrency = () => call('get_concurrency');
+// Per-transfer Chrome trace files; profiler: null | 'cprofile' | 'sampling', left as is when omitted
+export const setTransferTracing = (enabled, profiler) =>
+    profiler === undefined ? call('set_transfer_tracing', enabled) : call('set_transfer_tracing', enabled, profiler);
 
 // Passcode Management
-export const hasPasscode = () => call('has_passcode');
+export const hasPasscode = () => job('has_passcode');
 export const setPasscode = (passcode) => call('set_passcode', passcode);
-export const verifyPasscode = (passcode) => call('verify_passcode', passcode);
-export const changePasscode = (oldPasscode, newPasscode) => call('change_passcode', oldPasscode, newPasscode);
-export const resetEncryption = () => call('reset_encryption');
+export const verifyPasscode = (passcode) => job('verify_passcode', [passcode]);
+export const changePasscode = (oldPasscode, newPasscode, onProgress) => job('change_passcode', [oldPasscode, newPasscode], { onProgress });
+// Finish an interrupted change; the old passcode is never stored, so it is asked for again
+export const resumeReencryption = (oldPasscode, onProgress) => job('resume_reencryption', [oldPasscode], { onProgress });
+export const resetEncryption = (onProgress) => job('reset_encryption', [], { onProgress });
 
 // Listeners for progress (exposed to window by Bridge)
 // window.onUploadProgress = (fileId, progress, status) => ...
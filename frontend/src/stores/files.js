@@ -1,5 +1,19 @@
 import { writable, derived } from 'svelte/store';
-import { listFiles, uploadFile, downloadFile, renameFile, deleteFile } from '../lib/api';
+import { listFiles, getCachedFiles, uploadFile, downloadFile, renameFile, deleteFile, deleteFiles } from '../lib/api';
+
+// Apply an incremental list patch ({ added, changed, removed }) in place
+export function applyFilesPatch(files, patch) {
+    if (!patch) return files;
+    const removed = new Set(patch.removed || []);
+    const changed = new Map((patch.changed || []).map(f => [f.id, f]));
+    const next = files
+        .filter(f => !removed.has(f.id))
+        .map(f => changed.get(f.id) || f);
+    const known = new Set(next.map(f => f.id));
+    // New rows go first, matching the newest-first order of list_files
+    const added = (patch.added || []).filter(f => !known.has(f.id));
+    return [...added, ...next];
+}
 
 function createFileStore() {
     const { subscribe, set, update } = writable({
@@ -12,6 +26,41 @@ function createFileStore() {
 
     // Setup global listeners for Bridge events
     if (typeof window !== 'undefined') {
+        // Batched progress for all active transfers, pushed once per frame
+        window.onTransferProgress = (batch) => {
+            update(s => {
+                const uploads = { ...s.uploads };
+                const downloads = { ...s.downloads };
+                for (const t of batch) {
+                    const isUpload = t.kind === 'upload';
+                    const target = isUpload ? uploads : downloads;
+                    const existing = target[t.id] || {
+                        id: t.id,
+                        file: { name: t.name || (isUpload ? 'Uploading...' : 'Downloading...') },
+                        progress: 0
+                    };
+                    // A late frame must not revive a finished transfer
+                    if (existing.status === 'completed' || existing.status === 'error') continue;
+                    target[t.id] = {
+                        ...existing,
+                        progress: t.progress,
+                        speed: t.speed,
+                        status: isUpload ? 'uploading' : 'downloading'
+                    };
+                }
+                return { ...s, uploads, downloads };
+            });
+        };
+
+        // Background revalidation of the cached listing finished
+        window.onFilesPatch = (patch) => {
+            update(s => ({ ...s, files: applyFilesPatch(s.files, patch), loading: false }));
+        };
+
+        window.onFilesRevalidateError = (error) => {
+            update(s => ({ ...s, loading: false, error }));
+        };
+
         window.onUploadProgress = (fileId, progress, speed, statusMsg) => {
             update(s => {
                 const upload = s.uploads[fileId] || { id: fileId, file: { name: 'Uploading...' }, progress: 0, status: 'uploading', speed: '0 B/s' };
@@ -25,16 +74,15 @@ function createFileStore() {
             });
         };
 
-        window.onUploadComplete = (fileId) => {
+        window.onUploadComplete = (fileId, patch) => {
             update(s => ({
                 ...s,
+                files: applyFilesPatch(s.files, patch),
                 uploads: {
                     ...s.uploads,
                     [fileId]: { ...s.uploads[fileId], progress: 100, status: 'completed', speed: 'Done' }
                 }
             }));
-            // Refresh list
-            fileStore.loadFiles();
             // Cleanup
             setTimeout(() => {
                 update(s => {
@@ -109,6 +157,18 @@ function createFileStore() {
             }
         },
 
+        // Show the last known listing instantly; the backend revalidates it and pushes a patch
+        loadCachedFiles: async () => {
+            update(s => ({ ...s, loading: true, error: null }));
+            try {
+                const res = await getCachedFiles();
+                update(s => ({ ...s, files: res.files }));
+            } catch (err) {
+                console.error("Failed to load cached files:", err);
+                update(s => ({ ...s, loading: false, error: err.message }));
+            }
+        },
+
         // Upload file - Triggers native picker
         uploadFile: async () => {
             try {
@@ -156,9 +216,9 @@ function createFileStore() {
         // Rename file
         renameFile: async (file, newName) => {
             try {
-                await renameFile(file.id, newName, file.metadata_message_id);
-                const res = await listFiles();
-                update(s => ({ ...s, files: res }));
+                const res = await renameFile(file.id, newName, file.metadata_message_id);
+                if (res && res.error) throw new Error(res.error);
+                update(s => ({ ...s, files: applyFilesPatch(s.files, res.patch) }));
                 return true;
             } catch (err) {
                 console.error("Rename failed:", err);
@@ -169,9 +229,9 @@ function createFileStore() {
         // Delete file
         deleteFile: async (file) => {
             try {
-                await deleteFile(file.id, file.metadata_message_id);
-                const res = await listFiles();
-                update(s => ({ ...s, files: res }));
+                const res = await deleteFile(file.id, file.metadata_message_id);
+                if (res && res.error) throw new Error(res.error);
+                update(s => ({ ...s, files: applyFilesPatch(s.files, res.patch) }));
                 return true;
             } catch (err) {
                 console.error("Delete failed:", err);
@@ -179,6 +239,18 @@ function createFileStore() {
             }
         },
 
+        // Delete many files in one backend call; returns per-file results
+        deleteFiles: async (files) => {
+            try {
+                const res = await deleteFiles(files);
+                update(s => ({ ...s, files: applyFilesPatch(s.files, res.patch) }));
+                return res.results;
+            } catch (err) {
+                console.error("Bulk delete failed:", err);
+                throw err;
+            }
+        },
+
         // Clear completed transfers
         clearCompleted: () => {
             update(s => {
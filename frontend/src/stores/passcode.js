@@ -1,5 +1,5 @@
 import { writable } from 'svelte/store';
-import { hasPasscode, verifyPasscode, setPasscode, resetEncryption, changePasscode } from '../lib/api';
+import { hasPasscode, verifyPasscode, setPasscode, resetEncryption, changePasscode, resumeReencryption } from '../lib/api';
 
 function createPasscodeStore() {
     const { subscribe, set, update } = writable({
@@ -8,7 +8,9 @@ function createPasscodeStore() {
         isLoading: false,
         error: null,
         attemptsRemaining: 5,
-        lockedUntil: null
+        lockedUntil: null,
+        reencryptProgress: null,
+        reencryptionPending: false
     });
 
     return {
@@ -74,9 +76,10 @@ function createPasscodeStore() {
                         isLoading: false,
                         attemptsRemaining: 5,
                         lockedUntil: null,
-                        error: null
+                        error: null,
+                        reencryptionPending: !!result.reencryption_pending
                     }));
-                    return { success: true };
+                    return { success: true, reencryptionPending: !!result.reencryption_pending };
                 } else if (result.error === 'locked_out') {
                     const lockedUntil = Date.now() + (result.retry_after * 1000);
                     update(state => ({
@@ -150,15 +153,16 @@ function createPasscodeStore() {
         async change(oldPasscode, newPasscode) {
             update(state => ({ ...state, isLoading: true, error: null }));
             try {
-                // API call
-                // API call
-
-                const result = await changePasscode(oldPasscode, newPasscode);
+                const result = await changePasscode(oldPasscode, newPasscode, (progress) => {
+                    // Metadata re-encryption progress: { stage, done, total }
+                    update(state => ({ ...state, reencryptProgress: progress }));
+                });
 
                 if (result.success) {
                     update(state => ({
                         ...state,
                         isLoading: false,
+                        reencryptProgress: null,
                         error: null
                     }));
                     return { success: true };
@@ -166,6 +170,7 @@ function createPasscodeStore() {
                     update(state => ({
                         ...state,
                         isLoading: false,
+                        reencryptProgress: null,
                         error: result.error
                     }));
                     return { success: false, error: result.error };
@@ -174,12 +179,34 @@ function createPasscodeStore() {
                 update(state => ({
                     ...state,
                     isLoading: false,
+                    reencryptProgress: null,
                     error: error.message
                 }));
                 return { success: false, error: error.message };
             }
         },
 
+        async resume(oldPasscode) {
+            update(state => ({ ...state, error: null }));
+            try {
+                const result = await resumeReencryption(oldPasscode, (progress) => {
+                    update(state => ({ ...state, reencryptProgress: progress }));
+                });
+                // Records that still failed stay pending (e.g. a mistyped old passcode)
+                const pending = !result.success || result.failed > 0 || !!result.reencryption_error;
+                update(state => ({
+                    ...state,
+                    reencryptProgress: null,
+                    reencryptionPending: pending,
+                    error: result.error || result.reencryption_error || null
+                }));
+                return { success: !pending, error: result.error || result.reencryption_error, failed: result.failed };
+            } catch (error) {
+                update(state => ({ ...state, reencryptProgress: null, error: error.message }));
+                return { success: false, error: error.message };
+            }
+        },
+
         clearError() {
             update(state => ({ ...state, error: null }));
         },
@@ -200,7 +227,9 @@ function createPasscodeStore() {
                 isLoading: false,
                 error: null,
                 attemptsRemaining: 5,
-                lockedUntil: null
+                lockedUntil: null,
+                reencryptProgress: null,
+                reencryptionPending: false
             });
         }
     };
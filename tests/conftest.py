@@ -0,0 +1,26 @@
+"""
+Shared fixtures: the simulated Telegram client lives in benchmarks/, and
+every test gets its own session-dir state (hash cache, listing cache, sync
+state, chunk GC state, re-encryption checkpoint) so nothing touches the
+real session directory.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    from backend.core import chunk_gc, folder_sync, hash_cache, listing_cache, reencryption
+    monkeypatch.setattr(hash_cache.hash_cache, "path", str(tmp_path / "hash_cache.json"))
+    monkeypatch.setattr(hash_cache.hash_cache, "entries", {})
+    monkeypatch.setattr(listing_cache, "CACHE_PATH", str(tmp_path / "listing_cache.json"))
+    monkeypatch.setattr(folder_sync, "STATE_DIR", str(tmp_path / "sync_state"))
+    monkeypatch.setattr(chunk_gc, "STATE_PATH", str(tmp_path / "chunk_gc_state.json"))
+    monkeypatch.setattr(reencryption, "CHECKPOINT_PATH", str(tmp_path / "reencrypt_checkpoint.json"))
+    monkeypatch.chdir(tmp_path)  # uploads write temp_uploads/ relative to cwd
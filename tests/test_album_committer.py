@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+from fake_telegram import FakeTelegramClient
+from telethon.tl import types
+
+from backend.core.album_committer import AlbumCommitter
+
+
+def uploaded(client, data, name):
+    """An InputFile whose single part the fake client already holds."""
+    file_id = len(client.uploads) + 1000
+    client.uploads[file_id] = {0: data}
+    return types.InputFile(id=file_id, parts=1, name=name, md5_checksum="")
+
+
+async def commit_reserved(committer, input_file, caption):
+    # How the uploader uses it: reserve when parts start, release once committed
+    try:
+        return await committer.commit(input_file, caption)
+    finally:
+        committer.release()
+
+
+async def commit_all(committer, files):
+    for _ in files:
+        committer.reserve()
+    return await asyncio.gather(
+        *(commit_reserved(committer, f, f"caption {i}") for i, f in enumerate(files)),
+        return_exceptions=True
+    )
+
+
+def test_chunks_finishing_together_share_one_album():
+    client = FakeTelegramClient(latency=0.001)
+    files = [uploaded(client, f"chunk {i}".encode(), f"part{i}") for i in range(3)]
+    ids = asyncio.run(commit_all(AlbumCommitter(client, albums=True), files))
+
+    assert client.stats["rpc.sendMultiMedia"] == 1
+    assert client.stats["rpc.uploadMedia"] == 3
+    assert client.stats["rpc.sendMedia"] == 0
+    assert len(set(ids)) == 3
+    for i, msg_id in enumerate(ids):
+        msg = client.messages[msg_id]
+        assert msg.text == f"caption {i}"
+        assert msg.file.name == f"part{i}"
+        assert msg.media.blob.read(0, 16) == f"chunk {i}".encode()
+
+
+def test_lone_chunk_is_sent_with_send_file():
+    client = FakeTelegramClient(latency=0.001)
+    [msg_id] = asyncio.run(commit_all(AlbumCommitter(client), [uploaded(client, b"x", "only")]))
+
+    assert client.stats["rpc.sendMedia"] == 1
+    assert client.stats["rpc.sendMultiMedia"] == 0
+    assert client.messages[msg_id].text == "caption 0"
+
+
+def test_commit_waits_at_most_the_linger_time():
+    client = FakeTelegramClient(latency=0.001)
+
+    async def run():
+        committer = AlbumCommitter(client, linger=0.05, albums=True)
+        committer.reserve()
+        committer.reserve()  # still uploading, never commits within the test
+        start = time.perf_counter()
+        msg_id = await commit_reserved(committer, uploaded(client, b"x", "ready"), None)
+        elapsed = time.perf_counter() - start
+        committer.release()
+        return msg_id, elapsed
+
+    msg_id, elapsed = asyncio.run(run())
+    assert 0.04 <= elapsed < 1
+    assert client.stats["rpc.sendMedia"] == 1
+    assert msg_id in client.messages
+
+
+def test_cheap_sends_are_not_batched_or_delayed():
+    client = FakeTelegramClient(latency=0.001)
+    files = [uploaded(client, b"x", f"part{i}") for i in range(3)]
+
+    async def run():
+        committer = AlbumCommitter(client, linger=1)
+        ids = await commit_all(committer, files[:2])
+        committer.reserve()
+        committer.reserve()  # still uploading, never commits within the test
+        start = time.perf_counter()
+        ids.append(await commit_reserved(committer, files[2], None))
+        return ids, time.perf_counter() - start
+
+    ids, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert client.stats["rpc.sendMedia"] == 3
+    assert client.stats["rpc.uploadMedia"] == 0
+    assert client.stats["rpc.sendMultiMedia"] == 0
+    assert len(set(ids)) == 3
+
+
+def test_slow_sends_switch_to_albums():
+    client = FakeTelegramClient(latency=0.001, send_interval=0.2)
+    committer = AlbumCommitter(client)
+    first = [uploaded(client, b"x", f"first{i}") for i in range(3)]
+    asyncio.run(commit_all(committer, first))
+    assert client.stats["rpc.sendMedia"] == 3
+    assert committer.albums
+
+    second = [uploaded(client, b"x", f"second{i}") for i in range(3)]
+    ids = asyncio.run(commit_all(committer, second))
+    assert client.stats["rpc.sendMultiMedia"] == 1
+    assert client.stats["rpc.sendMedia"] == 3
+    assert [client.messages[i].file.name for i in ids] == ["second0", "second1", "second2"]
+
+
+def test_more_chunks_than_an_album_holds_are_split():
+    client = FakeTelegramClient(latency=0.001)
+    files = [uploaded(client, b"x", f"part{i}") for i in range(12)]
+    ids = asyncio.run(commit_all(AlbumCommitter(client, max_size=10, albums=True), files))
+
+    assert client.stats["rpc.sendMultiMedia"] == 2
+    assert client.stats["rpc.sendMedia"] == 0
+    assert len(set(ids)) == 12
+
+
+def test_failed_upload_media_fails_only_its_chunk():
+    client = FakeTelegramClient(latency=0.001)
+    files = [uploaded(client, b"a", "a"), uploaded(client, b"b", "b")]
+    files.insert(1, types.InputFile(id=1, parts=1, name="missing", md5_checksum=""))  # parts never uploaded
+    ok_a, failed, ok_b = asyncio.run(commit_all(AlbumCommitter(client, albums=True), files))
+
+    assert isinstance(failed, ValueError)
+    assert client.messages[ok_a].file.name == "a"
+    assert client.messages[ok_b].file.name == "b"
+    assert client.stats["rpc.sendMultiMedia"] == 1
+
+
+class FailingSends(FakeTelegramClient):
+    async def __call__(self, request):
+        if type(request).__name__ == "SendMultiMediaRequest":
+            raise ConnectionError("Connection reset")
+        return await super().__call__(request)
+
+
+def test_failed_send_fails_every_chunk_of_the_album():
+    client = FailingSends(latency=0.001)
+    files = [uploaded(client, b"x", f"part{i}") for i in range(2)]
+    results = asyncio.run(commit_all(AlbumCommitter(client, albums=True), files))
+
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert not client.messages
@@ -0,0 +1,61 @@
+import asyncio
+
+from fake_telegram import FakeBridge, FakeTelegramClient, populate_catalog
+
+from backend.api.files import FileHandler
+from backend.core import chunk_gc, tg_client
+
+
+def catalog(count):
+    client = FakeTelegramClient(latency=0)
+    tg_client.client = client
+    rows = populate_catalog(client, count)
+    return client, rows
+
+
+def collect(**kwargs):
+    async def run():
+        files = FileHandler(FakeBridge(loop=asyncio.get_running_loop()))
+        return await files.collect_garbage(dry_run=False, grace_hours=0, **kwargs)
+
+    return asyncio.run(run())
+
+
+def chunk_id(row):
+    # populate_catalog adds each file's chunk right before its metadata
+    return row["metadata_message_id"] - 1
+
+
+def test_incremental_run_collects_chunks_left_by_an_interrupted_delete():
+    client, rows = catalog(3)
+    assert collect()["orphaned"] == []
+
+    # Metadata gone, chunk left behind, both below the watermark
+    del client.messages[rows[0]["metadata_message_id"]]
+    report = collect()
+    assert report["scanned"] == 0
+    assert [c["id"] for c in report["orphaned"]] == [chunk_id(rows[0])]
+    assert report["deleted"] == 1
+    assert chunk_id(rows[0]) not in client.messages
+
+    report = collect()
+    assert report["orphaned"] == [] and report["rechecked"] == 0
+
+
+def test_incremental_run_finds_new_unreferenced_chunks():
+    client, _ = catalog(2)
+    collect()
+    leftover = client.add_message(text="#TG_DRIVE_CHUNK", blob=None)
+    report = collect()
+    assert report["scanned"] == 1
+    assert [c["id"] for c in report["orphaned"]] == [leftover.id]
+
+
+def test_state_without_references_gets_a_full_pass():
+    client, rows = catalog(2)
+    chunk_gc.save_state({"watermarks": {tag: 10**9 for tag in chunk_gc.CHUNK_TAGS}})
+    del client.messages[rows[1]["metadata_message_id"]]
+    report = collect()
+    assert report["scanned"] == 2
+    assert [c["id"] for c in report["orphaned"]] == [chunk_id(rows[1])]
+    assert chunk_gc.load_state()["referenced"] == [chunk_id(rows[0])]
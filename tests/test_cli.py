@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+from fake_telegram import FakeBridge, FakeTelegramClient, populate_catalog
+
+from backend.api.files import FileHandler
+from backend.cli import commands
+from backend.cli import main as cli_main
+from backend.core import tg_client
+
+
+def unreachable(monkeypatch):
+    async def run_local(args, sink, results_out):
+        raise ConnectionError("Connection to Telegram failed 5 time(s)")
+
+    monkeypatch.setattr(cli_main, "run_local", run_local)
+
+
+def test_connection_failure_is_a_json_error(monkeypatch, capsys):
+    unreachable(monkeypatch)
+    assert cli_main.main(["--json", "ls"]) == 1
+    out = capsys.readouterr().out
+    assert json.loads(out) == {"error": "Connection to Telegram failed 5 time(s)"}
+
+
+def test_connection_failure_is_one_error_line(monkeypatch, capsys):
+    unreachable(monkeypatch)
+    assert cli_main.main(["ls"]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == "error: Connection to Telegram failed 5 time(s)\n"
+
+
+def catalog_bridge(tmp_path):
+    """A bridge whose oldest upload is followed by more than a page of newer files."""
+    async def run():
+        client = FakeTelegramClient(latency=0)
+        tg_client.client = client
+        bridge = FakeBridge(loop=asyncio.get_running_loop())
+        bridge.files = FileHandler(bridge)
+        path = tmp_path / "old.bin"
+        path.write_bytes(os.urandom(20_000))
+        old = (await bridge.files._upload_logic(str(path)))["file"]
+        populate_catalog(client, 120)  # 240 newer messages
+        return bridge, client, old
+
+    return asyncio.run(run())
+
+
+def test_commands_see_files_beyond_the_newest_messages(tmp_path):
+    bridge, client, old = catalog_bridge(tmp_path)
+
+    listed = asyncio.run(commands.cmd_ls(bridge, {}))["files"]
+    assert len(listed) == 121
+    assert listed[-1]["id"] == old["id"]  # newest first
+
+    out = tmp_path / "restored.bin"
+    result = asyncio.run(commands.cmd_download(bridge, {"files": ["old.bin"], "out": str(out)}))
+    assert result["failed"] == []
+    assert out.read_bytes() == (tmp_path / "old.bin").read_bytes()
+
+    result = asyncio.run(commands.cmd_rm(bridge, {"files": [old["id"]]}))
+    assert result["deleted"] == [{"id": old["id"], "name": "old.bin"}]
+    assert old["metadata_message_id"] not in client.messages
+
+
+def test_download_by_id_finds_old_files(tmp_path):
+    bridge, _, old = catalog_bridge(tmp_path)
+    out = tmp_path / "restored.bin"
+    result = asyncio.run(bridge.files.download_to_path(old["id"], str(out)))
+    assert result["size"] == 20_000
@@ -0,0 +1,112 @@
+import asyncio
+
+from backend.core import concurrency
+from backend.core.concurrency import AIMDController
+
+
+def end_window(controller):
+    """Make the current decision window look finished."""
+    controller._window_start -= controller.window
+
+
+def test_cancelled_woken_waiter_passes_slot_on():
+    async def run():
+        controller = AIMDController("test", initial=1, minimum=1, maximum=1, publish=False)
+        await controller.acquire()
+        first = asyncio.create_task(controller.acquire())
+        second = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)  # both are waiting now
+
+        controller.release()  # wakes `first`...
+        first.cancel()  # ...which is cancelled before it takes the slot
+        await asyncio.wait_for(second, timeout=1)
+        assert first.cancelled()
+        assert controller.active == 1
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiting_acquire_leaves_no_waiter():
+    async def run():
+        controller = AIMDController("test", initial=1, minimum=1, maximum=1, publish=False)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert controller.state()["waiting"] == 0
+        controller.release()
+        await asyncio.wait_for(controller.acquire(), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_limit_grows_while_saturated_and_throughput_rises():
+    async def run():
+        controller = AIMDController("test", initial=2, minimum=1, maximum=3, publish=False)
+        await controller.acquire()
+        await controller.acquire()  # limit reached: the window counts as saturated
+        for nbytes in (1000, 10_000, 100_000):
+            end_window(controller)
+            controller.record_success(nbytes, 0.1)
+        assert controller.limit == 3  # capped at maximum
+        assert controller.increases == 1
+
+    asyncio.run(run())
+
+
+def test_limit_does_not_grow_when_not_saturated():
+    controller = AIMDController("test", initial=2, minimum=1, maximum=8, publish=False)
+    for _ in range(10):
+        end_window(controller)
+        controller.record_success(1000, 0.1)
+    assert controller.limit == 2
+
+
+def test_error_halves_limit_once_per_window():
+    controller = AIMDController("test", initial=8, minimum=1, maximum=16, publish=False)
+    controller.record_error()
+    controller.record_error(flood_wait=3)  # same window: counted once
+    assert controller.limit == 4
+    assert controller.decreases == 1
+    assert controller.last_change["reason"] == "error"
+
+    controller._last_decrease -= controller.window
+    controller.record_error(flood_wait=3)
+    assert controller.limit == 2
+    assert controller.last_change["reason"] == "flood wait 3s"
+
+
+def test_limit_never_drops_below_minimum():
+    controller = AIMDController("test", initial=2, minimum=2, maximum=8, publish=False)
+    controller.record_error()
+    assert controller.limit == 2
+    assert controller.decreases == 0
+
+
+def test_inflated_latency_decreases_limit():
+    controller = AIMDController("test", initial=8, minimum=1, maximum=16, publish=False)
+    end_window(controller)
+    controller.record_success(512 * 1024, 0.1)  # baseline for this request size
+    end_window(controller)
+    controller.record_success(512 * 1024, 0.5)
+    assert controller.limit == 4
+    assert controller.last_change["reason"].startswith("latency")
+
+
+def test_flood_wait_hook_routes_by_request(monkeypatch):
+    download = AIMDController("download_part", initial=4, maximum=8, publish=False)
+    monkeypatch.setitem(concurrency._REQUEST_CONTROLLERS, "GetFileRequest", download)
+    concurrency.on_flood_wait("GetFileRequest", 5)
+    concurrency.on_flood_wait("SendMessageRequest", 5)  # not a transfer request: ignored
+    assert download.limit == 2
+
+
+def test_fixed_controller_never_moves():
+    controller = concurrency.fixed("test", 3)
+    controller.record_error()
+    end_window(controller)
+    controller.record_success(1000, 10.0)
+    assert controller.limit == 3
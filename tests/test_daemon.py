@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+
+import pytest
+
+from backend.cli import daemon
+from backend.cli.commands import CommandError
+from backend.cli.sinks import BroadcastSink
+
+
+@pytest.fixture
+def token_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "daemon_token")
+    monkeypatch.setattr(daemon, "TOKEN_PATH", path)
+    return path
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def with_daemon(port, token, body):
+    server = asyncio.create_task(daemon.serve(None, BroadcastSink(), "127.0.0.1", port, token=token))
+    try:
+        for _ in range(100):
+            try:
+                await daemon.call_daemon(f"127.0.0.1:{port}", "ping", {}, token="probe")
+            except CommandError as e:
+                if "Invalid token" in str(e):
+                    break  # listening
+            await asyncio.sleep(0.01)
+        return await body()
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+
+
+def test_generated_token_is_private_and_used_by_local_clients(token_path):
+    port = free_port()
+
+    async def body():
+        return await daemon.call_daemon(f"127.0.0.1:{port}", "ping", {})
+
+    assert asyncio.run(with_daemon(port, None, body)) == {"pong": True}
+    assert os.path.exists(token_path)
+    if os.name == "posix":
+        assert stat.S_IMODE(os.stat(token_path).st_mode) == 0o600
+    # A restart keeps the same token
+    assert daemon.ensure_token() == daemon.load_token()
+
+
+def test_requests_without_the_token_are_rejected(token_path):
+    port = free_port()
+
+    async def body():
+        with pytest.raises(CommandError, match="Invalid token"):
+            await daemon.call_daemon(f"127.0.0.1:{port}", "ping", {}, token="wrong")
+        assert not os.path.exists(token_path)  # explicit tokens are not stored
+        with pytest.raises(CommandError, match="Invalid token"):
+            await daemon.call_daemon(f"127.0.0.1:{port}", "ping", {})
+        return await daemon.call_daemon(f"127.0.0.1:{port}", "ping", {}, token="secret")
+
+    assert asyncio.run(with_daemon(port, "secret", body)) == {"pong": True}
+
+
+def test_non_loopback_host_needs_a_token(token_path):
+    with pytest.raises(CommandError, match="without --token"):
+        asyncio.run(daemon.serve(None, BroadcastSink(), "0.0.0.0", free_port()))
+    assert not os.path.exists(token_path)
+
+
+def test_is_loopback():
+    assert daemon.is_loopback("127.0.0.1")
+    assert daemon.is_loopback("::1")
+    assert daemon.is_loopback("localhost")
+    assert not daemon.is_loopback("0.0.0.0")
+    assert not daemon.is_loopback("192.168.1.10")
+
+
+def test_progress_is_only_sent_to_authenticated_connections(token_path):
+    port = free_port()
+    broadcast = BroadcastSink()
+
+    async def exchange(token):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write((json.dumps({"id": "1", "command": "ping", "token": token}) + "\n").encode())
+        reply = json.loads(await reader.readline())
+        broadcast([{"name": "secret-report.pdf"}])
+        writer.write_eof()  # the daemon sends what is queued, then closes
+        rest = [json.loads(line) for line in (await reader.read()).splitlines()]
+        writer.close()
+        return reply, rest
+
+    async def run():
+        server = asyncio.create_task(daemon.serve(None, broadcast, "127.0.0.1", port, token="secret"))
+        try:
+            await asyncio.sleep(0.05)
+            return await exchange("wrong"), await exchange("secret")
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+
+    (reply, rest), (ok_reply, ok_rest) = asyncio.run(run())
+    assert reply == {"id": "1", "error": "Invalid token"}
+    assert rest == []
+    assert ok_reply == {"id": "1", "result": {"pong": True}}
+    assert ok_rest == [{"event": "progress", "transfers": [{"name": "secret-report.pdf"}]}]
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import os
+
+import pytest
+from fake_telegram import FakeBridge, FakeTelegramClient
+
+from backend.api.files import FileHandler
+from backend.core import tg_client
+
+
+class FailingDeletes(FakeTelegramClient):
+    """Fails every delete batch that contains one of fail_ids."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_ids = set()
+
+    async def delete_messages(self, entity, message_ids, **kwargs):
+        if self.fail_ids.intersection(message_ids):
+            raise ConnectionError("Connection reset by peer")
+        return await super().delete_messages(entity, message_ids, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def single_message_batches(monkeypatch):
+    """One message per delete batch, so a failure hits exactly one id."""
+    batched = type(tg_client).delete_messages_batched
+    monkeypatch.setattr(tg_client, "delete_messages_batched",
+                        functools.partial(batched, tg_client, batch_size=1))
+
+
+def upload_two(tmp_path):
+    """Upload two small files; returns (handler, client, [upload rows])."""
+    async def run():
+        client = FailingDeletes(latency=0.001)
+        tg_client.client = client
+        handler = FileHandler(FakeBridge(loop=asyncio.get_running_loop()))
+        rows = []
+        for name in ("a.bin", "b.bin"):
+            path = tmp_path / name
+            path.write_bytes(os.urandom(50_000))
+            rows.append((await handler._upload_logic(str(path)))["file"])
+        return handler, client, rows
+
+    return asyncio.run(run())
+
+
+def message_ids(row):
+    return [c["message_id"] for c in row["chunks"]], row["metadata_message_id"]
+
+
+def test_deletes_chunks_and_metadata(tmp_path):
+    handler, client, rows = upload_two(tmp_path)
+    result = asyncio.run(handler.delete_files(rows))
+    assert all(r == {"success": True} for r in result["results"].values())
+    assert sorted(result["patch"]["removed"]) == sorted(r["id"] for r in rows)
+    assert client.messages == {}
+
+
+def test_failed_chunk_batch_keeps_metadata(tmp_path):
+    handler, client, rows = upload_two(tmp_path)
+    chunks, metadata_id = message_ids(rows[0])
+    client.fail_ids = {chunks[0]}
+    result = asyncio.run(handler.delete_files(rows))
+    assert result["results"][rows[0]["id"]] == {"error": "Delete failed (chunks)"}
+    assert metadata_id in client.messages  # still listed, so deleting again can finish
+    assert result["results"][rows[1]["id"]] == {"success": True}
+    assert result["patch"]["removed"] == [rows[1]["id"]]
+
+
+def test_failed_metadata_batch_reports_failure(tmp_path):
+    handler, client, rows = upload_two(tmp_path)
+    _, metadata_id = message_ids(rows[0])
+    client.fail_ids = {metadata_id}
+    result = asyncio.run(handler.delete_files(rows))
+    assert result["results"][rows[0]["id"]] == {"error": "Delete failed"}
+    assert metadata_id in client.messages
+    for row in rows:
+        assert not set(message_ids(row)[0]) & set(client.messages)  # chunks went first
+
+
+def test_missing_metadata_is_reported(tmp_path):
+    handler, client, rows = upload_two(tmp_path)
+    del client.messages[rows[1]["metadata_message_id"]]
+    result = asyncio.run(handler.delete_files(rows))
+    assert result["results"][rows[1]["id"]] == {"error": "Message not found"}
+    assert result["patch"]["removed"] == [rows[0]["id"]]
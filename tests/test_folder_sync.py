@@ -0,0 +1,131 @@
+import asyncio
+import os
+
+from fake_telegram import FakeTelegramClient, populate_catalog
+
+from backend.core import folder_sync
+from backend.core.folder_sync import (
+    build_plan, drop_missing, load_state, refresh_from_catalog, save_state, scan_directory
+)
+
+
+def remote(size, mtime_ns=None, hash="h", id="id", metadata_message_id=1):
+    return {"id": id, "metadata_message_id": metadata_message_id, "size": size, "hash": hash, "mtime_ns": mtime_ns}
+
+
+def local(size, mtime_ns, path="unused"):
+    return {"path": path, "size": size, "mtime_ns": mtime_ns}
+
+
+def plan(local_files, remote_files, hashes=None, mirror=False):
+    """Run build_plan with a fake hash function; returns (plan, state, hashed paths)."""
+    state = {"root": "r", "prefix": "", "files": remote_files}
+    hashed = []
+
+    def hash_file(path):
+        hashed.append(path)
+        return (hashes or {})[path]
+
+    result = asyncio.run(build_plan(local_files, state, mirror=mirror, hash_file=hash_file, hash_workers=2))
+    return result, state, hashed
+
+
+def test_new_file_is_uploaded():
+    result, _, hashed = plan({"a": local(5, 1)}, {})
+    assert [item["name"] for item in result["upload"]] == ["a"]
+    assert not result["update"] and not hashed
+
+
+def test_size_change_is_an_update_without_hashing():
+    old = remote(5, mtime_ns=1)
+    result, _, hashed = plan({"a": local(6, 1)}, {"a": old})
+    assert [(item["name"], item["replaces"]) for item in result["update"]] == [("a", old)]
+    assert not hashed
+
+
+def test_same_size_and_mtime_is_unchanged_without_hashing():
+    result, _, hashed = plan({"a": local(5, 1)}, {"a": remote(5, mtime_ns=1)})
+    assert result["unchanged"] == 1 and result["hashed"] == 0
+    assert not result["upload"] and not result["update"] and not hashed
+
+
+def test_new_mtime_with_same_hash_is_unchanged_and_recorded():
+    result, state, hashed = plan({"a": local(5, 2, path="p/a")}, {"a": remote(5, mtime_ns=1, hash="h")},
+                                 hashes={"p/a": "h"})
+    assert hashed == ["p/a"]
+    assert result["unchanged"] == 1 and result["hashed"] == 1
+    assert state["files"]["a"]["mtime_ns"] == 2
+
+
+def test_new_mtime_with_other_hash_is_an_update():
+    result, state, _ = plan({"a": local(5, 2, path="p/a")}, {"a": remote(5, mtime_ns=1, hash="h")},
+                            hashes={"p/a": "other"})
+    assert [item["name"] for item in result["update"]] == ["a"]
+    assert state["files"]["a"]["mtime_ns"] == 1
+
+
+def test_updates_are_sorted_by_name():
+    files = {name: local(5, 2, path=name) for name in ("c", "a", "b")}
+    result, _, _ = plan(files, {name: remote(5, hash="h") for name in files},
+                        hashes={"a": "x", "b": "x", "c": "x"})
+    assert [item["name"] for item in result["update"]] == ["a", "b", "c"]
+
+
+def test_remote_only_files_are_deleted_only_when_mirroring():
+    files = {"gone": remote(5)}
+    assert plan({}, dict(files))[0]["delete"] == []
+    result, _, _ = plan({}, dict(files), mirror=True)
+    assert result["delete"] == [{"name": "gone", **files["gone"]}]
+
+
+def test_scan_directory_walks_nested_dirs_but_not_symlinked_ones(tmp_path):
+    root = tmp_path / "root"
+    (root / "sub" / "deeper").mkdir(parents=True)
+    (root / "top.txt").write_bytes(b"1")
+    (root / "sub" / "deeper" / "leaf.txt").write_bytes(b"22")
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "hidden.txt").write_bytes(b"x")
+    os.symlink(outside, root / "link")
+
+    files = scan_directory(str(root))
+    assert sorted(files) == ["sub/deeper/leaf.txt", "top.txt"]
+    assert files["sub/deeper/leaf.txt"]["size"] == 2
+    assert files["top.txt"]["path"] == str(root / "top.txt")
+
+
+def test_state_round_trips_per_root_and_prefix(tmp_path):
+    state = {"root": str(tmp_path), "prefix": "backup", "files": {"a": remote(5, mtime_ns=3)}}
+    assert load_state(str(tmp_path), "backup") is None
+    save_state(state)
+    assert load_state(str(tmp_path), "backup") == state
+    assert load_state(str(tmp_path), "other") is None
+    assert not [n for n in os.listdir(folder_sync.STATE_DIR) if n.endswith(".tmp")]
+
+
+def test_drop_missing_forgets_files_deleted_elsewhere():
+    client = FakeTelegramClient(latency=0)
+    rows = populate_catalog(client, 3)
+    state = {"root": "r", "prefix": "", "files": {
+        row["name"]: remote(1, id=row["id"], metadata_message_id=row["metadata_message_id"]) for row in rows
+    }}
+    del client.messages[rows[1]["metadata_message_id"]]
+
+    dropped = asyncio.run(drop_missing(client, state))
+    assert dropped == [rows[1]["name"]]
+    assert sorted(state["files"]) == [rows[0]["name"], rows[2]["name"]]
+
+
+def test_refresh_from_catalog_keeps_confirmed_mtimes_of_the_same_file():
+    client = FakeTelegramClient(latency=0)
+    rows = populate_catalog(client, 2)
+    first, second = rows
+    state = {"root": "r", "prefix": "", "files": {
+        first["name"]: remote(1, mtime_ns=7, id=first["id"]),
+        second["name"]: remote(1, mtime_ns=7, id="replaced-elsewhere"),
+    }}
+
+    asyncio.run(refresh_from_catalog(client, None, state))
+    assert state["files"][first["name"]]["mtime_ns"] == 7
+    assert state["files"][second["name"]]["mtime_ns"] is None
+    assert state["files"][second["name"]]["metadata_message_id"] == second["metadata_message_id"]
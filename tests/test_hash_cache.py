@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from backend.core import hash_cache as hc
+from backend.core.hash_cache import HashCache, compute_hashes, file_hashes
+
+OLD_NS = 1_600_000_000 * 10**9  # well outside the racy window
+
+
+def write(path, data, mtime_ns=OLD_NS):
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Count real hash computations behind file_hashes."""
+    calls = []
+
+    def compute(file_path, chunk_size=None):
+        calls.append((file_path, chunk_size))
+        return compute_hashes(file_path, chunk_size)
+
+    monkeypatch.setattr(hc, "compute_hashes", compute)
+    return calls
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HashCache(str(tmp_path / "cache.json"))
+
+
+def test_compute_hashes_splits_chunks():
+    data = os.urandom(10_000)
+    path = write("f.bin", data)
+    whole, chunks = compute_hashes(path, chunk_size=4096)
+    assert whole == hashlib.sha256(data).hexdigest()
+    assert chunks == [hashlib.sha256(data[i:i + 4096]).hexdigest() for i in range(0, len(data), 4096)]
+
+
+def test_unchanged_file_is_not_read_again(cache, counted):
+    path = write("f.bin", b"hello")
+    first = file_hashes(path, cache=cache)
+    assert file_hashes(path, cache=cache) == first
+    assert len(counted) == 1
+
+
+def test_size_change_invalidates(cache, counted):
+    path = write("f.bin", b"hello")
+    file_hashes(path, cache=cache)
+    write(path, b"hello world")
+    assert file_hashes(path, cache=cache)[0] == hashlib.sha256(b"hello world").hexdigest()
+    assert len(counted) == 2
+
+
+def test_mtime_change_invalidates(cache, counted):
+    path = write("f.bin", b"hello")
+    file_hashes(path, cache=cache)
+    write(path, b"HELLO", mtime_ns=OLD_NS + 1)
+    assert file_hashes(path, cache=cache)[0] == hashlib.sha256(b"HELLO").hexdigest()
+    assert len(counted) == 2
+
+
+def test_replaced_file_with_same_size_and_mtime_invalidates(cache, counted):
+    path = write("f.bin", b"hello")
+    file_hashes(path, cache=cache)
+    os.replace(write("new.bin", b"HELLO"), path)  # new inode, same size and mtime
+    assert file_hashes(path, cache=cache)[0] == hashlib.sha256(b"HELLO").hexdigest()
+    assert len(counted) == 2
+
+
+def test_recently_modified_file_is_not_cached(cache, counted):
+    path = write("f.bin", b"hello", mtime_ns=time.time_ns())
+    file_hashes(path, cache=cache)
+    file_hashes(path, cache=cache)
+    assert len(counted) == 2
+    assert cache.entries == {}
+
+
+def test_other_chunk_size_recomputes(cache, counted):
+    path = write("f.bin", os.urandom(10_000))
+    file_hashes(path, chunk_size=4096, cache=cache)
+    _, chunks = file_hashes(path, chunk_size=8192, cache=cache)
+    assert len(chunks) == 2
+    assert len(counted) == 2
+    # Whole-file lookups are served by either entry
+    file_hashes(path, cache=cache)
+    assert len(counted) == 2
+
+
+def test_entries_survive_a_flush_and_reload(tmp_path, cache, counted):
+    path = write("f.bin", b"hello")
+    expected = file_hashes(path, chunk_size=2, cache=cache)
+    cache.flush()
+
+    reloaded = HashCache(cache.path)
+    assert file_hashes(path, chunk_size=2, cache=reloaded) == expected
+    assert len(counted) == 1
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unreadable_cache_starts_empty(cache, capsys):
+    with open(cache.path, "w") as f:
+        f.write("{not json")
+    assert cache.get(os.stat(write("f.bin", b"x"))) is None
+    assert "Ignoring unreadable cache" in capsys.readouterr().out
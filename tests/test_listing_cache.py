@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from fake_telegram import FakeBridge, FakeTelegramClient, populate_catalog
+
+from backend.api.files import FileHandler
+from backend.core import listing_cache, tg_client
+
+PASSCODE = "123456"
+ROWS = [{"id": "a", "name": "a.bin", "size": 1}]
+
+
+def stored():
+    with open(listing_cache.CACHE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_plaintext_save_does_not_replace_encrypted_cache():
+    assert listing_cache.save(ROWS, PASSCODE)
+    assert not listing_cache.save([], None)
+    assert stored()["encrypted"]
+    assert listing_cache.load(PASSCODE) == ROWS
+
+
+def test_save_roundtrip_and_clear():
+    assert listing_cache.save(ROWS)
+    assert listing_cache.load() == ROWS
+    listing_cache.clear()
+    assert listing_cache.load() is None
+    assert listing_cache.save(ROWS, PASSCODE)  # nothing to protect any more
+    assert listing_cache.load(None) is None
+
+
+def list_files(passcode):
+    async def run():
+        handler = FileHandler(FakeBridge(loop=asyncio.get_running_loop(), passcode=passcode))
+        return await handler.list_files()
+    return asyncio.run(run())
+
+
+def test_locked_listing_is_not_cached():
+    client = FakeTelegramClient(latency=0)
+    populate_catalog(client, 2, passcode=PASSCODE, salt_pool=2)
+    populate_catalog(client, 1)
+    tg_client.client = client
+
+    assert len(list_files(None)) == 1  # V2 records skipped while locked
+    assert listing_cache.load() is None
+
+    assert len(list_files(PASSCODE)) == 3
+    assert len(listing_cache.load(PASSCODE)) == 3
+
+    list_files(None)
+    assert len(listing_cache.load(PASSCODE)) == 3
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import hashlib
+
+import pytest
+from fake_telegram import FakeTelegramClient, SyntheticBlob
+
+from backend.core import parallel_downloader
+from backend.core.concurrency import AIMDController, fixed
+from backend.core.parallel_downloader import MAX_PART_RETRIES, ParallelDownloader
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(parallel_downloader, "RETRY_BACKOFF", 0.001)
+
+
+def controller(limit):
+    return AIMDController("test", initial=limit, minimum=1, maximum=limit, publish=False)
+
+
+async def download(client, msg, **kwargs):
+    downloader = ParallelDownloader(client, controller=kwargs.pop("controller", controller(4)))
+    h = hashlib.sha256()
+    size = 0
+    async for data in downloader.iter_download(msg, **kwargs):
+        h.update(data)
+        size += len(data)
+    return h.hexdigest(), size
+
+
+def test_parts_arrive_in_order_despite_jitter():
+    client = FakeTelegramClient(latency=0.001, jitter=0.01, seed=7)
+    blob = SyntheticBlob(5 * MB + 123, seed=1)
+    msg = client.add_message(blob=blob, name="a.bin")
+    digest, size = asyncio.run(download(client, msg, part_size=256 * 1024))
+    assert (digest, size) == (blob.sha256(), blob.size)
+
+
+def test_reorder_window_bounds_parts_ahead_of_consumer():
+    client = FakeTelegramClient(latency=0.001, jitter=0.005, seed=3)
+    msg = client.add_message(blob=SyntheticBlob(4 * MB), name="a.bin")
+    part_size = 128 * 1024
+    yielded = 0
+    furthest_ahead = 0
+
+    class Recording(ParallelDownloader):
+        async def _fetch_part(self, message, offset, limit, pieces=None):
+            nonlocal furthest_ahead
+            furthest_ahead = max(furthest_ahead, offset // part_size - yielded)
+            return await super()._fetch_part(message, offset, limit, pieces)
+
+    async def run():
+        nonlocal yielded
+        downloader = Recording(client, window=3, controller=controller(8))
+        async for _ in downloader.iter_download(msg, part_size=part_size):
+            yielded += 1
+            await asyncio.sleep(0.003)  # slow consumer
+
+    asyncio.run(run())
+    assert yielded == 32
+    assert furthest_ahead < 3
+
+
+def test_dropped_connection_resumes_part_without_refetching_bytes():
+    client = FakeTelegramClient(latency=0.001, drop_rate=0.2, seed=5)
+    blob = SyntheticBlob(8 * MB, seed=2)
+    msg = client.add_message(blob=blob, name="a.bin")
+    # 2MB parts take two 1MB requests, so drops also hit parts halfway
+    digest, size = asyncio.run(download(client, msg, part_size=2 * MB))
+    assert (digest, size) == (blob.sha256(), blob.size)
+    assert client.stats["connection_drops"] > 0
+    assert client.stats["reconnects"] > 0
+    assert client.stats["bytes.transferred"] == blob.size
+
+
+def test_expired_reference_is_refetched_once_for_all_workers():
+    class LateFailures(FakeTelegramClient):
+        """Workers still in flight with the old reference fail only after it was refreshed."""
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.refetched = asyncio.Event()
+            self.failures = 0
+
+        async def get_messages(self, *args, **kwargs):
+            result = await super().get_messages(*args, **kwargs)
+            self.refetched.set()
+            return result
+
+        async def iter_download(self, media, **kwargs):
+            if media.file_reference != self.file_reference_epoch:
+                self.failures += 1
+                if self.failures > 1:
+                    await self.refetched.wait()
+            async for data in super().iter_download(media, **kwargs):
+                yield data
+
+    async def run():
+        client = LateFailures(latency=0.002)
+        blob = SyntheticBlob(2 * MB, seed=3)
+        msg = client.add_message(blob=blob, name="a.bin")
+        client.expire_file_references()
+        digest, _ = await download(client, msg, part_size=512 * 1024)
+        return client, blob, digest
+
+    client, blob, digest = asyncio.run(run())
+    assert digest == blob.sha256()
+    assert client.failures == 4  # every worker hit the stale reference...
+    assert client.stats["rpc.getMessages"] == 1  # ...and it was refetched once
+
+
+def test_reference_expiring_mid_download_is_refreshed():
+    async def run():
+        client = FakeTelegramClient(latency=0.002)
+        blob = SyntheticBlob(6 * MB, seed=4)
+        msg = client.add_message(blob=blob, name="a.bin")
+
+        async def expire_later():
+            await asyncio.sleep(0.01)
+            client.expire_file_references()
+
+        expiry = asyncio.create_task(expire_later())
+        digest, _ = await download(client, msg, part_size=256 * 1024, controller=controller(2))
+        await expiry
+        return client, blob, digest
+
+    client, blob, digest = asyncio.run(run())
+    assert digest == blob.sha256()
+    assert client.stats["rpc.getMessages"] == 1
+
+
+def test_bad_request_fails_without_retries():
+    from telethon.errors import FileIdInvalidError
+
+    client = FakeTelegramClient(latency=0.001)
+    msg = client.add_message(blob=SyntheticBlob(MB), name="a.bin")
+    calls = 0
+
+    async def invalid(media, **kwargs):
+        nonlocal calls
+        calls += 1
+        raise FileIdInvalidError(request=None)
+        yield b""
+
+    client.iter_download = invalid
+    with pytest.raises(Exception, match="part 0"):
+        asyncio.run(download(client, msg, part_size=MB, controller=fixed("test", 1)))
+    assert calls == 1
+
+
+def test_gives_up_after_max_retries():
+    client = FakeTelegramClient(latency=0.001, drop_rate=1.0)
+    msg = client.add_message(blob=SyntheticBlob(MB), name="a.bin")
+    with pytest.raises(Exception, match="Connection reset"):
+        asyncio.run(download(client, msg, part_size=MB, controller=fixed("test", 1)))
+    assert client.stats["connection_drops"] == MAX_PART_RETRIES + 1
+
+
+def test_closing_early_cancels_workers():
+    async def run():
+        client = FakeTelegramClient(latency=0.005)
+        msg = client.add_message(blob=SyntheticBlob(4 * MB), name="a.bin")
+        downloader = ParallelDownloader(client, controller=controller(4))
+        async with contextlib.aclosing(downloader.iter_download(msg, part_size=256 * 1024)) as parts:
+            async for _ in parts:
+                break
+        await asyncio.sleep(0.02)
+        others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return others, client.stats["rpc.getFile"]
+
+    others, requests = asyncio.run(run())
+    assert others == []
+    assert requests < 16
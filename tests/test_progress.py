@@ -0,0 +1,16 @@
+import pytest
+
+from backend.core.progress import fps_from_env
+
+
+@pytest.mark.parametrize("value, expected", [("", None), ("0", None), ("30", 30.0), (" 2.5 ", 2.5)])
+def test_fps_from_env_reads_valid_values(monkeypatch, value, expected):
+    monkeypatch.setenv("TG_DRIVE_PROGRESS_FPS", value)
+    assert fps_from_env() == expected
+
+
+@pytest.mark.parametrize("value", ["fast", "-5", "nan", "inf"])
+def test_fps_from_env_falls_back_on_malformed_values(monkeypatch, capsys, value):
+    monkeypatch.setenv("TG_DRIVE_PROGRESS_FPS", value)
+    assert fps_from_env() is None
+    assert "Ignoring TG_DRIVE_PROGRESS_FPS" in capsys.readouterr().out
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fake_telegram import FakeTelegramClient, populate_catalog
+
+from backend.core import reencryption
+from backend.core.crypto_utils import decrypt_data
+from backend.core.reencryption import WALK_COMPLETE, load_checkpoint, reencrypt_metadata
+
+OLD = "111111"
+NEW = "222222"
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(reencryption, "BATCH_SIZE", 2)
+
+
+def catalog(count):
+    client = FakeTelegramClient(latency=0)
+    rows = populate_catalog(client, count, passcode=OLD, salt_pool=2)
+    return client, [client.messages[row["metadata_message_id"]] for row in rows]
+
+
+def fail_edit_once(msg):
+    async def edit(text):
+        del msg.edit  # the next attempt uses the real edit again
+        raise ConnectionError("Connection reset")
+    msg.edit = edit
+
+
+def resume(client, checkpoint):
+    return asyncio.run(reencrypt_metadata(
+        client, OLD, NEW,
+        offset_id=checkpoint["offset_id"], done=checkpoint["done"], retry_ids=checkpoint["failed_ids"]
+    ))
+
+
+def readable_with(passcode, msg):
+    try:
+        decrypt_data(msg.text.split("\n", 1)[1], passcode)
+        return True
+    except Exception:
+        return False
+
+
+def test_checkpoint_holds_no_passcode():
+    reencryption.save_checkpoint(NEW, 42, 3, [7, 5])
+    assert load_checkpoint(NEW) == {"offset_id": 42, "done": 3, "failed_ids": [5, 7]}
+    assert load_checkpoint(OLD) is None
+    with open(reencryption.CHECKPOINT_PATH, encoding="utf-8") as f:
+        assert OLD not in f.read()
+
+
+def test_failure_before_an_interruption_is_retried_on_resume():
+    client, records = catalog(6)
+    newest = records[-1]
+    fail_edit_once(newest)
+
+    def interrupt_after_first_batch(done, total):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        asyncio.run(reencrypt_metadata(client, OLD, NEW, progress_callback=interrupt_after_first_batch))
+    checkpoint = load_checkpoint(NEW)
+    assert checkpoint["failed_ids"] == [newest.id]
+    assert checkpoint["offset_id"] < newest.id  # the walk moved past the failure
+
+    counts = resume(client, checkpoint)
+    assert counts == {"reencrypted": 5, "skipped": 0, "failed": 0}
+    assert load_checkpoint(NEW) is None
+    assert all(readable_with(NEW, msg) for msg in records)
+
+
+def test_failures_of_a_finished_walk_are_all_that_is_retried():
+    client, records = catalog(4)
+    fail_edit_once(records[1])
+
+    counts = asyncio.run(reencrypt_metadata(client, OLD, NEW))
+    assert counts["failed"] == 1
+    checkpoint = load_checkpoint(NEW)
+    assert checkpoint["offset_id"] == WALK_COMPLETE
+    assert checkpoint["failed_ids"] == [records[1].id]
+
+    assert resume(client, checkpoint) == {"reencrypted": 1, "skipped": 0, "failed": 0}
+    assert load_checkpoint(NEW) is None
+    assert all(readable_with(NEW, msg) for msg in records)
@@ -0,0 +1,23 @@
+import pytest
+
+from backend.bridge import Bridge
+from backend.core import tracing
+
+
+@pytest.fixture(autouse=True)
+def restore_settings(monkeypatch):
+    monkeypatch.setattr(tracing, "_enabled", False)
+    monkeypatch.setattr(tracing, "_profiler", None)
+
+
+def test_toggling_tracing_keeps_the_profiler():
+    tracing.configure(enabled=True, profiler="cprofile")
+    settings = Bridge.set_transfer_tracing(None, False)
+    assert settings["enabled"] is False
+    assert settings["profiler"] == "cprofile"
+
+
+def test_profiler_can_still_be_turned_off_or_rejected():
+    tracing.configure(enabled=True, profiler="sampling")
+    assert Bridge.set_transfer_tracing(None, True, None)["profiler"] is None
+    assert "error" in Bridge.set_transfer_tracing(None, True, "bogus")
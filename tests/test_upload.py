@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import backend.core
+from fake_telegram import FakeBridge, FakeTelegramClient
+
+from backend.api.files import FileHandler
+from backend.core import file_manager, hash_cache, tg_client
+
+OLD_NS = 1_600_000_000 * 10**9
+
+
+def handler():
+    tg_client.client = FakeTelegramClient(latency=0)
+    return FileHandler(FakeBridge(loop=asyncio.get_running_loop()))
+
+
+def test_file_changed_after_stat_is_stored_as_read(tmp_path, monkeypatch):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"first line\n" * 1000)
+    split_file = file_manager.split_file
+
+    def appended_before_read(file_path, chunk_size=file_manager.CHUNK_SIZE):
+        with open(file_path, "ab") as f:
+            f.write(b"appended while uploading\n")
+        yield from split_file(file_path, chunk_size)
+
+    monkeypatch.setattr(backend.core, "split_file", appended_before_read, raising=False)
+
+    async def run():
+        files = handler()
+        row = (await files._upload_logic(str(path)))["file"]
+        await files.download_to_path(row["id"], str(tmp_path / "restored.log"))
+        return row
+
+    row = asyncio.run(run())
+    assert row["size"] == os.path.getsize(path)
+    assert (tmp_path / "restored.log").read_bytes() == path.read_bytes()
+
+
+def test_upload_records_hashes_of_an_unchanged_file(tmp_path, monkeypatch):
+    path = tmp_path / "a.bin"
+    path.write_bytes(os.urandom(30_000))
+    os.utime(path, ns=(OLD_NS, OLD_NS))
+
+    async def run():
+        return (await handler()._upload_logic(str(path)))["file"]
+
+    row = asyncio.run(run())
+    monkeypatch.setattr(hash_cache, "compute_hashes", None)  # any recompute would fail
+    file_hash, chunks = hash_cache.file_hashes(str(path), file_manager.CHUNK_SIZE)
+    assert file_hash == row["hash"]
+    assert chunks == [c["hash"] for c in row["chunks"]]
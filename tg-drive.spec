@@ -18,6 +18,12 @@ a = Analysis(
         'pydantic',
         'pydantic.fields',
         'pydantic.main',
+        # backend.core resolves these lazily via importlib
+        'backend.core.client',
+        'backend.core.metadata_manager',
+        'backend.core.file_manager',
+        'backend.core.crypto_utils',
+        'backend.core.passcode_manager',
         'clr',
     ],
     hookspath=[],